@@ -1,4 +1,5 @@
 from .laplacian_pyramid import Laplacian_Pyramid
 from .steerable_pyramid_freq import Steerable_Pyramid_Freq
+from .tiled_steerable_pyramid_freq import Tiled_Steerable_Pyramid_Freq
 from .non_linearities import *
 from .filters import *
@@ -1,5 +1,5 @@
 import torch.nn as nn
-from ...tools.conv import blur_downsample, upsample_blur
+from ...tools.conv import BlurDownsample, UpsampleBlur
 
 
 class Laplacian_Pyramid(nn.Module):
@@ -29,6 +29,8 @@ class Laplacian_Pyramid(nn.Module):
         super().__init__()
 
         self.n_scales = n_scales
+        self.blur_downsample = BlurDownsample()
+        self.upsample_blur = UpsampleBlur()
 
     def analysis(self, x):
         """
@@ -47,8 +49,8 @@ class Laplacian_Pyramid(nn.Module):
 
         y = []
         for scale in range(self.n_scales - 1):
-            x_down = blur_downsample(x)
-            x_up = upsample_blur(x_down)
+            x_down = self.blur_downsample(x)
+            x_up = self.upsample_blur(x_down)
             y.append(x - x_up)
             x = x_down
             # not downsampled
@@ -73,7 +75,7 @@ class Laplacian_Pyramid(nn.Module):
         """
         x = y[self.n_scales - 1]
         for scale in range(self.n_scales - 1, 0, -1):
-            y_up = upsample_blur(x)
+            y_up = self.upsample_blur(x)
             x = y[scale - 1] + y_up
 
         return x
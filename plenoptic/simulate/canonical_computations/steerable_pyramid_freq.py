@@ -1,9 +1,13 @@
+import copy
+import hashlib
+import os
+import threading
 import warnings
 from collections import OrderedDict
 import numpy as np
 from scipy.special import factorial
 from ...tools.signal import (interpolate1d,
-                             raised_cosine, steer)
+                             raised_cosine, steering_weights)
 import torch
 import torch.fft as fft
 import torch.nn as nn
@@ -12,6 +16,106 @@ from scipy.special import factorial
 
 
 complex_types = [torch.cdouble, torch.cfloat]
+if hasattr(torch, 'chalf'):
+    complex_types.append(torch.chalf)
+# dtypes for which we store masks and coefficients in reduced precision, but compute the FFTs
+# (and accumulate) in float32, since torch.fft doesn't support them (or only partially)
+reduced_precision_types = [torch.float16, torch.bfloat16]
+
+
+def _compute_dtype(dtype):
+    """Real dtype to compute the FFTs with for data of real dtype ``dtype``"""
+    return torch.float32 if dtype in reduced_precision_types else dtype
+
+
+def _storage_dtype(dtype, is_complex):
+    """Dtype to return (complex, if ``is_complex``) coefficients of real dtype ``dtype`` with
+
+    For float16 data, complex coefficients are stored as complex32 if this version of torch has
+    it. There's no complex bfloat16, so complex coefficients of bfloat16 data are complex64.
+
+    """
+    if not is_complex:
+        return dtype
+    if dtype == torch.float16 and hasattr(torch, 'chalf'):
+        return torch.chalf
+    return torch.promote_types(_compute_dtype(dtype), torch.complex64)
+
+# cache of the masks used by Steerable_Pyramid_Freq, see
+# Steerable_Pyramid_Freq.configure_plan_cache for details
+_PLAN_CACHE = OrderedDict()
+_PLAN_CACHE_LOCK = threading.Lock()
+_PLAN_CACHE_CONFIG = {'maxsize': 16, 'cache_dir': None}
+
+
+def _evict_plans():
+    """Drop the least recently used plans until the cache is small enough
+
+    Must be called while holding ``_PLAN_CACHE_LOCK``.
+    """
+    while len(_PLAN_CACHE) > _PLAN_CACHE_CONFIG['maxsize']:
+        _PLAN_CACHE.popitem(last=False)
+
+
+def _plan_path(key, name):
+    """Path of the on-disk version of the masks ``name`` for parameters ``key``, or None"""
+    cache_dir = _PLAN_CACHE_CONFIG['cache_dir']
+    if cache_dir is None:
+        return None
+    key_hash = hashlib.sha1(repr(key).encode()).hexdigest()
+    return os.path.join(cache_dir, f'steerable_pyramid_plan_{key_hash}_{name}.pt')
+
+
+def _get_plan(key, dtype, device):
+    """Get the plan for the pyramid with parameters ``key``, dtype and device
+
+    The plan is a dictionary, shared by all pyramids with the same
+    parameters, dtype and device, which maps each group of masks to the
+    masks themselves. It starts out empty and each group is added the first
+    time it's needed, see ``Steerable_Pyramid_Freq._get_masks``.
+
+    """
+    device = torch.device(device)
+    if device.type == 'cuda' and device.index is None:
+        device = torch.device('cuda', torch.cuda.current_device())
+    full_key = (key, dtype, device)
+    with _PLAN_CACHE_LOCK:
+        if full_key not in _PLAN_CACHE:
+            _PLAN_CACHE[full_key] = {}
+        _PLAN_CACHE.move_to_end(full_key)
+        plan = _PLAN_CACHE[full_key]
+        _evict_plans()
+    return plan
+
+
+class _SteerablePyramidAdjoint(torch.autograd.Function):
+    """Steerable pyramid transform whose backward applies the analytic adjoint
+
+    The pyramid is a fixed linear operator, so its backward pass doesn't need
+    any intermediate result: instead of recording every mask multiplication
+    and FFT in the autograd graph, we apply the adjoint of the transform to
+    the gradients of the coefficients. Nothing but the input's shape and dtype
+    is saved. Returns the coefficients of ``pyr.forward(x, scales,
+    stack_orientations=True)``, in order.
+
+    """
+
+    @staticmethod
+    def forward(ctx, x, pyr, scales):
+        ctx.pyr = pyr
+        ctx.x_shape = x.shape
+        ctx.x_dtype = x.dtype
+        pyr_coeffs = pyr.forward(x, scales, stack_orientations=True)
+        ctx.keys = list(pyr_coeffs.keys())
+        return tuple(pyr_coeffs.values())
+
+    @staticmethod
+    def backward(ctx, *grads):
+        grads = {k: g for k, g in zip(ctx.keys, grads) if g is not None}
+        if not grads:
+            return None, None, None
+        return ctx.pyr._adjoint(grads, ctx.x_shape, ctx.x_dtype), None, None
+
 
 class Steerable_Pyramid_Freq(nn.Module):
     r"""Steerable frequency pyramid in Torch
@@ -30,6 +134,11 @@ class Steerable_Pyramid_Freq(nn.Module):
     Transform described in [1]_, filter kernel design described in [2]_.
     For further information see the project webpage_
 
+    The pyramid supports reduced-precision (``float16`` and ``bfloat16``) images: call
+    ``.to(dtype)`` to store the masks in that dtype as well. Coefficients are then returned in that
+    dtype (see ``precision_report`` for details and the resulting accuracy), but the FFTs are
+    always computed in float32.
+
     Parameters
     ----------
     image_shape : `list or tuple`
@@ -54,6 +163,38 @@ class Steerable_Pyramid_Freq(nn.Module):
         Whether the pyramid obeys the generalized parseval theorem or not (i.e. is a tight frame).
         If True, the energy of the pyr_coeffs = energy of the image. If not this is not true.
         In order to match the matlabPyrTools or pyrtools pyramids, this must be set to False
+    half_spectrum: `bool` default: False
+        Whether to only store and use the non-redundant half of the Fourier plane. Because the
+        input is real, a real pyramid (``is_complex=False``) can be computed with ``rfft2`` and
+        ``irfft2``, using masks for the non-negative horizontal frequencies only, which roughly
+        halves the FFT work and the memory used by the spectra and masks. Gives the same
+        coefficients as the full-spectrum pyramid (within floating point errors). Only supported
+        for real pyramids of even-shaped images.
+    adjoint_backward: `bool` default: False
+        Whether to compute the gradient through ``forward`` (when its input requires it and
+        ``domain='spatial'``) with a custom autograd function, which applies the analytic adjoint
+        of the transform (for tight frames, the reconstruction) instead of recording every mask
+        multiplication and FFT in the autograd graph. Only the input's shape needs to be saved
+        for the backward pass, which greatly reduces the memory used by gradient-based synthesis
+        (e.g., metamers) through large pyramids. Gives the same gradients (within floating point
+        errors).
+    backend: {'fourier', 'spatial', 'auto'}
+        How ``forward`` computes the coefficients (``recon_pyr`` always works in the Fourier
+        domain). ``'fourier'`` multiplies the DFT of the image by the masks. ``'spatial'`` uses
+        spatial filters derived from these masks (their impulse responses, see
+        ``spatial_kernel_size``), applied with circular boundary handling as (strided, for the
+        lowpass when downsampling) ``conv2d``, which avoids the FFTs and is faster for small
+        images in large batches. Only supports ``domain='spatial'``. ``'auto'`` picks the spatial
+        backend when the images are small (at most 64x64), the batch is large and the filters are
+        small enough for direct filtering to be cheaper than the FFTs, and the Fourier backend
+        otherwise.
+    spatial_kernel_size: `int` or None
+        Size of the spatial filters used by the spatial backend. If None, the filters cover the
+        whole image at each level, and the coefficients are identical (within floating point
+        errors) to those of the Fourier backend. Otherwise, the impulse responses are truncated to
+        (at most) ``spatial_kernel_size x spatial_kernel_size``, which is much cheaper but only
+        approximates the Fourier-domain pyramid (an odd size keeps the filters centered). The
+        truncated filters are adjusted to keep the response at zero frequency of the masks.
 
     Attributes
     ----------
@@ -61,7 +202,9 @@ class Steerable_Pyramid_Freq(nn.Module):
         shape of input image
     pyr_size : `dict`
         Dictionary containing the sizes of the pyramid coefficients. Keys are `(level, band)`
-        tuples and values are tuples.
+        tuples and values are tuples. These only depend on the parameters of the pyramid, so
+        they're set at initialization: ``forward`` doesn't modify the pyramid, and so a single
+        pyramid can be used from multiple threads at once.
     fft_norm : `str`
         The way the ffts are normalized, see pytorch documentation for more details.
     is_complex : `bool`
@@ -79,7 +222,8 @@ class Steerable_Pyramid_Freq(nn.Module):
     """
 
     def __init__(self, image_shape, height='auto', order=3, twidth=1, is_complex=False,
-                  downsample=True,  tight_frame=False):
+                  downsample=True,  tight_frame=False, half_spectrum=False,
+                  adjoint_backward=False, backend='fourier', spatial_kernel_size=None):
 
         super().__init__()
 
@@ -94,6 +238,18 @@ class Steerable_Pyramid_Freq(nn.Module):
         self.is_complex = is_complex
         self.downsample = downsample
         self.tight_frame = tight_frame
+        if half_spectrum and self.is_complex:
+            raise ValueError("half_spectrum is only supported for real pyramids "
+                             "(is_complex=False)!")
+        if half_spectrum and ((self.image_shape[0] % 2 != 0) or (self.image_shape[1] % 2 != 0)):
+            raise ValueError("half_spectrum is only supported for even-shaped images!")
+        self.half_spectrum = half_spectrum
+        self.adjoint_backward = adjoint_backward
+        if backend not in ['fourier', 'spatial', 'auto']:
+            raise ValueError("backend must be one of 'fourier', 'spatial' or 'auto' but got "
+                             f"{backend}!")
+        self.backend = backend
+        self.spatial_kernel_size = spatial_kernel_size
         if self.tight_frame:
             self.fft_norm = "ortho"
         else:
@@ -125,18 +281,7 @@ class Steerable_Pyramid_Freq(nn.Module):
             twidth = 1
         twidth = int(twidth)
 
-        dims = np.array(self.image_shape)
-
-        # make a grid for the raised cosine interpolation
-        ctr = np.ceil((np.array(dims)+0.5)/2).astype(int)
-
-        (xramp, yramp) = np.meshgrid(np.linspace(-1, 1, dims[1]+1)[:-1],
-                                     np.linspace(-1, 1, dims[0]+1)[:-1])
-
-        self.angle = np.arctan2(yramp, xramp)
-        log_rad = np.sqrt(xramp**2 + yramp**2)
-        log_rad[ctr[0]-1, ctr[1]-1] = log_rad[ctr[0]-1, ctr[1]-2]
-        self.log_rad = np.log2(log_rad)
+        self.twidth = twidth
 
         # radial transition function (a raised cosine in log-frequency):
         self.Xrcos, Yrcos = raised_cosine(twidth, (-twidth/2.0), np.array([0, 1]))
@@ -144,95 +289,473 @@ class Steerable_Pyramid_Freq(nn.Module):
 
         self.YIrcos = np.sqrt(1.0 - self.Yrcos**2)
 
-        # create low and high masks
-        lo0mask = interpolate1d(self.log_rad, self.YIrcos, self.Xrcos)
-        hi0mask = interpolate1d(self.log_rad, self.Yrcos, self.Xrcos)
-        self.lo0mask = torch.tensor(lo0mask).unsqueeze(0)
-        self.hi0mask = torch.tensor(hi0mask).unsqueeze(0)
-
-        # pre-generate the angle, hi and lo masks, as well as the
-        # indices used for down-sampling
-        self._anglemasks = []
-        self._anglemasks_recon = []
-        self._himasks = []
-        self._lomasks = []
-        self._loindices = []
-
-        # need a mock image to down-sample so that we correctly
-        # construct the differently-sized masks
-        mock_image = np.random.rand(*self.image_shape)
-        imdft = np.fft.fftshift(np.fft.fft2(mock_image))
-        lodft = imdft * lo0mask
-
         # this list, used by coarse-to-fine optimization, gives all the
         # scales (including residuals) from coarse to fine
         self.scales = (['residual_lowpass'] + list(range(self.num_scales))[::-1] +
                        ['residual_highpass'])
 
-        # we create these copies because they will be modified in the
-        # following loops
-        Xrcos = self.Xrcos.copy()
-        angle = self.angle.copy()
-        log_rad = self.log_rad.copy()
+        # pre-generate the indices used for down-sampling, as well as the
+        # spatial shape of the coefficients at each level, the last one being
+        # the shape of the residual lowpass
+        self._loindices = []
+        self._level_shapes = [tuple(int(d) for d in self.image_shape)]
+        dims = np.array(self.image_shape)
         for i in range(self.num_scales):
-            Xrcos -= np.log2(2)
-            const = ((2 ** (2*self.order)) * (factorial(self.order, exact=True)**2) /
-                     float(self.num_orientations * factorial(2*self.order, exact=True)))
-
-            if self.is_complex:
-                Ycosn_forward = (2.0 * np.sqrt(const) * (np.cos(self.Xcosn) ** self.order) *
-                                 (np.abs(self.alpha) < np.pi/2.0).astype(int))
-                Ycosn_recon = np.sqrt(const) * (np.cos(self.Xcosn))**self.order
-
-            else:
-                Ycosn_forward = np.sqrt(
-                    const) * (np.cos(self.Xcosn))**self.order
-                Ycosn_recon = Ycosn_forward
-
-            himask = interpolate1d(log_rad, self.Yrcos, Xrcos)
-            self._himasks.append(torch.tensor(himask).unsqueeze(0))
-
-            anglemasks = []
-            anglemasks_recon = []
-            for b in range(self.num_orientations):
-                anglemask = interpolate1d(angle, Ycosn_forward,
-                                    self.Xcosn + np.pi*b/self.num_orientations)
-                anglemask_recon = interpolate1d(
-                    angle, Ycosn_recon, self.Xcosn + np.pi*b/self.num_orientations)
-                anglemasks.append(torch.tensor(anglemask).unsqueeze(0))
-                anglemasks_recon.append(torch.tensor(anglemask_recon).unsqueeze(0))
-
-            self._anglemasks.append(anglemasks)
-            self._anglemasks_recon.append(anglemasks_recon)
             if not self.downsample:
-                lomask = interpolate1d(log_rad, self.YIrcos, Xrcos)
-                self._lomasks.append(torch.tensor(lomask).unsqueeze(0))
                 self._loindices.append([np.array([0, 0]), dims])
-                lodft = lodft * lomask
-
             else:
-                # subsample lowpass
-                dims = np.array([lodft.shape[0], lodft.shape[1]])
                 ctr = np.ceil((dims+0.5)/2).astype(int)
                 lodims = np.ceil((dims-0.5)/2).astype(int)
                 loctr = np.ceil((lodims+0.5)/2).astype(int)
                 lostart = ctr - loctr
                 loend = lostart + lodims
                 self._loindices.append([lostart, loend])
+                dims = lodims
+            self._level_shapes.append(tuple(int(d) for d in dims))
+        self.pyr_size['residual_highpass'] = self._level_shapes[0]
+        for i in range(self.num_scales):
+            for b in range(self.num_orientations):
+                self.pyr_size[(i, b)] = self._level_shapes[i]
+        self.pyr_size['residual_lowpass'] = self._level_shapes[-1]
+
+        # the angle, hi and lo masks only depend on these parameters, so they
+        # are shared (through the plan cache) by all pyramids with the same
+        # parameters, dtype and device. They're only built the first time
+        # they're needed, see _get_masks
+        self._plan_key = (self._level_shapes[0], self.num_scales, self.order, twidth,
+                          self.is_complex, self.downsample, self.tight_frame,
+                          self.half_spectrum)
+        # reasonable default dtype
+        self._dtype = torch.float32
+        self._device = torch.device('cpu')
+        self._plan = _get_plan(self._plan_key, self._dtype, self._device)
 
-                # subsample indices
-                log_rad = log_rad[lostart[0]:loend[0], lostart[1]:loend[1]]
-                angle = angle[lostart[0]:loend[0], lostart[1]:loend[1]]
-
-                lomask = interpolate1d(log_rad, self.YIrcos, Xrcos)
-                self._lomasks.append(torch.tensor(lomask).unsqueeze(0))
-                # subsampling
-                lodft = lodft[lostart[0]:loend[0], lostart[1]:loend[1]]
-                # convolution in spatial domain
-                lodft = lodft * lomask
+    @property
+    def lo0mask(self):
+        return self._get_masks('residual')['lo0mask']
 
-        # reasonable default dtype
-        self = self.to(torch.float32)
+    @property
+    def hi0mask(self):
+        return self._get_masks('residual')['hi0mask']
+
+    def _get_masks(self, kind, scale=None):
+        r"""Get some of the Fourier-domain masks, building them if necessary
+
+        The masks are shared with all other pyramids with the same parameters, dtype and device,
+        so they must not be modified in place.
+
+        Parameters
+        ----------
+        kind : {'residual', 'bands', 'lowpass'}
+            which masks to get: ``'residual'`` for the masks of the residual highpass and
+            initial lowpass, ``'bands'`` for the masks used to compute the oriented bands of
+            ``scale`` and ``'lowpass'`` for the lowpass mask used to go from ``scale`` to the
+            next one.
+        scale : `int` or None
+            the scale whose masks we want. Ignored if ``kind='residual'``
+
+        Returns
+        -------
+        masks : `dict`
+            if ``kind='residual'``, contains ``lo0mask`` and ``hi0mask``, if ``kind='lowpass'``,
+            contains ``lomask``, all of shape ``(1, height, width)``. If ``kind='bands'``,
+            contains ``himask``, of shape ``(1, height, width)``, and ``anglemasks`` and
+            ``anglemasks_recon``, of shape ``(num_orientations, height, width)``
+
+        """
+        if kind == 'residual':
+            scale = None
+        masks = self._plan.get((kind, scale), None)
+        if masks is None:
+            path = _plan_path(self._plan_key, f"{kind}{'' if scale is None else scale}")
+            if path is not None and os.path.exists(path):
+                try:
+                    masks = torch.load(path, map_location=self._device)
+                except Exception:
+                    warnings.warn(f"Unable to load cached pyramid masks from {path}, "
+                                  "rebuilding them")
+            if masks is None:
+                masks = self._build_masks(kind, scale)
+                if path is not None:
+                    # write to a temporary file first, so that concurrent
+                    # processes never see a partially written file
+                    tmp_path = f'{path}.{os.getpid()}.tmp'
+                    torch.save({k: v.cpu() for k, v in masks.items()}, tmp_path)
+                    os.replace(tmp_path, path)
+            masks = {k: v.to(dtype=self._dtype) for k, v in masks.items()}
+            self._plan[(kind, scale)] = masks
+        return masks
+
+    def _level_grid(self, level):
+        r"""Log-radius and angle of the centered Fourier-domain grid at a level
+
+        The grid of each level is a centered crop of the full-resolution grid (unless we're not
+        downsampling, in which case it's the full-resolution grid), restricted to the half-plane
+        if ``self.half_spectrum`` is True.
+
+        Parameters
+        ----------
+        level : `int`
+            level of the pyramid, from 0 (full-resolution) to ``self.num_scales`` (the residual
+            lowpass)
+
+        Returns
+        -------
+        log_rad, angle : `torch.Tensor`
+            float64 tensors on ``self._device``, of shape ``(height, width)``
+
+        """
+        full_dims = self._level_shapes[0]
+        dims = self._level_shapes[level]
+        start = np.zeros(2, dtype=int)
+        if self.downsample:
+            for lostart, _ in self._loindices[:level]:
+                start += lostart
+        kwargs = {'dtype': torch.float64, 'device': self._device}
+        xramp = torch.linspace(-1, 1, full_dims[1]+1, **kwargs)[:-1][start[1]:start[1]+dims[1]]
+        yramp = torch.linspace(-1, 1, full_dims[0]+1, **kwargs)[:-1][start[0]:start[0]+dims[0]]
+        cols = self._half_plane(np.arange(dims[1]))
+        x = xramp[torch.as_tensor(cols, device=self._device)].unsqueeze(0)
+        y = yramp.unsqueeze(1)
+
+        angle = torch.atan2(y, x)
+        rad = torch.sqrt(x**2 + y**2)
+        # to avoid taking the log of 0, the origin gets the radius of its
+        # left neighbor
+        ctr = np.ceil((np.array(dims)+0.5)/2).astype(int) - 1
+        origin_col = int(np.nonzero(cols == ctr[1])[0][0])
+        rad[ctr[0], origin_col] = torch.sqrt(yramp[ctr[0]]**2 + xramp[ctr[1]-1]**2)
+        return torch.log2(rad), angle
+
+    def _build_masks(self, kind, scale=None):
+        r"""Build some of the Fourier-domain masks
+
+        This is only called by ``_get_masks``, when there's no cached version of these masks. The
+        masks are built in float64 on ``self._device``; ``_get_masks`` takes care of converting
+        them to the appropriate dtype.
+
+        Parameters
+        ----------
+        kind : {'residual', 'bands', 'lowpass'}
+            which masks to build, see ``_get_masks`` for details
+        scale : `int` or None
+            the scale whose masks we want. Ignored if ``kind='residual'``
+
+        Returns
+        -------
+        masks : `dict`
+            dictionary containing the masks, see ``_get_masks`` for details
+
+        """
+        if kind == 'residual':
+            log_rad, _ = self._level_grid(0)
+            return {'lo0mask': interpolate1d(log_rad, self.YIrcos, self.Xrcos).unsqueeze(0),
+                    'hi0mask': interpolate1d(log_rad, self.Yrcos, self.Xrcos).unsqueeze(0)}
+
+        Xrcos = self.Xrcos - (scale + 1)
+        if kind == 'lowpass':
+            log_rad, _ = self._level_grid(scale+1 if self.downsample else scale)
+            return {'lomask': interpolate1d(log_rad, self.YIrcos, Xrcos).unsqueeze(0)}
+
+        log_rad, angle = self._level_grid(scale)
+        const = ((2 ** (2*self.order)) * (factorial(self.order, exact=True)**2) /
+                 float(self.num_orientations * factorial(2*self.order, exact=True)))
+
+        if self.is_complex:
+            Ycosn_forward = (2.0 * np.sqrt(const) * (np.cos(self.Xcosn) ** self.order) *
+                             (np.abs(self.alpha) < np.pi/2.0).astype(int))
+            Ycosn_recon = np.sqrt(const) * (np.cos(self.Xcosn))**self.order
+
+        else:
+            Ycosn_forward = np.sqrt(
+                const) * (np.cos(self.Xcosn))**self.order
+            Ycosn_recon = Ycosn_forward
+
+        himask = interpolate1d(log_rad, self.Yrcos, Xrcos)
+
+        # the angle masks of all orientations are computed at once, with
+        # shape (num_orientations, height, width): shifting the lookup table
+        # by the orientation is the same as shifting the angle grid the
+        # opposite way
+        offsets = torch.arange(self.num_orientations, dtype=angle.dtype, device=angle.device)
+        angles = angle - (np.pi * offsets / self.num_orientations).view(-1, 1, 1)
+        anglemasks = interpolate1d(angles, Ycosn_forward, self.Xcosn)
+        anglemasks_recon = interpolate1d(angles, Ycosn_recon, self.Xcosn)
+
+        return {'himask': himask.unsqueeze(0), 'anglemasks': anglemasks,
+                'anglemasks_recon': anglemasks_recon}
+
+    def _spatial_kernel_shape(self, level):
+        r"""Shape of the spatial filters used at ``level`` by the spatial backend"""
+        shape = self._level_shapes[level]
+        if self.spatial_kernel_size is None:
+            return shape
+        return tuple(min(int(self.spatial_kernel_size), s) for s in shape)
+
+    def _spatial_kernels(self, dfts, level):
+        r"""Spatial filters equivalent to multiplying the DFT of a signal at ``level`` by ``dfts``
+
+        Parameters
+        ----------
+        dfts : `torch.Tensor`
+            centered Fourier-domain filters of shape ``(n_filters, height, width)``, defined on the
+            grid of ``level``
+
+        Returns
+        -------
+        kernels : `torch.Tensor`
+            the impulse responses (possibly truncated and complex-valued), of shape ``(n_filters,
+            1, kernel_height, kernel_width)``, flipped so that ``conv2d`` (which is a correlation)
+            applies them as a convolution
+        padding : `tuple`
+            the circular padding ``(left, right, top, bottom)`` to apply before ``conv2d``, so that
+            the output has the same size as the input (when the stride is 1)
+
+        """
+        shape = self._level_shapes[level]
+        # the impulse responses, with the origin at index 0. multiplying the DFT by a mask and
+        # inverting it is the same with both normalizations
+        impulses = self._ifft2(dfts.to(torch.complex128), shape, norm='backward')
+        kh, kw = self._spatial_kernel_shape(level)
+        padding = (kw//2, kw - 1 - kw//2, kh//2, kh - 1 - kh//2)
+        # conv2d computes out[n] = sum_u w[u] x[n + u - pad], so w[u] = h[pad - u]
+        rows = (kh//2 - torch.arange(kh, device=impulses.device)) % shape[0]
+        cols = (kw//2 - torch.arange(kw, device=impulses.device)) % shape[1]
+        kernels = impulses[..., rows.unsqueeze(-1), cols]
+        if (kh, kw) != tuple(shape):
+            # truncation changes the response at zero frequency, which leaks the (typically
+            # large) low frequencies of the image into bands that should have none, so we spread
+            # the difference over the truncated kernel to keep the DC gain of the mask
+            dc = impulses.sum((-2, -1), keepdim=True)
+            kernels = kernels + (dc - kernels.sum((-2, -1), keepdim=True)) / (kh * kw)
+        return kernels.unsqueeze(1), padding
+
+    def _get_spatial_filters(self, kind, scale=None):
+        r"""Get the spatial filters used by the spatial backend, building them if necessary
+
+        Like the masks they're derived from, they're shared with all pyramids with the same
+        parameters, dtype and device (and ``spatial_kernel_size``), so they must not be modified
+        in place.
+
+        Parameters
+        ----------
+        kind : {'residual', 'bands'}
+            ``'residual'`` for the filters of the residual highpass and initial lowpass,
+            ``'bands'`` for the filters of the oriented bands of ``scale`` and of the lowpass
+            going from ``scale`` to the next one.
+        scale : `int` or None
+            the scale whose filters we want. Ignored if ``kind='residual'``
+
+        Returns
+        -------
+        filters : `dict`
+            with the circular ``padding`` to apply before filtering and, if
+            ``kind='residual'``, ``kernels``, the stacked highpass and lowpass filters. If
+            ``kind='bands'``, ``bands``, the filters of all orientations (real parts first, then
+            imaginary parts for complex pyramids), ``lowpass`` and the ``stride`` to use with it.
+
+        """
+        if kind == 'residual':
+            scale = None
+        key = (f'spatial_{kind}', scale, self.spatial_kernel_size)
+        filters = self._plan.get(key, None)
+        if filters is not None:
+            return filters
+
+        if kind == 'residual':
+            masks = self._get_masks('residual')
+            dfts = torch.cat([masks['hi0mask'], masks['lo0mask']]).to(torch.float64)
+            kernels, padding = self._spatial_kernels(dfts, 0)
+            filters = {'kernels': kernels.real, 'padding': padding}
+        else:
+            masks = self._get_masks('bands', scale)
+            complex_const = np.power(complex(0, -1), self.order)
+            dfts = (complex_const * masks['anglemasks'].to(torch.float64) *
+                    masks['himask'].to(torch.float64))
+            if self.is_complex and self.tight_frame:
+                dfts = dfts/np.sqrt(2)
+            bands, padding = self._spatial_kernels(dfts, scale)
+            if self.is_complex:
+                bands = torch.cat([bands.real, bands.imag])
+            else:
+                bands = bands.real
+
+            lomask = self._get_masks('lowpass', scale)['lomask'].to(torch.float64)
+            if self.downsample:
+                # cropping the (bandlimited) DFT is the same as filtering with the lowpass mask
+                # zero-padded to the current level and keeping every other sample, up to the
+                # normalization of the DFT
+                paddeddft = torch.zeros((1, *self._dft_shape(self._level_shapes[scale])),
+                                        dtype=lomask.dtype, device=lomask.device)
+                rows, cols = self._lo_slices(scale)
+                paddeddft[..., rows, cols] = lomask
+                lomask = paddeddft
+                gain = (np.prod(self._level_shapes[scale]) /
+                        np.prod(self._level_shapes[scale+1]))
+                if self.fft_norm == "ortho":
+                    gain = np.sqrt(gain)
+                stride = 2
+            else:
+                gain = 2 if self.fft_norm != "ortho" else 1
+                stride = 1
+            lowpass, _ = self._spatial_kernels(lomask, scale)
+            filters = {'bands': bands, 'lowpass': gain * lowpass.real, 'stride': stride,
+                       'padding': padding}
+        filters = {k: v.to(dtype=self._dtype) if torch.is_tensor(v) else v
+                   for k, v in filters.items()}
+        self._plan[key] = filters
+        return filters
+
+    @staticmethod
+    def configure_plan_cache(maxsize=16, cache_dir=None):
+        r"""Configure the cache of pyramid masks shared by all steerable pyramids
+
+        Building the masks of a pyramid is the bulk of the work done when initializing it, so
+        they're cached, keyed by the pyramid parameters (image shape, height, order, twidth,
+        is_complex, downsample, tight_frame, half_spectrum), dtype and device. Each such key
+        corresponds to one plan, whose masks are built scale by scale, the first time they're
+        needed (so that, e.g., calling ``forward`` with a subset of scales doesn't build the
+        masks of the other scales' oriented bands). When the cache holds more than ``maxsize`` plans, the least recently used one
+        is evicted (pyramids that use it keep their reference).
+
+        Parameters
+        ----------
+        maxsize : `int`
+            maximum number of plans to hold in memory.
+        cache_dir : `str` or None
+            If not None, directory in which to persist the masks (as float64 tensors), so that
+            they can be reused across processes. It will be created if it doesn't exist.
+
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1!")
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        with _PLAN_CACHE_LOCK:
+            _PLAN_CACHE_CONFIG['maxsize'] = int(maxsize)
+            _PLAN_CACHE_CONFIG['cache_dir'] = cache_dir
+            _evict_plans()
+
+    @staticmethod
+    def clear_plan_cache():
+        r"""Remove all plans from the in-memory cache of pyramid masks"""
+        with _PLAN_CACHE_LOCK:
+            _PLAN_CACHE.clear()
+
+    def _half_plane(self, mask):
+        r"""Restrict a centered Fourier-domain mask to the non-redundant half-plane
+
+        If ``self.half_spectrum`` is False, ``mask`` is returned unchanged. Otherwise, we return
+        the columns corresponding to the non-negative horizontal frequencies, in the same order
+        as they're returned by ``rfft2``. For even widths, the Nyquist column is taken from the
+        first column of the centered mask (the negative Nyquist frequency), which, for the
+        radially-symmetric masks, is identical. The bands and lowpass contain no energy at the
+        Nyquist frequency, so the angular masks there don't matter.
+
+        Parameters
+        ----------
+        mask : `np.ndarray`
+            mask (or grid coordinates), with the zero frequency at the center (as given by
+            ``fftshift``) along the last dimension
+
+        Returns
+        -------
+        mask : `np.ndarray`
+            the mask, restricted to the half-plane if ``self.half_spectrum`` is True
+
+        """
+        if not self.half_spectrum:
+            return mask
+        width = mask.shape[-1]
+        half_mask = mask[..., width//2:]
+        if width % 2 == 0:
+            half_mask = np.concatenate([half_mask, mask[..., :1]], axis=-1)
+        return half_mask
+
+    def _fft2(self, x, norm=None):
+        r"""Compute the centered DFT of ``x``, as used with the Fourier-domain masks
+
+        If ``self.half_spectrum`` is True, we use ``rfft2`` and thus only have the non-negative
+        horizontal frequencies, so we only center the vertical frequencies. ``norm`` overrides
+        ``self.fft_norm`` if not None.
+
+        """
+        norm = self.fft_norm if norm is None else norm
+        if self.half_spectrum:
+            xdft = fft.rfft2(x, dim=(-2, -1), norm=norm)
+            return fft.fftshift(xdft, dim=-2)
+        xdft = fft.fft2(x, dim=(-2, -1), norm=norm)
+        return fft.fftshift(xdft, dim=(-2, -1))
+
+    def _ifft2(self, xdft, shape, norm=None):
+        r"""Invert ``_fft2``, returning a spatial signal with spatial shape ``shape``
+
+        If ``self.half_spectrum`` is True, the output is real (we use ``irfft2``), otherwise it
+        is complex and it's up to the caller to take the real part if appropriate. ``norm``
+        overrides ``self.fft_norm`` if not None.
+
+        """
+        norm = self.fft_norm if norm is None else norm
+        if self.half_spectrum:
+            xdft = fft.ifftshift(xdft, dim=-2)
+            return fft.irfft2(xdft, s=shape, dim=(-2, -1), norm=norm)
+        xdft = fft.ifftshift(xdft, dim=(-2, -1))
+        return fft.ifft2(xdft, dim=(-2, -1), norm=norm)
+
+    def _half_spectrum_weights(self, width, device):
+        r"""Number of times each column of the half-spectrum appears in the full spectrum
+
+        This is 1 for the zero frequency (and the Nyquist frequency, for even widths) and 2 for
+        all other columns, which also stand for their negative frequency counterparts.
+
+        """
+        weights = torch.full((width//2 + 1,), 2., device=device)
+        weights[0] = 1
+        if width % 2 == 0:
+            weights[-1] = 1
+        return weights
+
+    def _ifft2_adjoint(self, x):
+        r"""Adjoint of ``_ifft2`` (as a real-linear operator), applied to a spatial signal ``x``
+
+        With ``norm='backward'``, the adjoint of the inverse DFT is the DFT divided by the number
+        of pixels, i.e., ``norm='forward'``. The orthonormal DFT is unitary. For the half
+        spectrum, each column is weighted by the number of times it appears in the full spectrum.
+
+        """
+        adjoint_norm = {'backward': 'forward', 'ortho': 'ortho'}[self.fft_norm]
+        xdft = self._fft2(x, norm=adjoint_norm)
+        if self.half_spectrum:
+            xdft = xdft * self._half_spectrum_weights(x.shape[-1], x.device)
+        return xdft
+
+    def _fft2_adjoint(self, xdft, shape):
+        r"""Adjoint of ``_fft2`` (as a real-linear operator on real signals of shape ``shape``)
+
+        See ``_ifft2_adjoint`` for details. The output is real.
+
+        """
+        adjoint_norm = {'backward': 'forward', 'ortho': 'ortho'}[self.fft_norm]
+        if self.half_spectrum:
+            xdft = xdft / self._half_spectrum_weights(shape[-1], xdft.device)
+        x = self._ifft2(xdft, shape, norm=adjoint_norm)
+        if x.is_complex():
+            x = x.real
+        return x
+
+    def _dft_shape(self, shape):
+        r"""Shape of the last two dimensions of ``_fft2`` for a signal of spatial ``shape``"""
+        if self.half_spectrum:
+            return (shape[0], shape[1]//2 + 1)
+        return tuple(shape)
+
+    def _lo_slices(self, scale):
+        r"""Slices into the centered DFT of ``scale`` used to downsample to the next scale"""
+        lostart, loend = self._loindices[scale]
+        if self.half_spectrum:
+            width = loend[1] - lostart[1]
+            return slice(lostart[0], loend[0]), slice(0, width//2 + 1)
+        return slice(lostart[0], loend[0]), slice(lostart[1], loend[1])
 
     def to(self, *args, **kwargs):
         r"""Moves and/or casts the parameters and buffers.
@@ -269,20 +792,63 @@ class Steerable_Pyramid_Freq(nn.Module):
         Returns:
             Module: self
         """
-        self.lo0mask = self.lo0mask.to(*args, **kwargs)
-        self.hi0mask = self.hi0mask.to(*args, **kwargs)
-        self._himasks = [m.to(*args, **kwargs) for m in self._himasks]
-        self._lomasks = [m.to(*args, **kwargs) for m in self._lomasks]
-        angles = []
-        angles_recon = []
-        for a, ar in zip(self._anglemasks, self._anglemasks_recon):
-            angles.append([m.to(*args, **kwargs) for m in a])
-            angles_recon.append([m.to(*args, **kwargs) for m in ar])
-        self._anglemasks = angles
-        self._anglemasks_recon = angles_recon
+        device, dtype, _, _ = torch._C._nn._parse_to(*args, **kwargs)
+        if dtype is not None:
+            self._dtype = dtype
+        if device is not None:
+            self._device = torch.device(device)
+        self._plan = _get_plan(self._plan_key, self._dtype, self._device)
         return self
 
-    def forward(self, x, scales=[]):
+    def precision_report(self, x, dtype=torch.bfloat16):
+        r"""Compare the pyramid computed in reduced precision against float32
+
+        The pyramid can be used with ``float16`` or ``bfloat16`` images (with its masks cast to
+        the same dtype with ``.to(dtype)``), in which case masks and coefficients are stored in
+        that dtype (complex coefficients are ``complex32`` for ``float16``, where available, and
+        ``complex64`` for ``bfloat16``), roughly halving their memory, while the FFTs are computed
+        and accumulated in float32. This reports the resulting loss of accuracy on ``x``.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            image (or batch of images) of shape (batch, channel, height, width) to compare on.
+        dtype : torch.dtype
+            the reduced-precision dtype to evaluate
+
+        Returns
+        -------
+        report : `dict`
+            with keys ``'relative_error'`` (an `OrderedDict` with the relative L2 error of each
+            band, with the same keys as ``forward``), ``'reconstruction_error'`` (relative L2 error
+            between the image and its reconstruction from the reduced-precision coefficients, and
+            the same for float32, as a tuple ``(reduced, float32)``) and ``'nbytes'`` (the memory
+            taken by all the coefficients, as a tuple ``(reduced, float32)``)
+
+        """
+        def rel_err(a, b):
+            return (torch.linalg.norm((a.to(b.dtype) - b).flatten()) /
+                    torch.linalg.norm(b.flatten())).item()
+
+        def nbytes(coeffs):
+            return sum([v.numel() * v.element_size() for v in coeffs.values()])
+
+        # shallow copies share the mask cache with self, but can have a different dtype
+        reference = copy.copy(self).to(torch.float32)
+        reduced = copy.copy(self).to(dtype)
+        x = x.to(self._device)
+        with torch.no_grad():
+            ref_coeffs = reference.forward(x.to(torch.float32))
+            coeffs = reduced.forward(x.to(dtype))
+            ref_recon = reference.recon_pyr(ref_coeffs)
+            recon = reduced.recon_pyr(coeffs)
+        x = x.to(torch.float32)
+        return {'relative_error': OrderedDict((k, rel_err(coeffs[k], v))
+                                              for k, v in ref_coeffs.items()),
+                'reconstruction_error': (rel_err(recon, x), rel_err(ref_recon, x)),
+                'nbytes': (nbytes(coeffs), nbytes(ref_coeffs))}
+
+    def forward(self, x, scales=[], stack_orientations=False, packed=False, domain='spatial'):
         r"""Generate the steerable pyramid coefficients for an image
 
         Parameters
@@ -300,6 +866,27 @@ class Steerable_Pyramid_Freq(nn.Module):
             'residual_lowpass'. Can contain a single value or multiple
             values. If it's an int, we include all orientations from
             that scale. Order within the list does not matter.
+        stack_orientations : bool, optional
+            If False (the default), the oriented bands are returned
+            separately, with keys ``(scale, orientation)``. If True, all
+            orientations of a scale are returned as a single tensor of shape
+            (batch, channel, orientation, height, width), with key
+            ``scale``. Note that ``recon_pyr`` and ``steer_coeffs`` expect the
+            unstacked version.
+        packed : bool, optional
+            If True, return the coefficients packed into a single buffer,
+            along with its index, as returned by ``pack_pyr_coeffs``, instead
+            of a dictionary.
+        domain : {'spatial', 'fourier', 'both'}, optional
+            Whether to return the coefficients (``'spatial'``, the default),
+            their DFTs (``'fourier'``) or both, as a tuple ``(pyr_coeffs,
+            pyr_dfts)``. The DFT of each band is the one computed by
+            ``torch.fft.fft2`` (or ``torch.fft.rfft2``, if
+            ``half_spectrum=True``), with this pyramid's normalization, in the
+            standard (not centered) layout. With ``'fourier'``, no inverse FFT
+            is computed, so downstream computations that work on the DFTs
+            (e.g., energies through Parseval's theorem, autocorrelations
+            through the Wiener-Khinchin theorem) avoid the round trip.
 
         Returns
         -------
@@ -314,6 +901,104 @@ class Steerable_Pyramid_Freq(nn.Module):
 
         """
         pyr_coeffs = OrderedDict()
+        pyr_dfts = OrderedDict()
+        scales = self._check_forward_args(x, scales, domain)
+        spatial_backend = self._use_spatial_backend(x, domain)
+
+        if (self.adjoint_backward and domain == 'spatial' and torch.is_grad_enabled()
+                and x.requires_grad and not spatial_backend):
+            # the autograd function calls this method again, with gradients
+            # disabled, and only records itself in the graph
+            outputs = _SteerablePyramidAdjoint.apply(x, self, scales)
+            keys = [k for k in ['residual_highpass'] + list(range(self.num_scales)) +
+                    ['residual_lowpass'] if k in scales]
+            for k, v in zip(keys, outputs):
+                if isinstance(k, int):
+                    self._store_bands(pyr_coeffs, k, v, stack_orientations)
+                else:
+                    pyr_coeffs[k] = v
+            if packed:
+                return self.pack_pyr_coeffs(pyr_coeffs)
+            return pyr_coeffs
+
+        if spatial_backend:
+            levels = self._iter_levels_spatial(x, scales)
+        else:
+            levels = self._iter_levels(x, scales, domain)
+        for k, coeffs, dfts in levels:
+            for out, v in [(pyr_coeffs, coeffs), (pyr_dfts, dfts)]:
+                if v is None:
+                    continue
+                if isinstance(k, int):
+                    self._store_bands(out, k, v, stack_orientations)
+                else:
+                    out[k] = v
+
+        outputs = {'spatial': [pyr_coeffs], 'fourier': [pyr_dfts],
+                   'both': [pyr_coeffs, pyr_dfts]}[domain]
+        if packed:
+            outputs = [self.pack_pyr_coeffs(out) for out in outputs]
+        if len(outputs) == 1:
+            return outputs[0]
+        return tuple(outputs)
+
+    def iter_forward(self, x, scales=[], stack_orientations=False, domain='spatial'):
+        r"""Generate the steerable pyramid coefficients for an image, one scale at a time
+
+        This yields the same coefficients as ``forward``, but as they're computed, from the
+        residual highpass to the residual lowpass. Only the current level's low-pass DFT is held
+        internally (each one is dropped as soon as the next one is computed), so consumers that
+        reduce each band (e.g., to statistics) before asking for the next one only keep a single
+        scale alive at a time.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            A tensor containing the image to analyze, of shape (batch, channel, height, width).
+        scales : list, optional
+            Which scales to include, see ``forward`` for details. Computation stops after the
+            coarsest requested scale.
+        stack_orientations : bool, optional
+            If True, all orientations of a scale are yielded as a single tensor of shape (batch,
+            channel, orientation, height, width), with key ``scale``. Otherwise, they're yielded
+            one at a time, with keys ``(scale, orientation)``.
+        domain : {'spatial', 'fourier', 'both'}, optional
+            Whether to yield the coefficients, their DFTs or a tuple with both, see ``forward``
+            for details.
+
+        Yields
+        ------
+        key : `str`, `int` or `tuple`
+            the key of the band, as in the dictionary returned by ``forward``
+        coeffs : `torch.Tensor` or `tuple`
+            the band (or its DFT, or a tuple of both, depending on ``domain``)
+
+        """
+        scales = self._check_forward_args(x, scales, domain)
+        if self._use_spatial_backend(x, domain):
+            levels = self._iter_levels_spatial(x, scales)
+        else:
+            levels = self._iter_levels(x, scales, domain)
+        for k, coeffs, dfts in levels:
+            if domain == 'spatial':
+                values = coeffs
+            elif domain == 'fourier':
+                values = dfts
+            else:
+                values = (coeffs, dfts)
+            if not isinstance(k, int) or stack_orientations:
+                yield k, values
+            elif domain == 'both':
+                for b, band in enumerate(zip(coeffs.unbind(-3), dfts.unbind(-3))):
+                    yield (k, b), band
+            else:
+                for b, band in enumerate(values.unbind(-3)):
+                    yield (k, b), band
+
+    def _check_forward_args(self, x, scales, domain):
+        r"""Check the arguments of ``forward``, returning the scales to compute"""
+        if domain not in ['spatial', 'fourier', 'both']:
+            raise ValueError(f"domain must be one of 'spatial', 'fourier' or 'both' but got {domain}!")
         if not isinstance(scales, list):
             raise Exception("scales must be a list!")
         if not scales:
@@ -322,101 +1007,254 @@ class Steerable_Pyramid_Freq(nn.Module):
         if len(scale_ints) != 0:
             assert (max(scale_ints) < self.num_scales) and (
                 min(scale_ints) >= 0), "Scales must be within 0 and num_scales-1"
-        angle = self.angle.copy()
-        log_rad = self.log_rad.copy()
-        lo0mask = self.lo0mask.clone()
-        hi0mask = self.hi0mask.clone()
-
         # x is a torch tensor batch of images of size [N,C,W,H]
         assert len(x.shape) == 4, "Input must be batch of images of shape BxCxHxW"
-        
-        imdft = fft.fft2(x, dim=(-2,-1), norm = self.fft_norm)
-        imdft = fft.fftshift(imdft)
-        
+        return scales
+
+    def _use_spatial_backend(self, x, domain):
+        r"""Whether to compute ``forward`` on ``x`` with the spatial backend, see ``backend``
+
+        The thresholds used by ``backend='auto'`` are rough estimates of where direct filtering
+        starts to beat the FFTs (FFT setup and mask multiplications dominate for small images,
+        while the cost of direct filtering grows with the size of the filters).
+
+        """
+        if self.backend == 'fourier':
+            return False
+        if domain != 'spatial':
+            if self.backend == 'spatial':
+                raise ValueError("The spatial backend only supports domain='spatial'!")
+            return False
+        if self.backend == 'spatial':
+            return True
+        n_images = x.shape[0] * x.shape[1]
+        n_pixels = x.shape[-2] * x.shape[-1]
+        kh, kw = self._spatial_kernel_shape(0)
+        return n_pixels <= 64*64 and n_images >= 16 and kh*kw <= 8*np.log2(n_pixels)
+
+    def _iter_levels_spatial(self, x, scales):
+        r"""Compute the pyramid coefficients one level at a time with the spatial backend
+
+        Same as ``_iter_levels`` with ``domain='spatial'``, but filtering with ``conv2d``. All
+        batches and channels are filtered at once, by folding them into the batch dimension.
+
+        """
+        batch_shape = x.shape[:-2]
+        reduced = x.dtype in reduced_precision_types
+        scale_ints = [s for s in scales if isinstance(s, int)]
+        if 'residual_lowpass' in scales:
+            last_level = self.num_scales
+        else:
+            last_level = max(scale_ints, default=-1)
+
+        def conv(signal, kernels, padding, stride=1):
+            signal = nn.functional.pad(signal, padding, mode='circular')
+            return nn.functional.conv2d(signal, kernels.to(signal.dtype), stride=stride)
+
+        def out(coeffs):
+            coeffs = coeffs.reshape(*batch_shape, *coeffs.shape[1:])
+            if not reduced:
+                return coeffs
+            return coeffs.to(_storage_dtype(x.dtype, coeffs.is_complex()))
+
+        lodata = x.to(_compute_dtype(x.dtype)).reshape(-1, 1, *x.shape[-2:])
+        filters = self._get_spatial_filters('residual')
+        # highpass and lowpass at once
+        filtered = conv(lodata, filters['kernels'], filters['padding'])
+        if 'residual_highpass' in scales:
+            yield 'residual_highpass', out(filtered[:, 0]), None
+        if last_level < 0:
+            return
+        lodata = filtered[:, 1:]
+        del filtered
+
+        for i in range(self.num_scales):
+            filters = self._get_spatial_filters('bands', i)
+            need_bands = i in scales
+            need_lowpass = i < last_level
+            if need_bands and need_lowpass and filters['stride'] == 1:
+                # without downsampling, the bands and the lowpass can be computed at once
+                filtered = conv(lodata, torch.cat([filters['bands'], filters['lowpass']]),
+                                filters['padding'])
+                bands, lodata = filtered[:, :-1], filtered[:, -1:]
+            else:
+                if need_bands:
+                    bands = conv(lodata, filters['bands'], filters['padding'])
+                if need_lowpass:
+                    lodata = conv(lodata, filters['lowpass'], filters['padding'],
+                                  filters['stride'])
+            if need_bands:
+                if self.is_complex:
+                    bands = torch.complex(bands[:, :self.num_orientations],
+                                          bands[:, self.num_orientations:])
+                yield i, out(bands), None
+                del bands
+            if not need_lowpass:
+                return
+
+        if 'residual_lowpass' in scales:
+            yield 'residual_lowpass', out(lodata[:, 0]), None
+
+    def _iter_levels(self, x, scales, domain):
+        r"""Compute the pyramid coefficients one level at a time. Used by forward and iter_forward
+
+        Yields ``(key, coeffs, dfts)`` tuples, where the oriented bands of a scale are stacked
+        (with key ``scale``) and ``coeffs`` (resp. ``dfts``) is None if ``domain='fourier'``
+        (resp. ``'spatial'``).
+
+        """
+        residual_masks = self._get_masks('residual')
+        lo0mask = residual_masks['lo0mask']
+        hi0mask = residual_masks['hi0mask']
+        scale_ints = [s for s in scales if isinstance(s, int)]
+        # coarsest level we need the low-pass DFT for
+        if 'residual_lowpass' in scales:
+            last_level = self.num_scales
+        else:
+            last_level = max(scale_ints, default=-1)
+
+        # reduced-precision inputs are analyzed in float32 and the coefficients are converted
+        # back when they're returned
+        reduced = x.dtype in reduced_precision_types
+
+        def out(coeffs):
+            if coeffs is None or not reduced:
+                return coeffs
+            return coeffs.to(_storage_dtype(x.dtype, coeffs.is_complex()))
+
+        imdft = self._fft2(x.to(_compute_dtype(x.dtype)))
+
         if 'residual_highpass' in scales:
             # high-pass
             hi0dft = imdft * hi0mask
-            hi0 = fft.ifftshift(hi0dft)
-            hi0 = fft.ifft2(hi0, dim=(-2,-1), norm=self.fft_norm)
-            pyr_coeffs['residual_highpass'] = hi0.real
-            self.pyr_size['residual_highpass'] = tuple(hi0.real.shape[-2:])
-
+            hi0, hi0dft_out = None, None
+            if domain != 'fourier':
+                hi0 = self._ifft2(hi0dft, self._level_shapes[0])
+                if hi0.is_complex():
+                    hi0 = hi0.real
+            if domain != 'spatial':
+                hi0dft_out = self._uncenter_dft(hi0dft, self._level_shapes[0], real=True)
+            del hi0dft
+            yield 'residual_highpass', out(hi0), out(hi0dft_out)
+
+        if last_level < 0:
+            return
         #input to the next scale is the low-pass filtered component
         lodft = imdft * lo0mask
+        del imdft
 
         for i in range(self.num_scales):
 
             if i in scales:
-                #high-pass mask is selected based on the current scale
-                himask = self._himasks[i]
-                #compute filter output at each orientation
-                for b in range(self.num_orientations):
-                    
-                    # band pass filtering is done in the fourier space as multiplying by the fft of a gaussian derivative.
-                    # The oriented dft is computed as a product of the fft of the low-passed component,
-                    # the precomputed anglemask (specifies orientation), and the precomputed hipass mask (creating a bandpass filter)
-                    # the complex_const variable comes from the Fourier transform of a gaussian derivative.
-                    # Based on the order of the gaussian, this constant changes.
-                    
-                  
-                    anglemask = self._anglemasks[i][b]
-                    complex_const = np.power(complex(0, -1), self.order)
-                    banddft = complex_const * lodft * anglemask * himask
-                    # fft output is then shifted to center frequencies
-                    band = fft.ifftshift(banddft)
-                    # ifft is applied to recover the filtered representation in spatial domain
-                    band = fft.ifft2(band, dim=(-2,-1), norm=self.fft_norm)
-                    
+                # band pass filtering is done in the fourier space as multiplying by the fft of a gaussian derivative.
+                # The oriented dfts are computed as a product of the fft of the low-passed component,
+                # the precomputed anglemasks (specify orientation), and the precomputed hipass mask (creating a bandpass filter)
+                # the complex_const variable comes from the Fourier transform of a gaussian derivative.
+                # Based on the order of the gaussian, this constant changes.
+                # All orientations are computed at once: lodft gets an orientation
+                # dimension, which is broadcast against the stacked anglemasks, so
+                # banddfts has shape (batch, channel, orientation, height, width)
+                masks = self._get_masks('bands', i)
+                himask = masks['himask']
+                anglemasks = masks['anglemasks']
+                complex_const = np.power(complex(0, -1), self.order)
+                banddfts = complex_const * lodft.unsqueeze(-3) * anglemasks * himask
+                # Because the input signal is real, to maintain a tight frame
+                # if the complex pyramid is used, magnitudes need to be divided by sqrt(2)
+                # because energy is doubled.
+                if self.is_complex and self.tight_frame:
+                    banddfts = banddfts/np.sqrt(2)
+
+                bands, bands_dfts = None, None
+                if domain != 'fourier':
+                    # fft output is then shifted back and the ifft is applied to
+                    # recover the filtered representation in spatial domain
+                    bands = self._ifft2(banddfts, self._level_shapes[i])
+
                     #for real pyramid, take the real component of the complex band
-                    if not self.is_complex:
-                        pyr_coeffs[(i, b)] = band.real
-                    else:
-                        
-                        # Because the input signal is real, to maintain a tight frame 
-                        # if the complex pyramid is used, magnitudes need to be divided by sqrt(2) 
-                        # because energy is doubled.
-                
-                        if self.tight_frame:
-                            band = band/np.sqrt(2)
-                        pyr_coeffs[(i, b)] = band
-                    self.pyr_size[(i, b)] = tuple(band.shape[-2:])
+                    if bands.is_complex() and not self.is_complex:
+                        bands = bands.real
+                if domain != 'spatial':
+                    bands_dfts = self._uncenter_dft(banddfts, self._level_shapes[i],
+                                                    real=not self.is_complex)
+                del banddfts
+                yield i, out(bands), out(bands_dfts)
+
+            if i >= last_level:
+                return
 
             if not self.downsample:
                 # no subsampling of angle and rad
                 # just use lo0mask
-                lomask = self._lomasks[i]
+                lomask = self._get_masks('lowpass', i)['lomask']
                 lodft = lodft * lomask
-                
+
                 # because we don't subsample here, if we are not using orthonormalization that
                 # we need to manually account for the subsampling, so that energy in each band remains the same
                 # the energy is cut by factor of 4 so we need to scale magnitudes by factor of 2
-                
+
                 if self.fft_norm != "ortho":
                     lodft = 2*lodft
             else:
                 # subsample indices
-                lostart, loend = self._loindices[i]
-
-                log_rad = log_rad[lostart[0]:loend[0], lostart[1]:loend[1]]
-                angle = angle[lostart[0]:loend[0], lostart[1]:loend[1]]
+                rows, cols = self._lo_slices(i)
 
                 # subsampling of the dft for next scale
-                lodft = lodft[:, :, lostart[0]:loend[0], lostart[1]:loend[1]]
+                lodft = lodft[..., rows, cols]
                 # low-pass filter mask is selected
-                lomask = self._lomasks[i]
+                lomask = self._get_masks('lowpass', i)['lomask']
                 # again multiply dft by subsampled mask (convolution in spatial domain)
 
                 lodft = lodft * lomask
 
         if 'residual_lowpass' in scales:
             # compute residual lowpass when height <=1
-            lo0 = fft.ifftshift(lodft)
-            lo0 = fft.ifft2(lo0, dim=(-2,-1), norm=self.fft_norm)
-            pyr_coeffs['residual_lowpass'] = lo0.real
-            self.pyr_size['residual_lowpass'] = tuple(lo0.real.shape[-2:])
+            lo0, lo0dft = None, None
+            if domain != 'fourier':
+                lo0 = self._ifft2(lodft, self._level_shapes[-1])
+                if lo0.is_complex():
+                    lo0 = lo0.real
+            if domain != 'spatial':
+                lo0dft = self._uncenter_dft(lodft, self._level_shapes[-1], real=True)
+            del lodft
+            yield 'residual_lowpass', out(lo0), out(lo0dft)
+
+    @staticmethod
+    def _store_bands(pyr_coeffs, scale, bands, stack_orientations):
+        r"""Add the (stacked) oriented bands of ``scale`` to the ``pyr_coeffs`` dictionary"""
+        if stack_orientations:
+            pyr_coeffs[scale] = bands
+        else:
+            # unbind returns views into bands, so this doesn't copy
+            for b, band in enumerate(bands.unbind(-3)):
+                pyr_coeffs[(scale, b)] = band
+
+    def _uncenter_dft(self, xdft, shape, real):
+        r"""Convert a centered DFT, as used with the masks, to the layout of ``fft2``/``rfft2``
+
+        This gives the DFT of ``self._ifft2(xdft)``. If ``real`` is True, it gives the DFT of its
+        real part instead, by projecting the DFT onto the Hermitian-symmetric DFTs, i.e., taking
+        ``(X[k] + conj(X[-k])) / 2``. If ``self.half_spectrum`` is True, only the first and (for
+        even widths) the Nyquist columns need to be projected, since ``irfft2`` handles the
+        others implicitly. ``shape`` is the spatial shape of the signal.
+
+        """
+        def conj_reflect(x, dims):
+            # x[-k] (modulo the shape), conjugated
+            return torch.roll(torch.flip(x, dims), (1,)*len(dims), dims).conj()
+
+        if self.half_spectrum:
+            xdft = fft.ifftshift(xdft, dim=-2)
+            edge_cols = [0, -1] if shape[-1] % 2 == 0 else [0]
+            edges = xdft[..., edge_cols]
+            edges = (edges + conj_reflect(edges, (-2,))) / 2
+            xdft[..., edge_cols] = edges
+            return xdft
+        xdft = fft.ifftshift(xdft, dim=(-2, -1))
+        if real:
+            xdft = (xdft + conj_reflect(xdft, (-2, -1))) / 2
+        return xdft
 
-        return pyr_coeffs
-    
     @staticmethod
     def convert_pyr_to_tensor(pyr_coeffs, split_complex=False):
         r"""
@@ -547,6 +1385,85 @@ class Steerable_Pyramid_Freq(nn.Module):
 
         return pyr_coeffs
 
+    @staticmethod
+    def pack_pyr_coeffs(pyr_coeffs):
+        r"""Pack pyramid coefficients into a single contiguous buffer
+
+        Unlike ``convert_pyr_to_tensor``, this works whether or not the pyramid is downsampled:
+        the coefficients of each batch and channel are flattened and concatenated along the last
+        dimension. Complex bands are stored with their real and imaginary parts interleaved (as
+        returned by ``torch.view_as_real``). Losses, statistics, serialization, etc. can then act
+        on all coefficients at once, and ``unpack_pyr_coeffs`` gives back the per-band views.
+
+        Parameters
+        ----------
+        pyr_coeffs : `OrderedDict`
+            the pyramid coefficients, as returned by ``forward``
+
+        Returns
+        -------
+        pyr_buffer : `torch.Tensor`
+            real tensor of shape (batch, channel, N), containing all coefficients
+        pyr_index : `list`
+            list of ``(key, offset, shape, is_complex)`` tuples, one per band, in the same order
+            as ``pyr_coeffs``. ``offset`` is the position of the band's first element along the
+            last dimension of ``pyr_buffer`` and ``shape`` is the shape of the band, without the
+            batch and channel dimensions.
+
+        Note: in order for the complex bands to be viewable as complex tensors, their offsets
+        must be even, so bands with an odd number of elements are followed by one element of
+        padding.
+
+        """
+        pyr_index = []
+        flat_coeffs = []
+        offset = 0
+        for k, v in pyr_coeffs.items():
+            is_complex = v.is_complex()
+            shape = tuple(v.shape[2:])
+            if is_complex:
+                v = torch.view_as_real(v)
+            numel = int(np.prod(v.shape[2:]))
+            flat_coeffs.append(v.reshape(*v.shape[:2], numel))
+            pyr_index.append((k, offset, shape, is_complex))
+            offset += numel
+            if offset % 2:
+                flat_coeffs.append(v.new_zeros(*v.shape[:2], 1))
+                offset += 1
+        pyr_buffer = torch.cat(flat_coeffs, dim=-1)
+        return pyr_buffer, pyr_index
+
+    @staticmethod
+    def unpack_pyr_coeffs(pyr_buffer, pyr_index):
+        r"""Get the per-band views of a buffer created by ``pack_pyr_coeffs``
+
+        No data is copied: the returned bands are views into ``pyr_buffer``, so modifying one
+        modifies the other.
+
+        Parameters
+        ----------
+        pyr_buffer : `torch.Tensor`
+            tensor of shape (batch, channel, N), as returned by ``pack_pyr_coeffs``
+        pyr_index : `list`
+            index of the buffer, as returned by ``pack_pyr_coeffs``
+
+        Returns
+        -------
+        pyr_coeffs : `OrderedDict`
+            pyramid coefficients in dictionary format
+
+        """
+        pyr_coeffs = OrderedDict()
+        for k, offset, shape, is_complex in pyr_index:
+            if is_complex:
+                shape = (*shape, 2)
+            numel = int(np.prod(shape))
+            band = pyr_buffer[..., offset:offset+numel].view(*pyr_buffer.shape[:-1], *shape)
+            if is_complex:
+                band = torch.view_as_complex(band)
+            pyr_coeffs[k] = band
+        return pyr_coeffs
+
     def _recon_levels_check(self, levels):
         r"""Check whether levels arg is valid for reconstruction and return valid version
 
@@ -726,114 +1643,230 @@ class Steerable_Pyramid_Freq(nn.Module):
             twidth = 1
 
         recon_keys = self._recon_keys(levels, bands)
-        scale = 0
 
-        # load masks from model
-        lo0mask = self.lo0mask
-        hi0mask = self.hi0mask
+        # the reconstruction has the same dtype as the coefficients (but reduced-precision
+        # coefficients are reconstructed in float32)
+        out_dtype = pyr_coeffs['residual_lowpass'].dtype
+        real_dtype = _compute_dtype(out_dtype)
+        recondft = self._recon_dft(pyr_coeffs, recon_keys, real_dtype)
 
-        # Recursively generate the reconstruction - function starts with
-        # fine scales going down to coarse and then the reconstruction
-        # is built recursively from the coarse scale up
-
-        recondft = self._recon_levels(pyr_coeffs, recon_keys, scale)
+        # load masks from model
+        residual_masks = self._get_masks('residual')
+        lo0mask = residual_masks['lo0mask'].to(real_dtype)
+        hi0mask = residual_masks['hi0mask'].to(real_dtype)
 
         # generate highpass residual Reconstruction
         if 'residual_highpass' in recon_keys:
-            hidft = fft.fft2(pyr_coeffs['residual_highpass'], dim=(-2,-1), norm=self.fft_norm)
-            hidft = fft.fftshift(hidft)
+            hidft = self._fft2(pyr_coeffs['residual_highpass'].to(real_dtype))
 
-            # output dft is the sum of the recondft from the recursive
-            # function times the lomask (low pass component) with the
+            # output dft is the sum of the recondft from the coarser
+            # scales times the lomask (low pass component) with the
             # highpass dft * the highpass mask
             outdft = recondft * lo0mask + hidft * hi0mask
         else:
             outdft = recondft * lo0mask
 
         # get output reconstruction by inverting the fft
-        reconstruction = fft.ifftshift(outdft)
-        reconstruction = fft.ifft2(reconstruction, dim=(-2,-1), norm=self.fft_norm)
+        reconstruction = self._ifft2(outdft, self._level_shapes[0])
 
         # get real part of reconstruction (if complex)
-        reconstruction = reconstruction.real
+        if reconstruction.is_complex():
+            reconstruction = reconstruction.real
+
+        return reconstruction.to(out_dtype)
+
+    def recon_packed_pyr(self, pyr_buffer, pyr_index, levels='all', bands='all'):
+        """Reconstruct the image or batch of images from packed pyramid coefficients.
+
+        Parameters
+        ----------
+        pyr_buffer : `torch.Tensor`
+            packed pyramid coefficients, as returned by ``pack_pyr_coeffs`` or
+            ``forward(x, packed=True)``
+        pyr_index : `list`
+            index of the buffer, as returned by ``pack_pyr_coeffs``
+        levels : `list`, `int`,  or {`'all'`, `'residual_highpass'`}
+            levels to reconstruct, see ``recon_pyr`` for details
+        bands : `list`, `int`, or `'all'`.
+            orientations to reconstruct, see ``recon_pyr`` for details
+
+        Returns
+        -------
+        recon : `torch.Tensor`
+            The reconstructed image or batch of images.
+            Output is of size BxCxHxW
 
-        return reconstruction
+        """
+        return self.recon_pyr(self.unpack_pyr_coeffs(pyr_buffer, pyr_index), levels, bands)
 
-    def _recon_levels(self, pyr_coeffs, recon_keys, scale):
-        """Recursive function used to build the reconstruction. Called by recon_pyr
+    def _recon_dft(self, pyr_coeffs, recon_keys, real_dtype):
+        """Build the (centered) DFT of the reconstruction of all scales. Called by recon_pyr
+
+        The reconstruction is built iteratively, from the residual lowpass up to the finest
+        scale: at each scale, the DFT of the coarser scales is low-pass filtered and upsampled
+        (by zero-padding), and the DFTs of the oriented bands are added to it. All orientations
+        of a scale are Fourier-transformed at once and summed with a single contraction against
+        the stacked angle masks.
 
         Parameters
         ----------
         pyr_coeffs : `dict`
-            Dictionary containing the coefficients of the pyramid. Keys are `(level, band)` tuples and
-            values are 1d or 2d numpy arrays (same number of dimensions as the input image)
+            Dictionary containing the coefficients of the pyramid. Keys are `(level, band)` tuples
+            and strings, values are tensors of shape (batch, channel, height, width).
         recon_keys : `list of tuples and/or strings`
             list of the keys that index into the pyr_coeffs Dictionary
-        scale : `int`
-            current scale that is being used to build the reconstruction
-            scale is incremented by 1 on each call of the function
+        real_dtype : `torch.dtype`
+            real dtype of the reconstruction. All computations are done with this dtype (or the
+            matching complex one).
 
         Returns
         -------
         recondft : `torch.Tensor`
-            Current reconstruction based on the orientation band dft from the current scale
-            summed with the output of recursive call with the next scale incremented
+            Centered DFT of the reconstruction from all scales (except the residual highpass),
+            before multiplication by ``lo0mask``.
 
         """
-        # base case, return the low-pass residual
-        if scale == self.num_scales:
-            if 'residual_lowpass' in recon_keys:
-                lodft = fft.fft2(pyr_coeffs['residual_lowpass'], dim=(-2,-1), norm=self.fft_norm)
-                lodft = fft.fftshift(lodft)
-            else:
-                lodft = fft.fft2(torch.zeros_like(pyr_coeffs['residual_lowpass'], dtype=torch.float64), dim=(-2,-1),
-                                   norm=self.fft_norm)
+        lowpass = pyr_coeffs['residual_lowpass']
+        batch_shape = lowpass.shape[:-2]
+        complex_dtype = torch.promote_types(real_dtype, torch.complex64)
+        if 'residual_lowpass' in recon_keys:
+            recondft = self._fft2(lowpass.to(real_dtype))
+        else:
+            recondft = torch.zeros((*batch_shape, *self._dft_shape(self._level_shapes[-1])),
+                                   dtype=complex_dtype, device=lowpass.device)
+
+        complex_const = np.power(complex(0, 1), self.order)
+        for scale in range(self.num_scales-1, -1, -1):
+            # in not downsampled case, rescale the magnitudes of the
+            # reconstructed dft at each level by factor of 2 to account for
+            # the scaling in the forward
+            if (not self.tight_frame) and (not self.downsample):
+                recondft = recondft/2
+            # low-pass filter the coarser scales
+            lomask = self._get_masks('lowpass', scale)['lomask'].to(real_dtype)
+            recondft = recondft * lomask
+            if self.downsample:
+                # upsample by placing the lowpass component in the
+                # zero-filled dft of this scale
+                rows, cols = self._lo_slices(scale)
+                resdft = torch.zeros((*batch_shape, *self._dft_shape(self._level_shapes[scale])),
+                                     dtype=recondft.dtype, device=recondft.device)
+                resdft[..., rows, cols] = recondft
+                recondft = resdft
+
+            # Reconstruct from orientation bands
+            band_ids = [b for b in range(self.num_orientations) if (scale, b) in recon_keys]
+            if not band_ids:
+                continue
+            masks = self._get_masks('bands', scale)
+            himask = masks['himask'].to(real_dtype)
+            anglemasks = masks['anglemasks_recon'][band_ids].to(real_dtype)
+            coeffs = torch.stack([pyr_coeffs[(scale, b)] for b in band_ids], dim=-3)
+            if self.tight_frame and self.is_complex:
+                coeffs = coeffs*np.sqrt(2)
+            coeffs = coeffs.to(complex_dtype if coeffs.is_complex() else real_dtype)
+            # batched fft over all orientations, shape (batch, channel, orientation, height, width)
+            banddfts = self._fft2(coeffs)
+            orientdft = self._sum_orientations(banddfts, anglemasks)
+            recondft = recondft + complex_const * orientdft * himask
 
-            return lodft
+        return recondft
 
-        # Reconstruct from orientation bands
-        # update himask
-        himask = self._himasks[scale]
-        if self.is_complex:
-            tensor_type = torch.complex64
-        else:
-            tensor_type = torch.float64
-        orientdft = torch.zeros_like(pyr_coeffs[(scale, 0)], dtype=tensor_type)
+    @staticmethod
+    def _sum_orientations(banddfts, anglemasks):
+        r"""Sum the DFTs of the oriented bands of a scale, weighted by the angle masks
 
-        for b in range(self.num_orientations):
-            if (scale, b) in recon_keys:
-                anglemask = self._anglemasks_recon[scale][b]
-                coeffs = pyr_coeffs[(scale,b)]
-                if self.tight_frame and self.is_complex:
-                    coeffs = coeffs*np.sqrt(2)
+        We contract the real and imaginary parts against the real masks, which avoids making
+        complex copies of the masks.
 
-                banddft = fft.fft2(coeffs, dim=(-2,-1), norm=self.fft_norm)
-                banddft = fft.fftshift(banddft)
+        Parameters
+        ----------
+        banddfts : `torch.Tensor`
+            complex tensor of shape (..., orientation, height, width)
+        anglemasks : `torch.Tensor`
+            real tensor of shape (orientation, height, width), with the same precision as
+            ``banddfts``
 
-                complex_const = np.power(complex(0, 1), self.order)
-                banddft = complex_const * banddft * anglemask * himask
-                orientdft = orientdft + banddft
+        Returns
+        -------
+        orientdft : `torch.Tensor`
+            complex tensor of shape (..., height, width)
 
-        # get the bounding box indices for the low-pass component
-        lostart, loend = self._loindices[scale]
+        """
+        orientdft = torch.einsum('...ohwc,ohw->...hwc', torch.view_as_real(banddfts),
+                                 anglemasks)
+        return torch.view_as_complex(orientdft.contiguous())
 
-        # create lowpass mask
-        lomask = self._lomasks[scale]
-        # Recursively reconstruct by going to the next scale
-        reslevdft = self._recon_levels(pyr_coeffs, recon_keys, scale+1)
-        #in not downsampled case, rescale the magnitudes of the reconstructed dft at each level by factor of 2 to account for the scaling in the forward 
-        if (not self.tight_frame) and (not self.downsample):
-            reslevdft = reslevdft/2
-        # create output for reconstruction result
-        resdft = torch.zeros_like(pyr_coeffs[(scale, 0)], dtype=torch.complex64)
-
-        # place upsample and convolve lowpass component
-        resdft[:, :, lostart[0]:loend[0],
-               lostart[1]:loend[1]] = reslevdft*lomask
-        recondft = resdft + orientdft
-        # add orientation interpolated and added images to the lowpass image
-        return recondft
+    def _adjoint(self, grads, x_shape, real_dtype):
+        r"""Apply the adjoint of ``forward`` to the gradients of its outputs
 
+        ``forward`` is a (real-)linear operator, so the gradient of its input is given by its
+        adjoint applied to the gradients of its outputs. The adjoint mirrors the structure of
+        ``recon_pyr``: it goes from the residual lowpass up to the finest scale, using the
+        analysis masks and the adjoints of the FFTs.
+
+        Parameters
+        ----------
+        grads : `dict`
+            gradients of the outputs of ``forward``, with stacked orientations. Outputs whose
+            gradient is None should be absent.
+        x_shape : `torch.Size`
+            shape of the input of ``forward``
+        real_dtype : `torch.dtype`
+            dtype of the input of ``forward``
+
+        Returns
+        -------
+        grad_x : `torch.Tensor`
+            gradient of the input of ``forward``
+
+        """
+        device = next(iter(grads.values())).device
+        batch_shape = x_shape[:-2]
+        out_dtype = real_dtype
+        real_dtype = _compute_dtype(real_dtype)
+        complex_dtype = torch.promote_types(real_dtype, torch.complex64)
+
+        def zeros(level):
+            return torch.zeros((*batch_shape, *self._dft_shape(self._level_shapes[level])),
+                               dtype=complex_dtype, device=device)
+
+        if 'residual_lowpass' in grads:
+            graddft = self._ifft2_adjoint(grads['residual_lowpass'].to(real_dtype))
+        else:
+            graddft = zeros(-1)
+
+        # the adjoint of multiplying by (-i)^order
+        complex_const = np.power(complex(0, 1), self.order)
+        for scale in range(self.num_scales-1, -1, -1):
+            lomask = self._get_masks('lowpass', scale)['lomask'].to(real_dtype)
+            graddft = graddft * lomask
+            if not self.downsample:
+                if self.fft_norm != "ortho":
+                    graddft = 2*graddft
+            else:
+                # the adjoint of cropping is zero-padding
+                rows, cols = self._lo_slices(scale)
+                paddeddft = zeros(scale)
+                paddeddft[..., rows, cols] = graddft
+                graddft = paddeddft
+
+            if scale in grads:
+                grad = grads[scale]
+                if self.is_complex and self.tight_frame:
+                    grad = grad/np.sqrt(2)
+                grad = grad.to(complex_dtype if grad.is_complex() else real_dtype)
+                masks = self._get_masks('bands', scale)
+                orientdft = self._sum_orientations(self._ifft2_adjoint(grad),
+                                                   masks['anglemasks'].to(real_dtype))
+                graddft = graddft + complex_const * orientdft * masks['himask'].to(real_dtype)
+
+        residual_masks = self._get_masks('residual')
+        graddft = graddft * residual_masks['lo0mask'].to(real_dtype)
+        if 'residual_highpass' in grads:
+            hi0dft = self._ifft2_adjoint(grads['residual_highpass'].to(real_dtype))
+            graddft = graddft + hi0dft * residual_masks['hi0mask'].to(real_dtype)
+        return self._fft2_adjoint(graddft, self._level_shapes[0]).to(out_dtype)
 
     def steer_coeffs(self, pyr_coeffs, angles, even_phase=True):
         """Steer pyramid coefficients to the specified angles
@@ -844,9 +1877,11 @@ class Steerable_Pyramid_Freq(nn.Module):
         Parameters
         ----------
         pyr_coeffs : `OrderedDict`
-            the pyramid coefficients to steer 
+            the pyramid coefficients to steer, as returned by ``forward`` (with or without
+            ``stack_orientations``)
         angles : `list`
-            list of angles (in radians) to steer the pyramid coefficients to
+            list (or 1d array or tensor) of angles (in radians) to steer the pyramid coefficients
+            to. The coefficients are steered to all of them at once.
         even_phase : `bool`
             specifies whether the harmonics are cosine or sine phase aligned about those positions.
 
@@ -862,20 +1897,30 @@ class Steerable_Pyramid_Freq(nn.Module):
             keys as `resteered_coeffs`.
 
         """
-        assert  pyr_coeffs[(0,0)].dtype not in complex_types, "steering only implemented for real coefficients"
-        resteered_coeffs = {}
-        resteering_weights = {}
         num_scales = self.num_scales
         num_orientations = self.num_orientations
-        for i in range(num_scales):
-            basis = torch.cat([pyr_coeffs[(i, j)].squeeze().unsqueeze(-1) for j in
-                               range(num_orientations)], dim=-1)
-
-            for j, a in enumerate(angles):
-                res, steervect = steer(
-                    basis, a, return_weights=True, even_phase=even_phase)
-                resteering_weights[(i, j)] = steervect
-                resteered_coeffs[(i, num_orientations + j)] = res.reshape(pyr_coeffs[(i, 0)].shape)
 
+        def basis(i):
+            # (batch, channel, orientation, height, width), whether or not the
+            # orientations were stacked by forward
+            if i in pyr_coeffs:
+                return pyr_coeffs[i]
+            return torch.stack([pyr_coeffs[(i, j)] for j in range(num_orientations)], dim=-3)
+
+        coeffs = basis(0)
+        assert coeffs.dtype not in complex_types, "steering only implemented for real coefficients"
+        # the steering vectors don't depend on the scale, so we compute them once, for all
+        # angles, on the coefficients' device
+        steervects = steering_weights(angles, num_orientations, even_phase=even_phase,
+                                      dtype=coeffs.dtype, device=coeffs.device)
+        resteered_coeffs = {}
+        resteering_weights = {}
+        for i in range(num_scales):
+            if i > 0:
+                coeffs = basis(i)
+            resteered = torch.einsum('...ohw,ao->...ahw', coeffs, steervects)
+            for j in range(steervects.shape[0]):
+                resteering_weights[(i, j)] = steervects[j]
+                resteered_coeffs[(i, num_orientations + j)] = resteered[..., j, :, :]
 
         return resteered_coeffs, resteering_weights
@@ -0,0 +1,250 @@
+import os
+from collections import OrderedDict
+from itertools import product
+import numpy as np
+import torch
+from .steerable_pyramid_freq import Steerable_Pyramid_Freq, _storage_dtype
+
+# numpy has neither bfloat16 nor complex32, so coefficients with these dtypes are stored with the
+# (larger) dtype they're computed with
+_NUMPY_STORAGE_DTYPES = {torch.bfloat16: torch.float32}
+if hasattr(torch, 'chalf'):
+    _NUMPY_STORAGE_DTYPES[torch.chalf] = torch.complex64
+
+
+def _index_runs(idx):
+    r"""Split an array of indices into runs of consecutive indices
+
+    Each run is either increasing or decreasing by 1 at each step, so it can
+    be read from an array with a single slice (flipped if decreasing).
+
+    """
+    runs = [[idx[0]]]
+    for i in idx[1:]:
+        run = runs[-1]
+        step = i - run[-1]
+        if abs(step) != 1 or (len(run) > 1 and step != run[-1] - run[-2]):
+            runs.append([i])
+        else:
+            run.append(i)
+    return [np.array(r) for r in runs]
+
+
+def _read_block(x, rows, cols):
+    r"""Read ``x[..., rows, :][..., cols]`` for runs of consecutive indices, as a tensor"""
+    block = x[..., rows.min():rows.max()+1, cols.min():cols.max()+1]
+    if not torch.is_tensor(block):
+        block = torch.as_tensor(np.ascontiguousarray(block))
+    flip_dims = [d for d, idx in zip([-2, -1], [rows, cols]) if len(idx) > 1 and idx[1] < idx[0]]
+    if flip_dims:
+        block = torch.flip(block, flip_dims)
+    return block
+
+
+class Tiled_Steerable_Pyramid_Freq(object):
+    r"""Steerable pyramid of large images, computed tile by tile
+
+    ``Steerable_Pyramid_Freq`` needs the whole image in a single FFT, so the size of the images
+    it can analyze is limited by memory. This computes (an approximation of) the same
+    coefficients with overlap-save: the image is split into tiles, each tile is padded with
+    ``overlap`` pixels of its surroundings on every side (using the boundary handling given by
+    ``boundary`` at the edges of the image), the pyramid of this padded tile is computed and only
+    the coefficients corresponding to the center of the tile are kept. Peak memory is thus set by
+    the tile size, not by the image size.
+
+    Since the pyramid filters are not compactly supported, the coefficients are not exactly
+    identical to those of the full-image pyramid, but the error decreases quickly as the overlap
+    increases (it should be several times the support of the coarsest filters of interest, i.e.,
+    several times ``2**height`` pixels).
+
+    The image can be any array that supports slicing (``torch.Tensor``, ``np.ndarray``,
+    ``np.memmap``, ...) of shape ``(height, width)`` or ``(batch, channel, height, width)``: only the
+    region needed for each tile is read. This is meant for analysis, so gradients are not tracked.
+    Each tile is cast to the dtype of the pyramid, so a pyramid cast to ``torch.float16`` or
+    ``torch.bfloat16`` (with ``.to``) analyzes the image in reduced precision (see
+    ``Steerable_Pyramid_Freq.precision_report``), whatever the dtype of the image.
+
+    Parameters
+    ----------
+    tile_shape : `list or tuple`
+        shape of the center of the tiles. If the pyramid is downsampled, must be a multiple of
+        ``2**height``, so that the coefficients of all tiles line up.
+    overlap : `int`
+        number of pixels each tile is padded with on every side. If the pyramid is downsampled,
+        must be a multiple of ``2**height``.
+    boundary : {'circular', 'reflect'}
+        how to pad the image beyond its edges. ``'circular'`` matches the (periodic) boundary
+        handling of ``Steerable_Pyramid_Freq``.
+    height : `int`
+        The height of the pyramid (note that, unlike ``Steerable_Pyramid_Freq``, this can't be
+        'auto', since it's limited by the size of the padded tiles rather than the image).
+    pyr_kwargs :
+        passed to ``Steerable_Pyramid_Freq`` (e.g., ``order``, ``is_complex``, ``downsample``,
+        ``tight_frame``), which is initialized with the shape of the padded tiles.
+
+    Attributes
+    ----------
+    pyr : `Steerable_Pyramid_Freq`
+        the pyramid used on each padded tile
+
+    """
+
+    def __init__(self, tile_shape, overlap, height, boundary='circular', **pyr_kwargs):
+        if boundary not in ['circular', 'reflect']:
+            raise ValueError(f"boundary must be one of 'circular' or 'reflect' but got {boundary}!")
+        self.tile_shape = tuple(int(t) for t in tile_shape)
+        self.overlap = int(overlap)
+        self.boundary = boundary
+        padded_shape = tuple(t + 2*self.overlap for t in self.tile_shape)
+        self.pyr = Steerable_Pyramid_Freq(padded_shape, height=height, **pyr_kwargs)
+        if self.pyr.downsample:
+            factor = 2**self.pyr.num_scales
+            if any([t % factor for t in self.tile_shape]) or self.overlap % factor:
+                raise ValueError(f"tile_shape and overlap must be multiples of 2**height={factor}"
+                                 " when downsampling!")
+
+    def to(self, *args, **kwargs):
+        r"""Move and/or cast the pyramid, see ``Steerable_Pyramid_Freq.to``"""
+        self.pyr = self.pyr.to(*args, **kwargs)
+        return self
+
+    def _factor(self, key):
+        r"""Downsampling factor of the band ``key``"""
+        if not self.pyr.downsample or key == 'residual_highpass':
+            return 1
+        if key == 'residual_lowpass':
+            return 2**self.pyr.num_scales
+        return 2**key[0]
+
+    def _keys(self):
+        keys = ['residual_highpass']
+        keys += [(i, b) for i in range(self.pyr.num_scales)
+                 for b in range(self.pyr.num_orientations)]
+        return keys + ['residual_lowpass']
+
+    def band_shapes(self, image_shape):
+        r"""Spatial shape of each band of the pyramid of an image with spatial shape ``image_shape``
+
+        Returns
+        -------
+        band_shapes : `OrderedDict`
+            dictionary with the same keys as the pyramid coefficients and the corresponding
+            shapes.
+
+        """
+        return OrderedDict((k, tuple(int(np.ceil(s / self._factor(k))) for s in image_shape))
+                           for k in self._keys())
+
+    def _padded_indices(self, start, stop, n):
+        r"""Indices into an axis of length ``n`` of the range ``[start, stop)``, which can go
+        beyond the edges of the axis, in which case they are handled according to
+        ``self.boundary``"""
+        idx = np.arange(start, stop)
+        if self.boundary == 'circular':
+            return idx % n
+        if n == 1:
+            # there's nothing to reflect, the single sample is repeated
+            return np.zeros_like(idx)
+        # reflect without repeating the edge, as np.pad(mode='reflect')
+        period = 2 * (n - 1)
+        idx = np.abs(idx) % period
+        return np.where(idx >= n, period - idx, idx)
+
+    def _read_tile(self, x, rows, cols):
+        r"""Read the region of ``x`` at ``rows`` and ``cols``, with ``x`` of shape (..., height,
+        width), as a 4d tensor on the device and with the dtype of the pyramid"""
+        row_blocks = []
+        for r in _index_runs(rows):
+            row_blocks.append(torch.cat([_read_block(x, r, c) for c in _index_runs(cols)],
+                                        dim=-1))
+        tile = torch.cat(row_blocks, dim=-2)
+        while tile.ndimension() < 4:
+            tile = tile.unsqueeze(0)
+        return tile.to(device=self.pyr._device, dtype=self.pyr._dtype)
+
+    def iter_tiles(self, x):
+        r"""Compute the pyramid coefficients of ``x``, one tile at a time
+
+        Parameters
+        ----------
+        x : array_like
+            The image to analyze, of shape ``(height, width)`` or ``(batch, channel, height,
+            width)``
+
+        Yields
+        ------
+        tile_slices : `OrderedDict`
+            for each band, the ``(rows, cols)`` slices locating the tile in the band of the full
+            image.
+        tile_coeffs : `OrderedDict`
+            the pyramid coefficients of the tile, with shape (batch, channel, height, width).
+
+        """
+        image_shape = x.shape[-2:]
+        band_shapes = self.band_shapes(image_shape)
+        tile_starts = [range(0, s, t) for s, t in zip(image_shape, self.tile_shape)]
+        for r0, c0 in product(*tile_starts):
+            rows = self._padded_indices(r0 - self.overlap,
+                                        r0 + self.tile_shape[0] + self.overlap, image_shape[0])
+            cols = self._padded_indices(c0 - self.overlap,
+                                        c0 + self.tile_shape[1] + self.overlap, image_shape[1])
+            with torch.no_grad():
+                pyr_coeffs = self.pyr.forward(self._read_tile(x, rows, cols))
+            tile_slices = OrderedDict()
+            tile_coeffs = OrderedDict()
+            for k, v in pyr_coeffs.items():
+                f = self._factor(k)
+                # the part of the tile in the band, cropping the tile at the
+                # edges of the image
+                start = (r0 // f, c0 // f)
+                stop = [min((s + t) // f, b) for s, t, b in zip((r0, c0), self.tile_shape,
+                                                                 band_shapes[k])]
+                margin = self.overlap // f
+                tile_slices[k] = (slice(start[0], stop[0]), slice(start[1], stop[1]))
+                tile_coeffs[k] = v[..., margin:margin+stop[0]-start[0],
+                                   margin:margin+stop[1]-start[1]]
+            yield tile_slices, tile_coeffs
+
+    def forward_to_memmap(self, x, directory):
+        r"""Compute the pyramid coefficients of ``x`` tile by tile, writing them to disk
+
+        Each band is written to a memory-mapped ``.npy`` file in ``directory``, which can then be
+        loaded with ``np.load(path, mmap_mode='r')``.
+
+        Parameters
+        ----------
+        x : array_like
+            The image to analyze, of shape ``(height, width)`` or ``(batch, channel, height,
+            width)``
+        directory : `str`
+            directory to write the bands to. It will be created if it doesn't exist.
+
+        Returns
+        -------
+        pyr_coeffs : `OrderedDict`
+            the pyramid coefficients, as ``np.memmap`` of shape (batch, channel, height, width).
+            They have the dtype of the coefficients of the pyramid, except for ``bfloat16`` and
+            ``complex32``, which numpy doesn't support, and which are stored as ``float32`` and
+            ``complex64``.
+
+        """
+        os.makedirs(directory, exist_ok=True)
+        batch_shape = tuple(x.shape[:-2])
+        while len(batch_shape) < 2:
+            batch_shape = (1, *batch_shape)
+        pyr_coeffs = OrderedDict()
+        dtypes = {}
+        for k, shape in self.band_shapes(x.shape[-2:]).items():
+            dtype = _storage_dtype(self.pyr._dtype, self.pyr.is_complex and isinstance(k, tuple))
+            dtypes[k] = _NUMPY_STORAGE_DTYPES.get(dtype, dtype)
+            name = k if isinstance(k, str) else f'band_{k[0]}_{k[1]}'
+            pyr_coeffs[k] = np.lib.format.open_memmap(
+                os.path.join(directory, f'{name}.npy'), mode='w+',
+                dtype=torch.empty(0, dtype=dtypes[k]).numpy().dtype, shape=(*batch_shape, *shape))
+        for tile_slices, tile_coeffs in self.iter_tiles(x):
+            for k, v in tile_coeffs.items():
+                pyr_coeffs[k][..., tile_slices[k][0], tile_slices[k][1]] = \
+                    v.to(device='cpu', dtype=dtypes[k]).numpy()
+        for v in pyr_coeffs.values():
+            v.flush()
+        return pyr_coeffs
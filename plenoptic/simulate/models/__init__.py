@@ -1,3 +1,4 @@
 from .frontend import *
 from .naive import *
-from .portilla_simoncelli import PortillaSimoncelli
\ No newline at end of file
+from .portilla_simoncelli import PortillaSimoncelli
+from .texture_statistics import extract_texture_statistics
@@ -51,6 +51,8 @@ class LinearNonlinear(nn.Module):
 
     activation:
         Activation function following linear convolution.
+    backend:
+        Convolution backend, see `plenoptic.tools.conv.same_conv2d`.
 
     Attributes
     ----------
@@ -73,6 +75,7 @@ class LinearNonlinear(nn.Module):
         pad_mode: str = "reflect",
 
         activation: Callable[[Tensor], Tensor] = F.softplus,
+        backend: str = "spatial",
     ):
         super().__init__()
         self.center_surround = CenterSurround(
@@ -81,6 +84,7 @@ class LinearNonlinear(nn.Module):
             width_ratio_limit,
             amplitude_ratio,
             pad_mode=pad_mode,
+            backend=backend,
         )
         self.activation = activation
 
@@ -134,6 +138,8 @@ class LuminanceGainControl(nn.Module):
 
     activation:
         Activation function following linear convolution.
+    backend:
+        Convolution backend, see `plenoptic.tools.conv.same_conv2d`.
 
     Attributes
     ----------
@@ -159,6 +165,7 @@ class LuminanceGainControl(nn.Module):
         pad_mode: str = "reflect",
 
         activation: Callable[[Tensor], Tensor] = F.softplus,
+        backend: str = "spatial",
     ):
         super().__init__()
         self.center_surround = CenterSurround(
@@ -167,8 +174,9 @@ class LuminanceGainControl(nn.Module):
             width_ratio_limit,
             amplitude_ratio,
             pad_mode=pad_mode,
+            backend=backend,
         )
-        self.luminance = Gaussian(kernel_size=kernel_size)
+        self.luminance = Gaussian(kernel_size=kernel_size, backend=backend)
         self.luminance_scalar = nn.Parameter(torch.rand(1) * 10)
         self.activation = activation
 
@@ -232,6 +240,8 @@ class LuminanceContrastGainControl(nn.Module):
         Padding for convolution, defaults to "reflect".
     activation:
         Activation function following linear convolution.
+    backend:
+        Convolution backend, see `plenoptic.tools.conv.same_conv2d`.
 
     Attributes
     ----------
@@ -262,6 +272,7 @@ class LuminanceContrastGainControl(nn.Module):
         pad_mode: str = "reflect",
 
         activation: Callable[[Tensor], Tensor] = F.softplus,
+        backend: str = "spatial",
     ):
         super().__init__()
 
@@ -271,9 +282,10 @@ class LuminanceContrastGainControl(nn.Module):
             width_ratio_limit,
             amplitude_ratio,
             pad_mode=pad_mode,
+            backend=backend,
         )
-        self.luminance = Gaussian(kernel_size)
-        self.contrast = Gaussian(kernel_size)
+        self.luminance = Gaussian(kernel_size, backend=backend)
+        self.contrast = Gaussian(kernel_size, backend=backend)
 
         self.luminance_scalar = nn.Parameter(torch.rand(1) * 10)
         self.contrast_scalar = nn.Parameter(torch.rand(1) * 10)
@@ -350,6 +362,11 @@ class OnOff(nn.Module):
         useful for synthesis methods like Eigendistortions to ensure that the
         synthesized distortion will not appear in the periphery. See
         `plenoptic.tools.signal.make_disk()` for details on how mask is created.
+    cache_filt:
+        Whether or not to cache the filters. Avoids regenerating them with each
+        forward pass.
+    backend:
+        Convolution backend, see `plenoptic.tools.conv.same_conv2d`.
 
     Notes
     -----
@@ -374,7 +391,7 @@ class OnOff(nn.Module):
         activation: Callable[[Tensor], Tensor] = F.softplus,
         apply_mask: bool = False,
         cache_filt: bool = False,
-
+        backend: str = "spatial",
     ):
         super().__init__()
         if isinstance(kernel_size, int):
@@ -393,6 +410,7 @@ class OnOff(nn.Module):
             out_channels=2,
             pad_mode=pad_mode,
             cache_filt=cache_filt,
+            backend=backend,
         )
 
         self.luminance = Gaussian(
@@ -400,6 +418,7 @@ class OnOff(nn.Module):
            out_channels=2,
            pad_mode=pad_mode,
            cache_filt=cache_filt,
+           backend=backend,
         )
 
         self.contrast = Gaussian(
@@ -407,6 +426,7 @@ class OnOff(nn.Module):
            out_channels=2,
            pad_mode=pad_mode,
            cache_filt=cache_filt,
+           backend=backend,
         )
 
         # init scalar values around fitted parameters found in Berardino et al 2017
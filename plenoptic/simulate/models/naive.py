@@ -5,7 +5,7 @@ from torch import Tensor
 import numpy as np
 from torch.nn import functional as F
 
-from plenoptic.tools.conv import same_padding
+from plenoptic.tools.conv import same_padding, same_conv2d
 from plenoptic.simulate.canonical_computations.filters import circular_gaussian2d
 
 __all__ = ["Identity", "Linear", "Gaussian", "CenterSurround"]
@@ -54,6 +54,8 @@ class Linear(nn.Module):
         Mode with which to pad image using `nn.functional.pad()`.
     default_filters:
         Initialize the filters to a low-pass and a band-pass.
+    backend:
+        Convolution backend, see `plenoptic.tools.conv.same_conv2d`.
     """
 
     def __init__(
@@ -61,6 +63,7 @@ class Linear(nn.Module):
         kernel_size: Union[int, Tuple[int, int]] = (3, 3),
         pad_mode: str = "circular",
         default_filters: bool = True,
+        backend: str = "spatial",
     ):
         super().__init__()
 
@@ -69,6 +72,7 @@ class Linear(nn.Module):
 
         self.kernel_size = kernel_size
         self.pad_mode = pad_mode
+        self.backend = backend
 
         self.conv = nn.Conv2d(1, 2, kernel_size, bias=False)
 
@@ -84,8 +88,7 @@ class Linear(nn.Module):
             self.conv.weight.data = torch.cat([f1, f2], dim=0)
 
     def forward(self, x: Tensor) -> Tensor:
-        y = same_padding(x, self.kernel_size, pad_mode=self.pad_mode)
-        h = self.conv(y)
+        h = same_conv2d(x, self.conv.weight, pad_mode=self.pad_mode, backend=self.backend)
         return h
 
 
@@ -106,6 +109,8 @@ class Gaussian(nn.Module):
     cache_filt:
         Whether or not to cache the filter. Avoids regenerating filt with each
         forward pass. Cached to `self._filt`.
+    backend:
+        Convolution backend, see `plenoptic.tools.conv.same_conv2d`.
     """
 
     def __init__(
@@ -115,6 +120,7 @@ class Gaussian(nn.Module):
         pad_mode: str = "reflect",
         out_channels: int = 1,
         cache_filt: bool = False,
+        backend: str = "spatial",
     ):
         super().__init__()
         assert std > 0, "Gaussian standard deviation must be positive"
@@ -127,6 +133,7 @@ class Gaussian(nn.Module):
         self.kernel_size = kernel_size
         self.pad_mode = pad_mode
         self.out_channels = out_channels
+        self.backend = backend
 
         self.cache_filt = cache_filt
         self._filt = None
@@ -145,8 +152,13 @@ class Gaussian(nn.Module):
     def forward(self, x: Tensor, **conv2d_kwargs) -> Tensor:
         self.std.data = self.std.data.abs()  # ensure stdev is positive
 
-        x = same_padding(x, self.kernel_size, pad_mode=self.pad_mode)
-        y = F.conv2d(x, self.filt, **conv2d_kwargs)
+        groups = conv2d_kwargs.pop("groups", 1)
+        if conv2d_kwargs:
+            # e.g., stride or dilation, which only F.conv2d supports
+            x = same_padding(x, self.kernel_size, pad_mode=self.pad_mode)
+            return F.conv2d(x, self.filt, groups=groups, **conv2d_kwargs)
+        y = same_conv2d(x, self.filt, pad_mode=self.pad_mode, groups=groups,
+                        backend=self.backend)
 
         return y
 
@@ -192,6 +204,8 @@ class CenterSurround(nn.Module):
     cache_filt:
         Whether or not to cache the filter. Avoids regenerating filt with each
         forward pass. Cached to `self._filt`
+    backend:
+        Convolution backend, see `plenoptic.tools.conv.same_conv2d`.
     """
 
     def __init__(
@@ -205,6 +219,7 @@ class CenterSurround(nn.Module):
         out_channels: int = 1,
         pad_mode: str = "reflect",
         cache_filt: bool = False,
+        backend: str = "spatial",
     ):
         super().__init__()
 
@@ -233,6 +248,7 @@ class CenterSurround(nn.Module):
 
         self.out_channels = out_channels
         self.pad_mode = pad_mode
+        self.backend = backend
 
         self.cache_filt = cache_filt
         self._filt = None
@@ -266,8 +282,7 @@ class CenterSurround(nn.Module):
             self.surround_std[i].data = self.surround_std[i].data.clamp(min=float(lb))
 
     def forward(self, x: Tensor) -> Tensor:
-        x = same_padding(x, self.kernel_size, pad_mode=self.pad_mode)
         self._clamp_surround_std()  # clip the surround stdev
 
-        y = F.conv2d(x, self.filt, bias=None)
+        y = same_conv2d(x, self.filt, pad_mode=self.pad_mode, backend=self.backend)
         return y
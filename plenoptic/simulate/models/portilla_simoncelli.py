@@ -9,6 +9,144 @@ import matplotlib.pyplot as plt
 import matplotlib as mpl
 from ...tools.display import clean_up_axes, update_stem, clean_stem_plot
 from ...tools.data import to_numpy
+from ...tools.signal import expand
+
+
+def _detach(x):
+    r"""Detach the tensors in ``x``, which can be a (nested) dictionary of tensors"""
+    if isinstance(x, dict):
+        return OrderedDict((k, _detach(v)) for k, v in x.items())
+    if torch.is_tensor(x):
+        return x.detach()
+    return x
+
+
+class _Autocorrelation(torch.autograd.Function):
+    """Central (circular, unnormalized) auto-correlation with an analytic backward
+
+    Returns the auto-correlation of ``x`` (of shape (..., height, width)) for
+    shifts up to ``le`` in each direction, as in
+    ``PortillaSimoncelli.compute_autocorrelation``. Only ``x`` is saved: the
+    backward pass recomputes its spectrum, since the gradient with respect
+    to ``x`` is the circular correlation of ``x`` with the (symmetrized)
+    gradient of the auto-correlation.
+
+    """
+
+    @staticmethod
+    def forward(ctx, x, le):
+        ctx.save_for_backward(x)
+        ctx.le = le
+        h, w = x.shape[-2:]
+        spectrum = torch.fft.rfft2(x)
+        ac = torch.fft.irfft2(spectrum.real.pow(2) + spectrum.imag.pow(2), s=(h, w))
+        ac = torch.fft.fftshift(ac, dim=(-2, -1)) / (h * w)
+        return ac[..., h // 2 - le : h // 2 + le + 1, w // 2 - le : w // 2 + le + 1]
+
+    @staticmethod
+    def backward(ctx, grad):
+        x, = ctx.saved_tensors
+        le = ctx.le
+        h, w = x.shape[-2:]
+        # the gradient of each shift, placed at that shift
+        grad_full = torch.zeros_like(x)
+        grad_full[..., h // 2 - le : h // 2 + le + 1, w // 2 - le : w // 2 + le + 1] = grad
+        grad_full = torch.fft.ifftshift(grad_full, dim=(-2, -1))
+        spectrum = torch.fft.rfft2(x) * torch.fft.rfft2(grad_full).real
+        return 2 * torch.fft.irfft2(spectrum, s=(h, w)) / (h * w), None
+
+
+class _GramCrossCorrelation(torch.autograd.Function):
+    """Cross-correlations between the columns of a matrix and those of a list of matrices, with
+    an analytic backward
+
+    Computes the product of the transpose of the first matrix with the
+    concatenation of all the matrices (of shape (..., n_pixels, n_i)),
+    divided by ``band_num_el`` and, if ``normalize``, by the standard
+    deviations of the matrices the two columns belong to, as in
+    ``PortillaSimoncelli._gram_crosscorrelation``. Only the matrices, the
+    (small) output and the standard deviations are saved; their concatenation
+    is recomputed in the backward pass.
+
+    """
+
+    @staticmethod
+    def forward(ctx, band_num_el, normalize, *matrices):
+        stacked = torch.cat(matrices, dim=-1)
+        corr = torch.einsum('...pi,...pj->...ij', matrices[0], stacked) / band_num_el
+        stds = [m.flatten(start_dim=-2).std(-1) for m in matrices] if normalize else []
+        if normalize:
+            std = torch.cat([sd.unsqueeze(-1).expand(*m.shape[:-2], m.shape[-1])
+                             for sd, m in zip(stds, matrices)], dim=-1)
+            corr = corr / (stds[0][..., None, None] * std[..., None, :])
+        ctx.band_num_el = band_num_el
+        ctx.normalize = normalize
+        ctx.n_matrices = len(matrices)
+        ctx.save_for_backward(*matrices, corr, *stds)
+        return corr
+
+    @staticmethod
+    def backward(ctx, grad):
+        matrices = ctx.saved_tensors[:ctx.n_matrices]
+        corr = ctx.saved_tensors[ctx.n_matrices]
+        stds = ctx.saved_tensors[ctx.n_matrices + 1:]
+        sizes = [m.shape[-1] for m in matrices]
+        grad_gram = grad / ctx.band_num_el
+        if ctx.normalize:
+            std = torch.cat([sd.unsqueeze(-1).expand(*m.shape[:-2], m.shape[-1])
+                             for sd, m in zip(stds, matrices)], dim=-1)
+            grad_gram = grad_gram / (stds[0][..., None, None] * std[..., None, :])
+        stacked = torch.cat(matrices, dim=-1)
+        # the first matrix is both the left and (part of) the right factor
+        grads = list((matrices[0] @ grad_gram).split(sizes, -1))
+        grads[0] = grads[0] + stacked @ grad_gram.transpose(-1, -2)
+        if ctx.normalize:
+            # the standard deviation of the first matrix scales all the rows, and each
+            # standard deviation scales the columns of its matrix
+            grad_corr = grad * corr
+            grad_std = [g.sum(-1) for g in grad_corr.sum(-2).split(sizes, -1)]
+            grad_std[0] = grad_std[0] + grad_corr.sum((-2, -1))
+            for i, (m, sd) in enumerate(zip(matrices, stds)):
+                grad_sd = -grad_std[i] / sd
+                centered = m - m.mean(dim=(-2, -1), keepdim=True)
+                n = m.shape[-2] * m.shape[-1]
+                grads[i] = grads[i] + (grad_sd / ((n - 1) * sd))[..., None, None] * centered
+        return (None, None, *grads)
+
+
+class _CentralMoment(torch.autograd.Function):
+    """Central moment over the last two dimensions, with an analytic backward
+
+    Computes ``mean((x - mu)**order)`` over the last two dimensions of ``x``,
+    saving only ``x`` and ``mu`` instead of the powers of ``x - mu``.
+
+    """
+
+    @staticmethod
+    def forward(ctx, x, mu, order):
+        ctx.save_for_backward(x, mu)
+        ctx.order = order
+        return torch.mean((x - mu[..., None, None]).pow(order), dim=(-2, -1))
+
+    @staticmethod
+    def backward(ctx, grad):
+        x, mu = ctx.saved_tensors
+        order = ctx.order
+        grad_x = (x - mu[..., None, None]).pow(order - 1)
+        grad_x = grad_x * (order * grad / (x.shape[-2] * x.shape[-1]))[..., None, None]
+        grad_mu = None
+        if ctx.needs_input_grad[1]:
+            grad_mu = -grad_x.sum(dim=(-2, -1))
+        return grad_x, grad_mu, None
+
+
+def _central_moment(x, mu, order, analytic_gradients=False):
+    r"""Central moment of ``x`` over its last two dimensions, given its mean ``mu``"""
+    if not torch.is_tensor(mu):
+        mu = torch.full(x.shape[:-2], mu, dtype=x.dtype, device=x.device)
+    if analytic_gradients:
+        return _CentralMoment.apply(x, mu, order)
+    return torch.mean((x - mu[..., None, None]).pow(order), dim=(-2, -1))
 
 
 class PortillaSimoncelli(nn.Module):
@@ -16,7 +154,9 @@ class PortillaSimoncelli(nn.Module):
     synthesizing texture metamers. These statistics are proposed in [1] as a sufficient set
     measurements for describing and synthesizing a given visual texture.
 
-    Currently we do not support batch measurement of images.
+    All images in a batch, and all channels, are analyzed independently, so
+    the representation of an image of shape (batch, channel, height, width)
+    has shape (batch, channel, n_statistics).
 
     Parameters
     ----------
@@ -32,23 +172,63 @@ class PortillaSimoncelli(nn.Module):
         scaled).  In order to match the original statistics use_true_correlations must be
         set to false. But in order to synthesize metamers from this model use_true_correlations
         must be set to true (default).
+    capture_intermediates: bool, optional
+        For debugging. ``forward`` doesn't store anything on the model, so that
+        the same model can be used from multiple threads at once and its
+        intermediate values are freed as soon as it returns. If True, each call
+        to ``forward`` stores (detached copies of) them in ``intermediates``
+        (which is then not thread-safe). Can also be set after initialization.
+    statistics: list or None, optional
+        Which groups of statistics to include in the representation. If None
+        (the default), we include all of them, as in [1]. Otherwise, a subset
+        of ``'pixel_statistics'``, ``'magnitude_means'``,
+        ``'auto_correlation_magnitude'``, ``'skew_reconstructed'``,
+        ``'kurtosis_reconstructed'``, ``'auto_correlation_reconstructed'``,
+        ``'std_reconstructed'`` (only if ``use_true_correlations``),
+        ``'cross_orientation_correlation_magnitude'``,
+        ``'cross_scale_correlation_magnitude'``,
+        ``'cross_orientation_correlation_real'``,
+        ``'cross_scale_correlation_real'`` and ``'var_highpass_residual'``.
+        The excluded groups are not computed at all, which makes for cheaper
+        models (e.g., excluding the cross-scale correlations, which require
+        upsampling the coefficients of each scale).
+    compact: bool, optional
+        If True, the representation vector only contains the unique entries
+        that aren't always zero: it drops the zeros surrounding the
+        auto-correlations of the small scales and those padding the
+        correlation matrices, and keeps a single copy of the symmetric
+        entries of the auto-correlations and cross-orientation correlations.
+        ``convert_to_dict`` (and thus the plotting functions) map it back
+        to the full representation.
+    analytic_gradients: bool, optional
+        If True, the auto-correlations, cross-correlations, skews and
+        kurtoses are computed with custom autograd functions, whose backward
+        passes are computed in closed form, recomputing the cheap
+        intermediate values (e.g., spectra and powers of the coefficients)
+        instead of storing them. This reduces the memory used when computing
+        gradients (e.g., for metamer synthesis of large textures), at the cost
+        of some extra computation. The representation is the same.
 
     Attributes
     ----------
     pyr: Steerable_Pyramid_Freq
         The complex steerable pyramid object used to calculate the portilla-simoncelli representation
-    pyr_coeffs: OrderedDict
-        The coefficients of the complex steerable pyramid.
-    mag_pyr_coeffs: OrderedDict
-        The magnitude of the pyramid coefficients.
-    real_pyr_coeffs: OrderedDict
-        The real parts of the pyramid coefficients.
     scales: list
         The names of the unique scales of coefficients in the pyramid.
     representation_scales: list
         The scale for each coefficient in its vector form
-    representation: dictionary
-        A dictionary containing the Portilla-Simoncelli statistics
+    statistics: list
+        The groups of statistics included in the representation, in the
+        order in which they appear in it.
+    compact_index: torch.Tensor
+        The indices of the entries of the full representation vector kept in
+        the compact one (used if ``compact`` is True).
+    intermediates: OrderedDict
+        Only if ``capture_intermediates`` is True, the intermediate values of
+        the last call to ``forward``: ``pyr_coeffs`` (the coefficients of the
+        complex steerable pyramid), ``magnitude_pyr_coeffs`` (their magnitude),
+        ``real_pyr_coeffs`` (their real parts) and ``representation`` (a
+        dictionary containing the Portilla-Simoncelli statistics)
 
     References
     -----
@@ -67,6 +247,10 @@ class PortillaSimoncelli(nn.Module):
         n_orientations=4,
         spatial_corr_width=9,
         use_true_correlations=True,
+        capture_intermediates=False,
+        statistics=None,
+        compact=False,
+        analytic_gradients=False,
     ):
         super().__init__()
 
@@ -82,28 +266,47 @@ class PortillaSimoncelli(nn.Module):
             tight_frame=False,
         )
         self.filterPyr = Steerable_Pyramid_Freq(
-            self.pyr._lomasks[-1].shape[-2:], height=0, order=1,
+            self.pyr._level_shapes[-1], height=0, order=1,
             tight_frame=False
         )
         self.unoriented_band_pyrs = [
             Steerable_Pyramid_Freq(
-                himask.shape[-2:],
+                shape,
                 height=1,
                 order=self.n_orientations - 1,
                 is_complex=False,
                 tight_frame=False,
             )
-            # want to go through these masks backwards
-            for himask in self.pyr._himasks
+            # one per scale (the last shape is that of the residual lowpass)
+            for shape in self.pyr._level_shapes[:-1]
         ]
 
         self.use_true_correlations = use_true_correlations
+        self.capture_intermediates = capture_intermediates
+        all_statistics = list(self._statistic_shapes().keys())
+        if not self.use_true_correlations:
+            all_statistics.remove("std_reconstructed")
+        if statistics is None:
+            statistics = all_statistics
+        for stat in statistics:
+            if stat not in all_statistics:
+                raise ValueError(f"statistics must be a subset of {all_statistics} but got "
+                                 f"{stat}!")
+        # always in the same order, whatever the order of the argument
+        self.statistics = [stat for stat in all_statistics if stat in statistics]
+        self.intermediates = None
         self.scales = (
             ["pixel_statistics", "residual_lowpass"]
             + [ii for ii in range(n_scales - 1, -1, -1)]
             + ["residual_highpass"]
         )
         self.representation_scales = self._get_representation_scales()
+        self.compact = compact
+        self.analytic_gradients = analytic_gradients
+        (self.compact_index, self._compact_inverse,
+         compact_scales) = self._compact_indices()
+        if self.compact:
+            self.representation_scales = compact_scales
 
     def _get_representation_scales(self):
         r"""returns a vector that indicates the scale of each value in the representation (Portilla-Simoncelli statistics)
@@ -161,41 +364,196 @@ class PortillaSimoncelli(nn.Module):
         ) * scales
         var_highpass_residual = ["residual_highpass"]
 
-        if self.use_true_correlations:
-            scales = (
-                pixel_statistics
-                + magnitude_means
-                + auto_correlation_magnitude
-                + skew_reconstructed
-                + kurtosis_reconstructed
-                + auto_correlation
-                + std_reconstructed
-                + cross_orientation_correlation_magnitude
-                + cross_scale_correlation_magnitude
-                + cross_orientation_correlation_real
-                + cross_scale_correlation_real
-                + var_highpass_residual
-            )
-        else:
-            scales = (
-                pixel_statistics
-                + magnitude_means
-                + auto_correlation_magnitude
-                + skew_reconstructed
-                + kurtosis_reconstructed
-                + auto_correlation
-                + cross_orientation_correlation_magnitude
-                + cross_scale_correlation_magnitude
-                + cross_orientation_correlation_real
-                + cross_scale_correlation_real
-                + var_highpass_residual
-            )
+        statistic_scales = {
+            "pixel_statistics": pixel_statistics,
+            "magnitude_means": magnitude_means,
+            "auto_correlation_magnitude": auto_correlation_magnitude,
+            "skew_reconstructed": skew_reconstructed,
+            "kurtosis_reconstructed": kurtosis_reconstructed,
+            "auto_correlation_reconstructed": auto_correlation,
+            "std_reconstructed": std_reconstructed,
+            "cross_orientation_correlation_magnitude": cross_orientation_correlation_magnitude,
+            "cross_scale_correlation_magnitude": cross_scale_correlation_magnitude,
+            "cross_orientation_correlation_real": cross_orientation_correlation_real,
+            "cross_scale_correlation_real": cross_scale_correlation_real,
+            "var_highpass_residual": var_highpass_residual,
+        }
+        scales = [s for stat in self.statistics for s in statistic_scales[stat]]
 
         return scales
 
+    def _statistic_shapes(self):
+        r"""The shape of each group of statistics, in the order of the representation
+
+        Returns
+        -------
+        shapes : OrderedDict
+            For the groups containing a dictionary (``pixel_statistics`` and
+            ``magnitude_means``), the list of its keys. For the others, the
+            shape of the tensor (not including the batch and channel
+            dimensions), which is ``()`` for the single number
+            ``var_highpass_residual``.
+
+        """
+        n_real = max(2 * self.n_orientations, 5)
+        shapes = OrderedDict()
+        shapes["pixel_statistics"] = ["mean", "var", "skew", "kurtosis", "min", "max"]
+        shapes["magnitude_means"] = self._pyr_keys()
+        shapes["auto_correlation_magnitude"] = (self.spatial_corr_width, self.spatial_corr_width,
+                                                self.n_scales, self.n_orientations)
+        shapes["skew_reconstructed"] = (self.n_scales + 1,)
+        shapes["kurtosis_reconstructed"] = (self.n_scales + 1,)
+        shapes["auto_correlation_reconstructed"] = (self.spatial_corr_width,
+                                                    self.spatial_corr_width, self.n_scales + 1)
+        shapes["std_reconstructed"] = (self.n_scales + 1,)
+        shapes["cross_orientation_correlation_magnitude"] = (self.n_orientations,
+                                                             self.n_orientations,
+                                                             self.n_scales + 1)
+        shapes["cross_scale_correlation_magnitude"] = (self.n_orientations,
+                                                       self.n_orientations, self.n_scales)
+        shapes["cross_orientation_correlation_real"] = (n_real, n_real, self.n_scales + 1)
+        shapes["cross_scale_correlation_real"] = (2 * self.n_orientations, n_real,
+                                                  self.n_scales)
+        shapes["var_highpass_residual"] = ()
+        return shapes
+
+    def _compact_indices(self):
+        r"""Precompute the mapping between the full and compact representation vectors
+
+        For each entry of the full vector, we find the canonical entry it's
+        equal to (itself, or its symmetric counterpart), or -1 if it's always
+        zero. The compact vector contains the canonical entries.
+
+        Returns
+        -------
+        compact_index : torch.Tensor
+            The indices of the full vector kept in the compact one.
+        compact_inverse : torch.Tensor
+            For each entry of the full vector, the index of the compact entry
+            it's equal to, or -1 if it's always zero.
+        compact_scales : list
+            The scale of each entry of the compact vector (as in
+            ``representation_scales``).
+
+        """
+        center = int(np.floor((self.spatial_corr_width - 1) / 2))
+        window_idx = torch.arange(self.spatial_corr_width)
+        scale_names = list(range(self.n_scales)) + ["residual_lowpass"]
+
+        def autocorrelation_canon(ids, scales):
+            # ids: (width, width, scale, ...). the auto-correlation is only
+            # computed within le of the center, and is point-symmetric
+            # about it
+            canon = -torch.ones_like(ids)
+            partner = 2 * center - window_idx
+            for ss in range(ids.shape[2]):
+                shape = self.pyr._level_shapes[scales[ss]]
+                le = int(np.min((np.min(shape) / 2.0 - 1, center)))
+                win = slice(center - le, center + le + 1)
+                this = ids[win, win, ss]
+                flipped = ids[partner[win]][:, partner[win], ss]
+                canon[win, win, ss] = torch.minimum(this, flipped)
+            return canon
+
+        def symmetric_canon(ids, size, ss):
+            # ids: (n, n, scale), only [:size, :size] is filled, and symmetric
+            block = ids[:size, :size, ss]
+            return torch.minimum(block, block.transpose(0, 1))
+
+        labels = []
+        canons = []
+        n_filled = 0
+        for stat, shape in self._statistic_shapes().items():
+            if stat not in self.statistics:
+                continue
+            if isinstance(shape, list):
+                n = len(shape)
+            else:
+                n = int(np.prod(shape))
+            ids = torch.arange(n_filled, n_filled + n)
+            if isinstance(shape, list) or not shape:
+                canon = ids
+                if stat == "pixel_statistics":
+                    labels.extend(["pixel_statistics"] * n)
+                elif stat == "magnitude_means":
+                    labels.extend([k if isinstance(k, str) else k[0] for k in shape])
+                else:
+                    labels.append("residual_highpass")
+            else:
+                ids = ids.reshape(shape)
+                # the scale is the third dimension of the correlations and the
+                # only one of the rest
+                scale_dim = 2 if len(shape) > 1 else 0
+                label_idx = torch.arange(shape[scale_dim]).reshape(
+                    [-1 if d == scale_dim else 1 for d in range(len(shape))]).expand(shape)
+                labels.extend([scale_names[i] for i in label_idx.flatten().tolist()])
+                if stat == "auto_correlation_magnitude":
+                    canon = autocorrelation_canon(ids, list(range(self.n_scales)))
+                elif stat == "auto_correlation_reconstructed":
+                    canon = autocorrelation_canon(ids, list(range(self.n_scales + 1)))
+                elif stat == "cross_orientation_correlation_magnitude":
+                    # the low-pass magnitude correlations are always zero
+                    canon = -torch.ones_like(ids)
+                    for ss in range(self.n_scales):
+                        canon[:self.n_orientations, :self.n_orientations, ss] = \
+                            symmetric_canon(ids, self.n_orientations, ss)
+                elif stat == "cross_scale_correlation_magnitude":
+                    # there's no magnitude at the scale after the coarsest
+                    canon = ids.clone()
+                    canon[..., self.n_scales - 1] = -1
+                elif stat == "cross_orientation_correlation_real":
+                    canon = -torch.ones_like(ids)
+                    for ss in range(self.n_scales):
+                        canon[:self.n_orientations, :self.n_orientations, ss] = \
+                            symmetric_canon(ids, self.n_orientations, ss)
+                    # the low-pass residual and its 4 neighbors
+                    canon[:5, :5, self.n_scales] = symmetric_canon(ids, 5, self.n_scales)
+                elif stat == "cross_scale_correlation_real":
+                    # the rows of the next scale are empty, and so are the
+                    # columns beyond the low-pass residual and its 4 neighbors
+                    canon = -torch.ones_like(ids)
+                    canon[:self.n_orientations, :2 * self.n_orientations, :-1] = \
+                        ids[:self.n_orientations, :2 * self.n_orientations, :-1]
+                    canon[:self.n_orientations, :5, -1] = ids[:self.n_orientations, :5, -1]
+                else:
+                    canon = ids
+            canons.append(canon.flatten())
+            n_filled += n
+        canon = torch.cat(canons)
+        compact_index = torch.nonzero(canon == torch.arange(len(canon))).flatten()
+        # position of each full entry in the compact vector
+        compact_position = -torch.ones_like(canon)
+        compact_position[compact_index] = torch.arange(len(compact_index))
+        compact_inverse = torch.where(canon >= 0, compact_position[canon.clamp(min=0)],
+                                      -torch.ones_like(canon))
+        compact_scales = [labels[i] for i in compact_index.tolist()]
+        return compact_index, compact_inverse, compact_scales
+
+    def expand_compact(self, vec):
+        r"""Map a compact representation vector back to the full one
+
+        Parameters
+        ----------
+        vec : torch.Tensor
+            Compact representation, of shape (..., len(compact_index)).
+
+        Returns
+        -------
+        full_vec : torch.Tensor
+            Full representation, of shape (..., n_statistics), with the
+            symmetric entries duplicated and the structural zeros filled in.
+
+        """
+        zero = torch.zeros_like(vec[..., :1])
+        inverse = self._compact_inverse.to(vec.device) + 1
+        return torch.cat([zero, vec], dim=-1).index_select(-1, inverse)
+
     def forward(self, image, scales=None):
         r"""Generate Texture Statistics representation of an image (see reference [1]_)
 
+        All images in the batch and all channels are analyzed at once, independently: the
+        statistics of each ``image[b, c]`` are identical to those of that image on its own.
+
         Parameters
         ----------
         image : torch.Tensor
@@ -203,38 +561,65 @@ class PortillaSimoncelli(nn.Module):
             on this in the pytorch-y way, so we want it to be 4d (batch,
             channel, height, width). If it has fewer than 4 dimensions,
             we will unsqueeze it until its 4d
-        scales : list, optional
-            Which scales to include in the returned representation. If an empty
-            list (the default), we include all scales. Otherwise, can contain
-            subset of values present in this model's ``scales`` attribute.
+        scales : list or None, optional
+            Which scales to include in the returned representation. If None
+            (the default), we include all scales. Otherwise, can contain
+            subset of values present in this model's ``scales`` attribute, and
+            only the pyramid levels and statistics needed for those scales
+            are computed (as is done by ``Metamer`` during coarse-to-fine
+            synthesis).
 
         Returns
         -------
         representation_vector: torch.Tensor
-            A flattened tensor (1d) containing the measured representation statistics.
+            A 3d tensor of shape (batch, channel, n_statistics) containing the
+            measured representation statistics of each image and channel.
 
         """
         while image.ndimension() < 4:
             image = image.unsqueeze(0)
-        if image.shape[0]>1:
-            raise ValueError("Batch size should be 1. Portilla Simoncelli doesn't support batch operations.")
 
-        self.pyr_coeffs = self.pyr.forward(image)
-        self.representation = OrderedDict()
+        # everything computed here is local to this call (nothing is stored on
+        # the model, unless capture_intermediates is True), so the same model
+        # can be used from multiple threads at once
+        if scales is None:
+            compute_scales = self.scales
+        else:
+            compute_scales = scales
+        pyr_scales = self._pyr_scales(compute_scales)
+        if pyr_scales:
+            pyr_coeffs = self.pyr.forward(image, scales=pyr_scales)
+        else:
+            pyr_coeffs = OrderedDict()
+        representation = OrderedDict()
+        # all statistics have this shape, followed by their own
+        batch_shape = image.shape[:2]
+        kwargs = {'device': image.device, 'dtype': image.dtype}
+
+        # Initialize statistics, in the order of the representation. The
+        # entries of the scales we don't compute are left at zero
+        for stat, shape in self._statistic_shapes().items():
+            if stat not in self.statistics:
+                continue
+            if isinstance(shape, list):
+                representation[stat] = OrderedDict()
+            else:
+                representation[stat] = torch.zeros((*batch_shape, *shape), **kwargs)
 
         ### SECTION 1 (STATISTIC: pixel_statistics) ##################
         #  Calculate pixel statistics (mean, variance, skew, kurtosis, min, max).
-        self.representation["pixel_statistics"] = OrderedDict()
-        self.representation["pixel_statistics"]["mean"] = torch.mean(image)
-        self.representation["pixel_statistics"]["var"] = torch.var(image)
-        self.representation["pixel_statistics"]["skew"] = self.__class__.skew(
-            image
-        )
-        self.representation["pixel_statistics"][
-            "kurtosis"
-        ] = self.__class__.kurtosis(image)
-        self.representation["pixel_statistics"]["min"] = torch.min(image)
-        self.representation["pixel_statistics"]["max"] = torch.max(image)
+        pixel_var = torch.var(image, dim=(-2, -1))
+        if "pixel_statistics" in representation:
+            representation["pixel_statistics"]["mean"] = torch.mean(image, dim=(-2, -1))
+            representation["pixel_statistics"]["var"] = pixel_var
+            representation["pixel_statistics"]["skew"] = self.__class__.skew(
+                image, analytic_gradients=self.analytic_gradients
+            )
+            representation["pixel_statistics"][
+                "kurtosis"
+            ] = self.__class__.kurtosis(image, analytic_gradients=self.analytic_gradients)
+            representation["pixel_statistics"]["min"] = torch.amin(image, dim=(-2, -1))
+            representation["pixel_statistics"]["max"] = torch.amax(image, dim=(-2, -1))
 
         ### SECTION 2 (STATISTIC: mean_magnitude) ####################
         # Calculate the mean of the magnitude of each band of pyramid
@@ -243,7 +628,14 @@ class PortillaSimoncelli(nn.Module):
         # and real_pyr_coeffs, which contain the magnitude of the
         # pyramid coefficients and the real part of the pyramid
         # coefficients respectively.
-        self.representation["magnitude_means"] = self._calculate_magnitude_means()
+        (magnitude_means, magnitude_pyr_coeffs,
+         real_pyr_coeffs) = self._calculate_magnitude_means(pyr_coeffs)
+        if "magnitude_means" in representation:
+            # the means of the bands we haven't computed are left at zero
+            representation["magnitude_means"] = OrderedDict(
+                (k, magnitude_means.get(k, torch.zeros(batch_shape, **kwargs)))
+                for k in self._pyr_keys()
+            )
 
         ### SECTION 3 (STATISTICS: auto_correlation_magnitude,
         #                          skew_reconstructed,
@@ -269,33 +661,9 @@ class PortillaSimoncelli(nn.Module):
         # and/or compute time) to calculate it at the same time.
         #
         #
-
-        # Initialize statistics
-        # let's remove the normalization from the auto_correlation statistics
-        self.representation["auto_correlation_magnitude"] = torch.zeros(
-            [
-                self.spatial_corr_width,
-                self.spatial_corr_width,
-                self.n_scales,
-                self.n_orientations,
-            ],
-            device=image.device
-        )
-        self.representation["skew_reconstructed"] = torch.empty((self.n_scales + 1, 1),
-                                                                device=image.device)
-        self.representation["kurtosis_reconstructed"] = torch.empty(
-            (self.n_scales + 1, 1), device=image.device
-        )
-        self.representation["auto_correlation_reconstructed"] = torch.zeros(
-            [self.spatial_corr_width, self.spatial_corr_width, self.n_scales + 1],
-            device=image.device
-        )
-
-        if self.use_true_correlations:
-            self.representation["std_reconstructed"] = torch.empty(self.n_scales + 1, 1,
-                                                                   device=image.device)
-
-        self._calculate_autocorrelation_skew_kurtosis()
+        self._calculate_autocorrelation_skew_kurtosis(representation, pyr_coeffs,
+                                                      magnitude_pyr_coeffs, real_pyr_coeffs,
+                                                      pixel_var, compute_scales)
 
         ### SECTION 4 (STATISTICS: cross_orientation_correlation_magnitude,
         #                          cross_scale_correlation_magnitude,
@@ -304,35 +672,24 @@ class PortillaSimoncelli(nn.Module):
         # Calculates cross-orientation and cross-scale correlations for the
         # real parts and the magnitude of the pyramid coefficients.
         #
-
-        # Initialize statistics
-        self.representation["cross_orientation_correlation_magnitude"] = torch.zeros(
-            self.n_orientations, self.n_orientations, self.n_scales + 1,
-            device=image.device
-        )
-        self.representation["cross_scale_correlation_magnitude"] = torch.zeros(
-            self.n_orientations, self.n_orientations, self.n_scales,
-            device=image.device
-        )
-        self.representation["cross_orientation_correlation_real"] = torch.zeros(
-            max(2 * self.n_orientations, 5),
-            max(2 * self.n_orientations, 5),
-            self.n_scales + 1,
-            device=image.device
-        )
-        self.representation["cross_scale_correlation_real"] = torch.zeros(
-            2 * self.n_orientations, max(2 * self.n_orientations, 5), self.n_scales,
-            device=image.device
-        )
-
-        self._calculate_crosscorrelations()
+        self._calculate_crosscorrelations(representation, pyr_coeffs, magnitude_pyr_coeffs,
+                                          real_pyr_coeffs, compute_scales)
 
         # SECTION 5: var_highpass_residual or the variance of the high-pass residual
-        self.representation["var_highpass_residual"] = (
-            self.pyr_coeffs["residual_highpass"].pow(2).mean().unsqueeze(0)
-        )
+        if "var_highpass_residual" in representation and "residual_highpass" in pyr_coeffs:
+            representation["var_highpass_residual"] = (
+                pyr_coeffs["residual_highpass"].pow(2).mean(dim=(-2, -1))
+            )
+
+        if self.capture_intermediates:
+            # detached, so that we don't keep the graph alive
+            self.intermediates = OrderedDict(
+                (k, _detach(v)) for k, v in
+                [("pyr_coeffs", pyr_coeffs), ("magnitude_pyr_coeffs", magnitude_pyr_coeffs),
+                 ("real_pyr_coeffs", real_pyr_coeffs), ("representation", representation)]
+            )
 
-        representation_vector = self.convert_to_vector().unsqueeze(0).unsqueeze(0)
+        representation_vector = self.convert_to_vector(representation)
 
         if scales is not None:
             ind = torch.tensor(
@@ -340,443 +697,462 @@ class PortillaSimoncelli(nn.Module):
                     i
                     for i, s in enumerate(self.representation_scales)
                     if s in scales
-                ]
+                ],
+                dtype=torch.long,
             ).to(image.device)
             return representation_vector.index_select(-1, ind)
 
         return representation_vector
 
-    def convert_to_vector(self):
+    def _pyr_keys(self):
+        r"""The keys of the pyramid coefficients, in order"""
+        return (["residual_highpass"] +
+                [(s, o) for s in range(self.n_scales) for o in range(self.n_orientations)] +
+                ["residual_lowpass"])
+
+    def _pyr_scales(self, scales):
+        r"""The pyramid scales needed to compute the statistics of ``scales``
+
+        The statistics of an integer scale need the real parts of all coarser
+        scales and the low-pass residual, since the reconstructed low-pass
+        images are built from the coarsest scale up.
+
+        Parameters
+        ----------
+        scales : list
+            subset of this model's ``scales`` attribute.
+
+        Returns
+        -------
+        pyr_scales : list
+            the scales to pass to ``self.pyr.forward``. Empty if we don't need
+            the pyramid at all.
+
+        """
+        pyr_scales = []
+        if "residual_highpass" in scales and ("magnitude_means" in self.statistics or
+                                              "var_highpass_residual" in self.statistics):
+            pyr_scales.append("residual_highpass")
+        # all other statistics (besides the pixel statistics) use the bands
+        if not [stat for stat in self.statistics
+                if stat not in ["pixel_statistics", "var_highpass_residual"]]:
+            return pyr_scales
+        scale_ints = [s for s in scales if isinstance(s, int)]
+        if scale_ints:
+            pyr_scales.extend(range(min(scale_ints), self.n_scales))
+        if scale_ints or "residual_lowpass" in scales:
+            pyr_scales.append("residual_lowpass")
+        return pyr_scales
+
+    def convert_to_vector(self, representation):
         r"""Converts dictionary of statistics to a vector (for synthesis).
 
+        Parameters
+        ----------
+        representation : OrderedDict
+            Dictionary of statistics, as computed in ``forward``. All
+            statistics share the same leading (batch) dimensions.
+
         Returns
         -------
          -- : torch.Tensor
-            Flattened 1d vector of statistics.
+            Tensor of statistics, with the same leading dimensions as the
+            statistics and all the statistics of each element flattened into
+            the last dimension (only the entries in ``compact_index``, if
+            ``compact``).
 
         """
+        # the batch dimensions are those that precede the statistic's own
+        key, val = next(iter(representation.items()))
+        if isinstance(val, OrderedDict):
+            batch_dims = next(iter(val.values())).ndimension()
+        else:
+            batch_dims = val.ndimension() - len(self._statistic_shapes()[key])
         list_of_stats = [
-            torch.cat([vv.flatten() for vv in val.values()])
+            torch.stack(list(val.values()), dim=-1)
             if isinstance(val, OrderedDict)
-            else val.flatten()
-            for (key, val) in self.representation.items()
+            else val.reshape(*val.shape[:batch_dims], -1)
+            for (key, val) in representation.items()
         ]
-        return torch.cat(list_of_stats)
+        vec = torch.cat(list_of_stats, dim=-1)
+        if self.compact:
+            vec = vec.index_select(-1, self.compact_index.to(vec.device))
+        return vec
 
     def convert_to_dict(self, vec):
-        vec = vec.squeeze()
-        rep = OrderedDict()
-        rep["pixel_statistics"] = OrderedDict()
-        rep["pixel_statistics"]["mean"] = vec[0]
-        rep["pixel_statistics"]["var"] = vec[1]
-        rep["pixel_statistics"]["skew"] = vec[2]
-        rep["pixel_statistics"]["kurtosis"] = vec[3]
-        rep["pixel_statistics"]["min"] = vec[4]
-        rep["pixel_statistics"]["max"] = vec[5]
-
-        n_filled = 6
+        r"""Converts a vector of statistics to a dictionary, inverting ``convert_to_vector``.
 
-        # magnitude_means
-        rep["magnitude_means"] = OrderedDict()
-        for ii, (k, v) in enumerate(self.representation["magnitude_means"].items()):
-            rep["magnitude_means"][k] = vec[n_filled + ii]
-        n_filled += ii + 1
-
-        # auto_correlation_magnitude
-        nn = (
-            self.spatial_corr_width
-            * self.spatial_corr_width
-            * self.n_scales
-            * self.n_orientations
-        )
-        rep["auto_correlation_magnitude"] = vec[n_filled : (n_filled + nn)].unflatten(
-            0,
-            (
-                self.spatial_corr_width,
-                self.spatial_corr_width,
-                self.n_scales,
-                self.n_orientations,
-            ),
-        )
-        n_filled += nn
-
-        # skew_reconstructed & kurtosis_reconstructed
-        nn = self.n_scales + 1
-        rep["skew_reconstructed"] = vec[n_filled : (n_filled + nn)]
-        n_filled += nn
-
-        rep["kurtosis_reconstructed"] = vec[n_filled : (n_filled + nn)]
-        n_filled += nn
-
-        # auto_correlation_reconstructed
-        nn = self.spatial_corr_width * self.spatial_corr_width * (self.n_scales + 1)
-        rep["auto_correlation_reconstructed"] = vec[
-            n_filled : (n_filled + nn)
-        ].unflatten(
-            0, (self.spatial_corr_width, self.spatial_corr_width, self.n_scales + 1)
-        )
-        n_filled += nn
-
-        if self.use_true_correlations:
-            nn = self.n_scales + 1
-            rep["std_reconstructed"] = vec[n_filled : (n_filled + nn)]
-            n_filled += nn
-
-        # cross_orientation_correlation_magnitude
-        nn = self.n_orientations * self.n_orientations * (self.n_scales + 1)
-        rep["cross_orientation_correlation_magnitude"] = vec[
-            n_filled : (n_filled + nn)
-        ].unflatten(0, (self.n_orientations, self.n_orientations, self.n_scales + 1))
-        n_filled += nn
-
-        # cross_scale_correlation_magnitude
-        nn = self.n_orientations * self.n_orientations * self.n_scales
-        rep["cross_scale_correlation_magnitude"] = vec[
-            n_filled : (n_filled + nn)
-        ].unflatten(0, (self.n_orientations, self.n_orientations, self.n_scales))
-        n_filled += nn
-
-        # cross_orientation_correlation_real
-        nn = (
-            max(2 * self.n_orientations, 5)
-            * max(2 * self.n_orientations, 5)
-            * (self.n_scales + 1)
-        )
-        rep["cross_orientation_correlation_real"] = vec[
-            n_filled : (n_filled + nn)
-        ].unflatten(
-            0,
-            (
-                max(2 * self.n_orientations, 5),
-                max(2 * self.n_orientations, 5),
-                self.n_scales + 1,
-            ),
-        )
-        n_filled += nn
+        Parameters
+        ----------
+        vec : torch.Tensor
+            Tensor of statistics, whose last dimension contains the statistics
+            of each element, e.g., the output of ``forward`` (thus compact, if
+            ``compact``).
 
-        # cross_scale_correlation_real
-        nn = 2 * self.n_orientations * max(2 * self.n_orientations, 5) * self.n_scales
-        rep["cross_scale_correlation_real"] = vec[n_filled : (n_filled + nn)].unflatten(
-            0, (2 * self.n_orientations, max(2 * self.n_orientations, 5), self.n_scales)
-        )
-        n_filled += nn
+        Returns
+        -------
+        rep : OrderedDict
+            Dictionary of statistics, with the same leading dimensions as ``vec``.
 
-        # var_highpass_residual
-        rep["var_highpass_residual"] = vec[n_filled]
-        n_filled += 1
+        """
+        if self.compact:
+            vec = self.expand_compact(vec)
+        rep = OrderedDict()
+        n_filled = 0
+        for stat, shape in self._statistic_shapes().items():
+            if stat not in self.statistics:
+                continue
+            if isinstance(shape, list):
+                # pixel_statistics and magnitude_means, one number per key
+                rep[stat] = OrderedDict()
+                for ii, k in enumerate(shape):
+                    rep[stat][k] = vec[..., n_filled + ii]
+                n_filled += len(shape)
+            elif not shape:
+                # var_highpass_residual, a single number
+                rep[stat] = vec[..., n_filled]
+                n_filled += 1
+            else:
+                nn = int(np.prod(shape))
+                rep[stat] = vec[..., n_filled : (n_filled + nn)].unflatten(-1, shape)
+                n_filled += nn
 
         return rep
 
-    def _calculate_magnitude_means(self):
+    def _calculate_magnitude_means(self, pyr_coeffs):
         r"""Calculates the mean of the pyramid coefficient magnitudes.  Also
-        stores two dictionaries, one containing the magnitudes of the pyramid
+        returns two dictionaries, one containing the magnitudes of the pyramid
         coefficient and the other containing the real parts.
 
+        Parameters
+        ----------
+        pyr_coeffs: OrderedDict
+            The coefficients of the complex steerable pyramid. The mean of the
+            residual lowpass is subtracted in place.
+
         Returns
         -------
         magnitude_means: OrderedDict
             The mean of the pyramid coefficient magnitudes.
+        magnitude_pyr_coeffs: OrderedDict
+            The magnitude of the pyramid coefficients, minus their mean.
+        real_pyr_coeffs: OrderedDict
+            The real parts of the pyramid coefficients.
 
         """
 
         # subtract mean from lowest scale band
-        self.pyr_coeffs["residual_lowpass"] = self.pyr_coeffs[
-            "residual_lowpass"
-        ] - torch.mean(self.pyr_coeffs["residual_lowpass"])
+        if "residual_lowpass" in pyr_coeffs:
+            pyr_coeffs["residual_lowpass"] = pyr_coeffs[
+                "residual_lowpass"
+            ] - torch.mean(pyr_coeffs["residual_lowpass"], dim=(-2, -1), keepdim=True)
 
         # calculate two new sets of coefficients: 1) magnitude of the pyramid coefficients, 2) real part of the pyramid coefficients
-        self.magnitude_pyr_coeffs = OrderedDict()
-        self.real_pyr_coeffs = OrderedDict()
-        for key, val in self.pyr_coeffs.items():
+        magnitude_pyr_coeffs = OrderedDict()
+        real_pyr_coeffs = OrderedDict()
+        for key, val in pyr_coeffs.items():
             if key in ["residual_lowpass", "residual_highpass"]:  # not complex
-                self.magnitude_pyr_coeffs[key] = torch.abs(val).squeeze()
-                self.real_pyr_coeffs[key] = val.squeeze()
+                magnitude_pyr_coeffs[key] = torch.abs(val)
+                real_pyr_coeffs[key] = val
             else:  # complex
-                self.magnitude_pyr_coeffs[key] = val.abs().squeeze()
-                self.real_pyr_coeffs[key] = val.real.squeeze()
+                magnitude_pyr_coeffs[key] = val.abs()
+                real_pyr_coeffs[key] = val.real
 
         # STATISTIC: magnitude_means or the mean magnitude of each pyramid band
         magnitude_means = OrderedDict()
-        for (key, val) in self.magnitude_pyr_coeffs.items():
-            magnitude_means[key] = torch.mean(val)
-            self.magnitude_pyr_coeffs[key] = (
-                self.magnitude_pyr_coeffs[key] - magnitude_means[key]
+        for (key, val) in magnitude_pyr_coeffs.items():
+            magnitude_means[key] = torch.mean(val, dim=(-2, -1))
+            magnitude_pyr_coeffs[key] = (
+                magnitude_pyr_coeffs[key] - magnitude_means[key][..., None, None]
             )  # subtract mean of magnitude
 
-        return magnitude_means
+        return magnitude_means, magnitude_pyr_coeffs, real_pyr_coeffs
 
     @staticmethod
     def expand(im, mult):
         r"""Resize an image (im) by a multiplier (mult).
 
+        See ``plenoptic.tools.signal.expand``, which this calls.
+
         Parameters
         ----------
         im: torch.Tensor
-            An image for expansion.
+            An image for expansion, of shape (..., height, width). All leading
+            dimensions are expanded independently.
         mult: int
             Multiplier by which to resize image.
 
         Returns
         -------
         im_large: torch.Tensor
-            resized image
+            resized image, of shape (..., mult*height, mult*width)
 
         """
-        im = im.squeeze()
-
-        mx = im.shape[0]
-        my = im.shape[1]
-        my = mult * my
-        mx = mult * mx
-
-        fourier = mult ** 2 * torch.fft.fftshift(torch.fft.fftn(im))
-        fourier_large = torch.zeros(my, mx, device=fourier.device,
-                                    dtype=fourier.dtype)
-
-        y1 = int(my / 2 + 1 - my / (2 * mult))
-        y2 = int(my / 2 + my / (2 * mult))
-        x1 = int(mx / 2 + 1 - mx / (2 * mult))
-        x2 = int(mx / 2 + mx / (2 * mult))
-
-        fourier_large[y1:y2, x1:x2] = fourier[1 : int(my / mult), 1 : int(mx / mult)]
-        fourier_large[y1 - 1, x1:x2] = fourier[0, 1 : int(mx / mult)] / 2
-        fourier_large[y2, x1:x2] = fourier[0, 1 : int(mx / mult)].flip(0) / 2
-        fourier_large[y1:y2, x1 - 1] = fourier[1 : int(my / mult), 0] / 2
-        fourier_large[y1:y2, x2] = fourier[1 : int(my / mult), 0].flip(0) / 2
-        esq = fourier[0, 0] / 4
-        fourier_large[y1 - 1, x1 - 1] = esq
-        fourier_large[y1 - 1, x2] = esq
-        fourier_large[y2, x1 - 1] = esq
-        fourier_large[y2, x2] = esq
-
-        fourier_large = torch.fft.fftshift(fourier_large)
+        return expand(im, mult)
 
-        # finish this
-        im_large = torch.fft.ifft2(fourier_large)
-
-        return im_large.type(im.dtype)
-
-    def _calculate_autocorrelation_skew_kurtosis(self):
+    def _calculate_autocorrelation_skew_kurtosis(self, representation, pyr_coeffs,
+                                                 magnitude_pyr_coeffs, real_pyr_coeffs,
+                                                 pixel_var, scales):
         r"""Calculate the autocorrelation for the real parts and magnitudes of the
         coefficients. Calculate the skew and kurtosis at each scale.
 
-        """
-
-        # low-pass filter the low-pass residual.  We're still not sure why the original matlab code does this...
-        lowpass = self.pyr_coeffs["residual_lowpass"]
-        filter_pyr_coeffs = self.filterPyr.forward(lowpass)
-        reconstructed_image = filter_pyr_coeffs["residual_lowpass"].squeeze()
+        The statistics are written into ``representation``, whose entries must
+        already be initialized (see ``forward``). Only the statistics in
+        ``representation`` and of ``scales`` (and those of the intermediate
+        scales of the reconstruction) are computed.
 
-        # Find the auto-correlation of the low-pass residual
-        channel_size = torch.min(torch.tensor(lowpass.shape[-2:])).to(float)
+        """
+        reconstructed_stats = [stat for stat in ["skew_reconstructed", "kurtosis_reconstructed",
+                                                 "auto_correlation_reconstructed",
+                                                 "std_reconstructed"] if stat in representation]
+        if "residual_lowpass" not in pyr_coeffs:
+            return
         center = int(np.floor([(self.spatial_corr_width - 1) / 2]))
-        le = int(np.min((channel_size / 2 - 1, center)))
-        (
-            self.representation["auto_correlation_reconstructed"][
-                center - le : center + le + 1,
-                center - le : center + le + 1,
-                self.n_scales,
-            ],
-            vari,
-        ) = self.compute_autocorrelation(reconstructed_image)
-        (
-            self.representation["skew_reconstructed"][self.n_scales],
-            self.representation["kurtosis_reconstructed"][self.n_scales],
-        ) = self.compute_skew_kurtosis(reconstructed_image, vari)
 
-        if self.use_true_correlations:
-            self.representation["std_reconstructed"][self.n_scales] = vari ** 0.5
-
-        for this_scale in range(self.n_scales - 1, -1, -1):
-            for nor in range(0, self.n_orientations):
-                ch = self.magnitude_pyr_coeffs[(this_scale, nor)]
-                channel_size = np.min((ch.shape[-1], ch.shape[-2]))
-                le = int(np.min((channel_size / 2.0 - 1, center)))
-                # Find the auto-correlation of the magnitude band
-                (
-                    self.representation["auto_correlation_magnitude"][
-                        center - le : center + le + 1,
-                        center - le : center + le + 1,
-                        this_scale,
-                        nor,
-                    ],
-                    vari,
-                ) = self.compute_autocorrelation(ch)
+        def store_reconstructed_stats(index, image, ac, vari, le):
+            if "auto_correlation_reconstructed" in representation:
+                representation["auto_correlation_reconstructed"][
+                    ...,
+                    center - le : center + le + 1,
+                    center - le : center + le + 1,
+                    index,
+                ] = ac
+            if "std_reconstructed" in representation:
+                representation["std_reconstructed"][..., index] = vari ** 0.5
+            if ("skew_reconstructed" in representation or
+                    "kurtosis_reconstructed" in representation):
+                skew, kurtosis = self.compute_skew_kurtosis(image, vari, pixel_var)
+                if "skew_reconstructed" in representation:
+                    representation["skew_reconstructed"][..., index] = skew
+                if "kurtosis_reconstructed" in representation:
+                    representation["kurtosis_reconstructed"][..., index] = kurtosis
+
+        if reconstructed_stats:
+            # low-pass filter the low-pass residual.  We're still not sure why the original matlab code does this...
+            lowpass = pyr_coeffs["residual_lowpass"]
+            # we also get the DFT of the filtered residual, so we don't have to
+            # recompute it for the auto-correlation
+            filter_pyr_coeffs, filter_pyr_dfts = self.filterPyr.forward(lowpass, domain='both')
+            reconstructed_image = filter_pyr_coeffs["residual_lowpass"]
+
+            # Find the auto-correlation of the low-pass residual
+            channel_size = torch.min(torch.tensor(lowpass.shape[-2:])).to(float)
+            le = int(np.min((channel_size / 2 - 1, center)))
+            ac, vari = self.compute_autocorrelation(reconstructed_image,
+                                                    filter_pyr_dfts["residual_lowpass"])
+            store_reconstructed_stats(self.n_scales, reconstructed_image, ac, vari, le)
+
+        # we reconstruct from the coarsest scale down to the finest one we need
+        finest_scale = min([s for s in scales if isinstance(s, int)], default=self.n_scales)
+        for this_scale in range(self.n_scales - 1, finest_scale - 1, -1):
+            channel_size = np.min(real_pyr_coeffs[(this_scale, 0)].shape[-2:])
+            le = int(np.min((channel_size / 2.0 - 1, center)))
+            if this_scale in scales and "auto_correlation_magnitude" in representation:
+                # all orientations of this scale, of shape (batch, channel,
+                # orientation, height, width), so that we compute their
+                # auto-correlations with a single (batched) FFT
+                ch = torch.stack([magnitude_pyr_coeffs[(this_scale, nor)]
+                                  for nor in range(0, self.n_orientations)], dim=-3)
+                # Find the auto-correlation of the magnitude bands
+                ac, _ = self.compute_autocorrelation(ch)
+                representation["auto_correlation_magnitude"][
+                    ...,
+                    center - le : center + le + 1,
+                    center - le : center + le + 1,
+                    this_scale,
+                    :,
+                ] = ac.movedim(-3, -1)
+
+            if not reconstructed_stats:
+                continue
 
             reconstructed_image = (
                 self.__class__.expand(reconstructed_image, 2) / 4.0
             )
-            reconstructed_image = reconstructed_image.unsqueeze(0).unsqueeze(0)
 
             # reconstruct the unoriented band for this scale
             unoriented_band_pyr = self.unoriented_band_pyrs[this_scale]
             unoriented_pyr_coeffs = unoriented_band_pyr.forward(reconstructed_image)
             for ii in range(0, self.n_orientations):
-                unoriented_pyr_coeffs[(0, ii)] = (
-                    self.real_pyr_coeffs[(this_scale, ii)].unsqueeze(0).unsqueeze(0)
-                )
+                unoriented_pyr_coeffs[(0, ii)] = real_pyr_coeffs[(this_scale, ii)]
             unoriented_band = unoriented_band_pyr.recon_pyr(unoriented_pyr_coeffs,levels=[0])
 
             # Add the unoriented band to the image reconstruction
             reconstructed_image = reconstructed_image + unoriented_band
 
-            # Find auto-correlation of the reconstructed image
-            (
-                self.representation["auto_correlation_reconstructed"][
-                    center - le : center + le + 1,
-                    center - le : center + le + 1,
-                    this_scale,
-                ],
-                vari,
-            ) = self.compute_autocorrelation(reconstructed_image)
-            if self.use_true_correlations:
-                self.representation["std_reconstructed"][this_scale] = vari ** 0.5
-            # Find skew and kurtosis of the reconstructed image
-            (
-                self.representation["skew_reconstructed"][this_scale],
-                self.representation["kurtosis_reconstructed"][this_scale],
-            ) = self.compute_skew_kurtosis(reconstructed_image, vari)
-
-    def _calculate_crosscorrelations(self):
+            # Find auto-correlation, skew and kurtosis of the reconstructed image
+            ac, vari = self.compute_autocorrelation(reconstructed_image)
+            store_reconstructed_stats(this_scale, reconstructed_image, ac, vari, le)
+
+    def _calculate_crosscorrelations(self, representation, pyr_coeffs, magnitude_pyr_coeffs,
+                                     real_pyr_coeffs, scales):
         r"""Calculate the cross-orientation and cross-scale correlations for the real parts
         and the magnitudes of the pyramid coefficients.
 
-        """
-
-        for this_scale in range(0, self.n_scales):
-            band_num_el = self.real_pyr_coeffs[(this_scale, 0)].numel()
-            if this_scale < self.n_scales - 1:
-                next_scale_mag = torch.empty((band_num_el, self.n_orientations),
-                                             device=self.pyr.hi0mask.device)
-                next_scale_real = torch.empty((band_num_el, self.n_orientations * 2),
-                                              device=self.pyr.hi0mask.device)
-
-                for nor in range(0, self.n_orientations):
-                    
-                    upsampled = (
-                        self.__class__.expand(
-                            self.pyr_coeffs[(this_scale + 1, nor)].squeeze(), 2
-                        )
-                        / 4.0
-                    )
-
-                    # Here we double the phase of the upsampled band.  This trick
-                    # allows us to find the correlation between content in two adjacent
-                    # spatial scales.
-                    X = upsampled.abs() * torch.cos(
-                        2 * torch.atan2(upsampled.real, upsampled.imag)
-                    )
-                    Y = upsampled.abs() * torch.sin(
-                        2 * torch.atan2(upsampled.real, upsampled.imag)
-                    )
-
-                    # Save the components
-                    next_scale_real[:, nor] = X.t().flatten()
-                    next_scale_real[:, nor + self.n_orientations] = Y.t().flatten()
+        The statistics are written into ``representation``, whose entries must
+        already be initialized (see ``forward``). Only the statistics in
+        ``representation`` and of ``scales`` are computed. The bands are
+        flattened into matrices of shape (batch, channel, n_pixels, n_bands),
+        so that the correlations of all images and channels are computed at
+        once.
 
-                    # Save the magnitude
-                    mag = (X ** 2 + Y ** 2) ** 0.5
-                    next_scale_mag[:, nor] = (mag - mag.mean()).t().flatten()
+        """
 
-            else:
+        def flatten_bands(bands):
+            # (batch, channel, n_bands, height, width) -> (batch, channel, n_pixels, n_bands)
+            return bands.flatten(start_dim=-2).transpose(-1, -2)
+
+        cross_orientation_mag = "cross_orientation_correlation_magnitude" in representation
+        cross_scale_mag = "cross_scale_correlation_magnitude" in representation
+        cross_orientation_real = "cross_orientation_correlation_real" in representation
+        cross_scale_real = "cross_scale_correlation_real" in representation
+        if not (cross_orientation_mag or cross_scale_mag or cross_orientation_real
+                or cross_scale_real):
+            return
+
+        n_ori = self.n_orientations
+        last_scale = self.n_scales - 1
+        lowpass_orientation_real = cross_orientation_real and "residual_lowpass" in scales
+        if (cross_scale_real and last_scale in scales) or lowpass_orientation_real:
+            # the upsampled low-pass residual and its four neighbors, which
+            # play the role of the next scale for the coarsest band
+            upsampled = (
+                self.__class__.expand(
+                    real_pyr_coeffs["residual_lowpass"], 2
+                )
+                / 4.0
+            )
+            lowpass_neighbors = flatten_bands(torch.stack(
+                (
+                    upsampled,
+                    upsampled.roll(1, -1),
+                    upsampled.roll(-1, -1),
+                    upsampled.roll(1, -2),
+                    upsampled.roll(-1, -2),
+                ),
+                -3,
+            ))
+
+        if lowpass_orientation_real:
+            # correlations on the low-pass residuals, which are normalized
+            # by the number of elements of the low-pass residual itself.
+            # there's no magnitude at the next scale, so the magnitude
+            # correlations of the low-pass residual are left at zero
+            nrp = lowpass_neighbors.shape[-1]
+            representation["cross_orientation_correlation_real"][
+                ..., 0:nrp, 0:nrp, self.n_scales
+            ] = self._gram_crosscorrelation([lowpass_neighbors],
+                                            lowpass_neighbors.shape[-2] / 4.0)
+
+        for this_scale in [s for s in range(0, self.n_scales) if s in scales]:
+            band_num_el = real_pyr_coeffs[(this_scale, 0)].shape[-2:].numel()
+            next_scale_mag, next_scale_real = None, None
+            if this_scale < last_scale and (cross_scale_mag or cross_scale_real):
                 upsampled = (
                     self.__class__.expand(
-                        self.real_pyr_coeffs["residual_lowpass"].squeeze(), 2
+                        torch.stack([pyr_coeffs[(this_scale + 1, nor)]
+                                     for nor in range(0, self.n_orientations)], dim=-3),
+                        2
                     )
                     / 4.0
                 )
-                upsampled = upsampled.t()
-                next_scale_real = torch.stack(
-                    (
-                        upsampled.flatten(),
-                        upsampled.roll(1, 0).flatten(),
-                        upsampled.roll(-1, 0).flatten(),
-                        upsampled.roll(1, 1).flatten(),
-                        upsampled.roll(-1, 1).flatten(),
-                    ),
-                    1,
-                )
-                next_scale_mag = torch.empty((0), device=upsampled.device)
-
-            orientation_bands_mag = (
-                torch.stack(
-                    tuple(
-                        [
-                            aa.t()
-                            for aa in [
-                                self.magnitude_pyr_coeffs[(this_scale, ii)]
-                                for ii in range(0, self.n_orientations)
-                            ]
-                        ]
-                    )
-                )
-                .view((self.n_orientations, band_num_el))
-                .t()
-            )
 
-            if next_scale_mag.shape[0] > 0:
-                np0 = next_scale_mag.shape[1]
-            else:
-                np0 = 0
-
-            self.representation["cross_orientation_correlation_magnitude"][
-                0 : self.n_orientations, 0 : self.n_orientations, this_scale
-            ] = self.compute_crosscorrelation( orientation_bands_mag.t(), orientation_bands_mag, band_num_el)
-
-            if np0 > 0:
-                self.representation["cross_scale_correlation_magnitude"][
-                    0 : self.n_orientations, 0:np0, this_scale
-                ] = self.compute_crosscorrelation(
-                    orientation_bands_mag.t(), next_scale_mag, band_num_el
-                )
+                # Here we double the phase of the upsampled band.  This trick
+                # allows us to find the correlation between content in two adjacent
+                # spatial scales.
+                magnitude = upsampled.abs()
+                double_phase = 2 * torch.atan2(upsampled.real, upsampled.imag)
+                X = magnitude * torch.cos(double_phase)
+                Y = magnitude * torch.sin(double_phase)
+
+                # Save the components
+                next_scale_real = flatten_bands(torch.cat([X, Y], dim=-3))
+
+                # Save the magnitude
+                mag = (X ** 2 + Y ** 2) ** 0.5
+                next_scale_mag = flatten_bands(mag - mag.mean(dim=(-2, -1), keepdim=True))
+
+            elif this_scale == last_scale and cross_scale_real:
+                next_scale_real = lowpass_neighbors
+
+            # the correlations between the columns of the orientation bands
+            # and those of the orientation bands and the next scale are
+            # computed with a single matrix product, from which we take the
+            # blocks we need.
+            if cross_orientation_mag or (cross_scale_mag and next_scale_mag is not None):
+                orientation_bands_mag = flatten_bands(torch.stack(
+                    [magnitude_pyr_coeffs[(this_scale, ii)]
+                     for ii in range(0, self.n_orientations)],
+                    dim=-3
+                ))
+                matrices = [orientation_bands_mag]
+                if cross_scale_mag and next_scale_mag is not None:
+                    matrices.append(next_scale_mag)
+                corr = self._gram_crosscorrelation(matrices, band_num_el)
+                if cross_orientation_mag:
+                    representation["cross_orientation_correlation_magnitude"][
+                        ..., 0:n_ori, 0:n_ori, this_scale
+                    ] = corr[..., :n_ori]
+                if len(matrices) > 1:
+                    np0 = next_scale_mag.shape[-1]
+                    representation["cross_scale_correlation_magnitude"][
+                        ..., 0:n_ori, 0:np0, this_scale
+                    ] = corr[..., n_ori:]
+
+            if cross_orientation_real or (cross_scale_real and next_scale_real is not None):
+                orientation_bands_real = flatten_bands(torch.stack(
+                    [real_pyr_coeffs[(this_scale, ii)] for ii in range(0, self.n_orientations)],
+                    dim=-3
+                ))
+                matrices = [orientation_bands_real]
+                if cross_scale_real and next_scale_real is not None:
+                    matrices.append(next_scale_real)
+                corr = self._gram_crosscorrelation(matrices, band_num_el)
+                if cross_orientation_real:
+                    representation["cross_orientation_correlation_real"][
+                        ..., 0:n_ori, 0:n_ori, this_scale
+                    ] = corr[..., :n_ori]
+                if len(matrices) > 1:
+                    nrp = next_scale_real.shape[-1]
+                    representation["cross_scale_correlation_real"][
+                        ..., 0:n_ori, 0:nrp, this_scale
+                    ] = corr[..., n_ori:]
+
+    def _gram_crosscorrelation(self, matrices, band_num_el):
+        r"""Compute the cross-correlations between the columns of the first matrix of a list and
+        those of all the matrices at once.
+
+        This is equivalent to calling ``compute_crosscorrelation`` on the
+        first matrix and each matrix of the list (including itself), but uses
+        a single matrix product.
 
-                # correlations on the low-pass residuals
-                if this_scale == self.n_scales - 1:
-                    self.representation["cross_orientation_correlation_magnitude"][
-                        0:np0, 0:np0, this_scale + 1
-                    ] = self.compute_crosscorrelation(
-                        next_scale_mag.t(), next_scale_mag, band_num_el / 4.0
-                    )
+        Parameters
+        ----------
+        matrices: list
+            List of tensors of shape (..., n_pixels, n_i).
+        band_num_el: int
+            Number of elements for bands in the scale
 
-            orientation_bands_real = (
-                torch.stack(
-                    tuple(
-                        [
-                            aa.t()
-                            for aa in [
-                                self.real_pyr_coeffs[(this_scale, ii)].squeeze()
-                                for ii in range(0, self.n_orientations)
-                            ]
-                        ]
-                    )
-                )
-                .view((self.n_orientations, band_num_el))
-                .t()
-            )
+        Returns
+        -------
+        torch.Tensor
+            cross-correlation, of shape (..., n_0, sum(n_i)), whose blocks of
+            columns correspond to the matrices.
 
-            if next_scale_real.shape[0] > 0:
-                nrp = next_scale_real.shape[1]
-            else:
-                nrp = 0
-            self.representation["cross_orientation_correlation_real"][
-                0 : self.n_orientations, 0 : self.n_orientations, this_scale
-            ] = self.compute_crosscorrelation(
-                orientation_bands_real.t(), orientation_bands_real, band_num_el
-            )
-            if nrp > 0:
-                self.representation["cross_scale_correlation_real"][
-                    0 : self.n_orientations, 0:nrp, this_scale
-                ] = self.compute_crosscorrelation(
-                    orientation_bands_real.t(), next_scale_real, band_num_el
-                )
-                if (
-                    this_scale == self.n_scales - 1
-                ):  # correlations on the low-pass residuals
-                    self.representation["cross_orientation_correlation_real"][
-                        0:nrp, 0:nrp, this_scale + 1
-                    ] = self.compute_crosscorrelation(
-                        next_scale_real.t(), next_scale_real, (band_num_el / 4.0)
-                    )
+        """
+        if self.analytic_gradients:
+            return _GramCrossCorrelation.apply(band_num_el, self.use_true_correlations,
+                                               *matrices)
+        stacked = torch.cat(matrices, dim=-1)
+        gram = torch.einsum('...pi,...pj->...ij', matrices[0], stacked) / band_num_el
+        if self.use_true_correlations:
+            # the standard deviation of each matrix as a whole, repeated for
+            # each of its columns
+            stds = [m.flatten(start_dim=-2).std(-1, keepdim=True) for m in matrices]
+            std = torch.cat([sd.expand(*m.shape[:-2], m.shape[-1])
+                             for sd, m in zip(stds, matrices)], dim=-1)
+            gram = gram / (stds[0][..., None] * std[..., None, :])
+        return gram
 
     def compute_crosscorrelation(self, ch1, ch2, band_num_el):
         r"""Computes either the covariance of the two matrices or the cross-correlation
@@ -785,37 +1161,50 @@ class PortillaSimoncelli(nn.Module):
         Parameters
         ----------
         ch1: torch.Tensor
-            First matrix for cross correlation.
+            First matrix for cross correlation, of shape (..., n, n_pixels).
         ch2: torch.Tensor
-            Second matrix for cross correlation.
+            Second matrix for cross correlation, of shape (..., n_pixels, m).
         band_num_el: int
             Number of elements for bands in the scale
 
         Returns
         -------
         torch.Tensor
-            cross-correlation.
+            cross-correlation, of shape (..., n, m).
 
         """
 
         if self.use_true_correlations:
-            return ch1 @ ch2 / (band_num_el * ch1.std() * ch2.std())
+            # the standard deviation of each matrix as a whole
+            std1 = ch1.flatten(start_dim=-2).std(-1)[..., None, None]
+            std2 = ch2.flatten(start_dim=-2).std(-1)[..., None, None]
+            return ch1 @ ch2 / (band_num_el * std1 * std2)
         else:
             return ch1 @ ch2 / (band_num_el)
 
-    def compute_autocorrelation(self, ch):
+    def compute_autocorrelation(self, ch, ch_dft=None):
         r"""Computes the autocorrelation and variance of a given matrix (ch)
 
+        The autocorrelation is computed as the inverse DFT of the power
+        spectrum (Wiener-Khinchin theorem).
+
         Parameters
         ----------
         ch: torch.Tensor
+            of shape (..., height, width). All leading dimensions are handled
+            independently.
+        ch_dft: torch.Tensor or None, optional
+            The DFT of ``ch``, as computed by ``torch.fft.fft2``. If None, we
+            compute it. Pass this if it's already available (e.g., from
+            ``Steerable_Pyramid_Freq.forward(..., domain='both')``) to avoid
+            recomputing it.
 
         Returns
         -------
         ac: torch.Tensor
-            Autocorrelation of matrix (ch).
+            Autocorrelation of matrix (ch), of shape (..., 2*le+1, 2*le+1).
         vari: torch.Tensor
-            Variance of matrix (ch).
+            Variance of matrix (ch), of shape (...).
 
         """
 
@@ -829,22 +1218,29 @@ class PortillaSimoncelli(nn.Module):
         cy = int(ch.shape[-1] / 2)
         cx = int(ch.shape[-2] / 2)
 
-        # Calculate the auto-correlation
-        ac = torch.fft.fft2(ch.squeeze())
-        ac = ac.real.pow(2) + ac.imag.pow(2)
-        ac = torch.fft.ifft2(ac)
-        ac = torch.fft.fftshift(ac.unsqueeze(0)).squeeze() / torch.numel(ch)
+        if self.analytic_gradients:
+            # the spectrum is recomputed in the backward pass, so ch_dft isn't used
+            ac = _Autocorrelation.apply(ch, le)
+        else:
+            # Calculate the auto-correlation
+            if ch_dft is None:
+                ac = torch.fft.fft2(ch)
+            else:
+                ac = ch_dft
+            ac = ac.real.pow(2) + ac.imag.pow(2)
+            ac = torch.fft.ifft2(ac)
+            ac = torch.fft.fftshift(ac, dim=(-2, -1)) / ch.shape[-2:].numel()
 
-        # Return only the central auto-correlation
-        ac = ac.real[cx - le : cx + le + 1, cy - le : cy + le + 1]
-        vari = ac[le, le]
+            # Return only the central auto-correlation
+            ac = ac.real[..., cx - le : cx + le + 1, cy - le : cy + le + 1]
+        vari = ac[..., le, le]
 
         if self.use_true_correlations:
-            ac = ac / vari
+            ac = ac / vari[..., None, None]
 
         return ac, vari
 
-    def compute_skew_kurtosis(self, ch, vari):
+    def compute_skew_kurtosis(self, ch, vari, pixel_var):
         r"""Computes the skew and kurtosis of ch.
 
         Skew and kurtosis of ch are computed.  If the ratio of its variance (vari)
@@ -854,8 +1250,11 @@ class PortillaSimoncelli(nn.Module):
         Parameters
         ----------
         ch: torch.Tensor
+            of shape (..., height, width)
         vari: torch.Tensor
-            variance of ch
+            variance of ch, of shape (...)
+        pixel_var: torch.Tensor
+            pixel variance of the original image, of shape (...)
 
         Returns
         -------
@@ -867,65 +1266,78 @@ class PortillaSimoncelli(nn.Module):
         """
 
         # Find the skew and the kurtosis of the low-pass residual
-        if vari / self.representation["pixel_statistics"]["var"] > 1e-6:
-            skew = self.__class__.skew(ch, mu=0, var=vari)
-            kurtosis = self.__class__.kurtosis(ch, mu=0, var=vari)
-        else:
-            skew = 0
-            kurtosis = 3
+        valid = vari / pixel_var > 1e-6
+        # use a variance of 1 where we return the default values, so that
+        # they don't produce (unused) infs and nans, which would break the
+        # gradients
+        safe_vari = torch.where(valid, vari, torch.ones_like(vari))
+        skew = self.__class__.skew(ch, mu=0, var=safe_vari,
+                                   analytic_gradients=self.analytic_gradients)
+        kurtosis = self.__class__.kurtosis(ch, mu=0, var=safe_vari,
+                                           analytic_gradients=self.analytic_gradients)
+        skew = torch.where(valid, skew, torch.zeros_like(skew))
+        kurtosis = torch.where(valid, kurtosis, 3 * torch.ones_like(kurtosis))
 
         return skew, kurtosis
 
     @staticmethod
-    def skew(X, mu=None, var=None):
+    def skew(X, mu=None, var=None, analytic_gradients=False):
         r"""Computes the skew of a matrix X.
 
         Parameters
         ----------
         X: torch.Tensor
-            matrix to compute the skew of.
+            matrix to compute the skew of, of shape (..., height, width). The
+            skew is computed over the last two dimensions.
         mu: torch.Tensor or None, optional
-            pre-computed mean. If None, we compute it.
+            pre-computed mean, of shape (...). If None, we compute it.
         var: torch.Tensor or None, optional
-            pre-computed variance. If None, we compute it.
+            pre-computed variance, of shape (...). If None, we compute it.
+        analytic_gradients: bool, optional
+            Whether to compute the third moment with a custom autograd
+            function (see ``PortillaSimoncelli``).
 
         Returns
         -------
         skew: torch.Tensor
-            skew of the matrix X
+            skew of the matrix X, of shape (...)
 
         """
         if mu is None:
-            mu = X.mean()
+            mu = X.mean(dim=(-2, -1))
         if var is None:
-            var = X.var()
-        return torch.mean((X - mu).pow(3)) / (var.pow(1.5))
+            var = X.var(dim=(-2, -1))
+        return _central_moment(X, mu, 3, analytic_gradients) / (var.pow(1.5))
     
     @staticmethod
-    def kurtosis(X, mu=None, var=None):
+    def kurtosis(X, mu=None, var=None, analytic_gradients=False):
         r"""Computes the kurtosis of a matrix X.
 
         Parameters
         ----------
         X: torch.Tensor
-            matrix to compute the kurtosis of.
+            matrix to compute the kurtosis of, of shape (..., height, width).
+            The kurtosis is computed over the last two dimensions.
         mu: torch.Tensor
-            pre-computed mean. If None, we compute it.
+            pre-computed mean, of shape (...). If None, we compute it.
         var: torch.Tensor
-            pre-computed variance. If None, we compute it.
+            pre-computed variance, of shape (...). If None, we compute it.
+        analytic_gradients: bool, optional
+            Whether to compute the fourth moment with a custom autograd
+            function (see ``PortillaSimoncelli``).
 
         Returns
         -------
         kurtosis: torch.Tensor
-            kurtosis of the matrix X
+            kurtosis of the matrix X, of shape (...)
 
         """
         # implementation is only for real components
         if mu is None:
-            mu = X.mean()
+            mu = X.mean(dim=(-2, -1))
         if var is None:
-            var = X.var()
-        return torch.mean(torch.abs(X - mu).pow(4)) / (var.pow(2))
+            var = X.var(dim=(-2, -1))
+        return _central_moment(X, mu, 4, analytic_gradients) / (var.pow(2))
 
 
 
@@ -941,9 +1353,10 @@ class PortillaSimoncelli(nn.Module):
         Parameters
         ----------
         data : torch.Tensor, dict, or None, optional
-            The data to show on the plot. If None, we use
-            ``self.representation``. Else, should look like
-            ``self.representation``, with the exact same structure
+            The data to show on the plot. If None, we use the
+            representation captured by the last call to ``forward`` (requires
+            ``capture_intermediates``). Else, should look like
+            the representation vector, with the exact same structure
             (e.g., as returned by ``metamer.representation_error()`` or
             another instance of this class).
         ax : 
@@ -968,9 +1381,14 @@ class PortillaSimoncelli(nn.Module):
         n_cols = 3
 
         if data is None:
-            rep = self.representation
-        else:
-            rep = self.convert_to_dict(data)
+            if self.intermediates is None:
+                raise ValueError("data must be passed, unless capture_intermediates is True and"
+                                 " forward has been called!")
+            data = self.convert_to_vector(self.intermediates["representation"])
+        if data.ndimension() == 3:
+            # (batch, channel, n_statistics): we only plot one image
+            data = data[batch_idx, 0]
+        rep = self.convert_to_dict(data)
 
         data = self._representation_for_plotting(rep)
 
@@ -1010,28 +1428,23 @@ class PortillaSimoncelli(nn.Module):
 
 
 
-    def _representation_for_plotting(self, rep, batch_idx=0):
+    def _representation_for_plotting(self, rep):
         r""" Converts the data into a dictionary representation that is more convenient for plotting.  Intended
         as a helper function for plot_representation.
 
         """
         data = OrderedDict()
-        data["pixels+var_highpass"] = rep["pixel_statistics"]
-        data["pixels+var_highpass"]["var_highpass_residual"] = rep[
-            "var_highpass_residual"
-        ]
-        if self.use_true_correlations:
-            data["var+skew+kurtosis"] = torch.stack(
-                (
-                    rep["std_reconstructed"],
-                    rep["skew_reconstructed"],
-                    rep["kurtosis_reconstructed"],
-                )
-            )
-        else:
-            data["skew+kurtosis"] = torch.stack(
-                (rep["skew_reconstructed"], rep["kurtosis_reconstructed"])
-            )
+        if "pixel_statistics" in rep or "var_highpass_residual" in rep:
+            pixels = OrderedDict(rep.get("pixel_statistics", {}))
+            if "var_highpass_residual" in rep:
+                pixels["var_highpass_residual"] = rep["var_highpass_residual"]
+            data["pixels+var_highpass"] = pixels
+        # the statistics of the reconstructed low-pass images are plotted together
+        names = OrderedDict([("std_reconstructed", "var"), ("skew_reconstructed", "skew"),
+                             ("kurtosis_reconstructed", "kurtosis")])
+        names = OrderedDict((k, v) for k, v in names.items() if k in rep)
+        if names:
+            data["+".join(names.values())] = torch.stack([rep[k] for k in names.keys()])
 
         for (k, v) in rep.items():
             if k not in [
@@ -1090,9 +1503,10 @@ class PortillaSimoncelli(nn.Module):
         batch_idx : int, optional
             Which index to take from the batch dimension (the first one)
         data : torch.Tensor, dict, or None, optional
-            The data to show on the plot. If None, we use
-            ``self.representation``. Else, should look like
-            ``self.representation``, with the exact same structure
+            The data to show on the plot. If None, we use the
+            representation captured by the last call to ``forward`` (requires
+            ``capture_intermediates``). Else, should look like
+            the representation vector, with the exact same structure
             (e.g., as returned by ``metamer.representation_error()`` or
             another instance of this class).
 
@@ -1105,7 +1519,15 @@ class PortillaSimoncelli(nn.Module):
         """
         stem_artists = []
         axes = [ax for ax in axes if len(ax.containers) == 1]
+        if data is None:
+            if self.intermediates is None:
+                raise ValueError("data must be passed, unless capture_intermediates is True and"
+                                 " forward has been called!")
+            data = self.convert_to_vector(self.intermediates["representation"])
         if not isinstance(data, dict):
+            if data.ndimension() == 3:
+                # (batch, channel, n_statistics): we only plot one image
+                data = data[batch_idx, 0]
             data = self.convert_to_dict(data)
         rep = self._representation_for_plotting(data)
         for ax, d in zip(axes, rep.values()):
@@ -0,0 +1,244 @@
+import json
+import os
+import os.path as op
+import time
+import warnings
+from collections import OrderedDict
+from glob import glob
+from multiprocessing import Pool
+
+import numpy as np
+import torch
+from tqdm.auto import tqdm
+
+from ...tools.data import _read_image
+from .portilla_simoncelli import PortillaSimoncelli
+
+
+def _decode(path):
+    r"""Read ``path`` as a grayscale float32 image, returning None if we can't"""
+    try:
+        return _read_image(path, as_gray=True).astype(np.float32)
+    except ValueError:
+        return None
+
+
+def _index_path(output):
+    r"""Path of the sidecar index of the feature matrix ``output``"""
+    return op.splitext(output)[0] + "_index.json"
+
+
+def _write_index(index, path):
+    r"""Write the index to a temporary file first, so that an interruption
+    never leaves a truncated index behind"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def extract_texture_statistics(paths, output, batch_size=32, n_workers=None,
+                               device="cpu", resume=True, max_pending=None,
+                               max_models=8, **model_kwargs):
+    r"""Compute the Portilla-Simoncelli statistics of a collection of images
+
+    The images are decoded (and converted to grayscale) in ``n_workers``
+    worker processes, grouped by shape and their statistics computed in
+    batches of up to ``batch_size`` images of the same shape, with one
+    ``PortillaSimoncelli`` model per image shape. To bound memory, the
+    images of the shape that has been waiting the longest are computed (even
+    if there are fewer than ``batch_size`` of them) whenever more than
+    ``max_pending`` images are waiting, and only the ``max_models`` most
+    recently used models are kept.
+
+    The statistics are written to ``output``, a ``.npy`` file containing a
+    float32 matrix of shape ``(n_images, n_stats)``, whose row ``i``
+    contains the statistics of the i-th image, and which can be loaded with
+    ``np.load(output, mmap_mode='r')``. Next to it, the sidecar index
+    ``{output}_index.json`` (with ``output``'s extension removed) contains:
+
+    - ``paths``: the path of the image of each row.
+    - ``shapes``: the shape of each image (None if not computed yet or if
+      the file couldn't be read as an image).
+    - ``done``: whether each row has been computed. The rows of files that
+      couldn't be read as images, or of images for which the model can't be
+      built (e.g., too small for its pyramid), are marked as done and filled
+      with NaNs.
+    - ``model_kwargs`` and ``n_stats``: the arguments of the models and the
+      length of the representation.
+    - ``compact_index``: only if ``compact=True`` is passed to the models,
+      the ``compact_index`` of the model of each image shape (with keys
+      ``'{height}x{width}'``), see below.
+    - ``elapsed`` and ``images_per_second``: the time taken by the last call
+      (in seconds) and its throughput.
+
+    The feature matrix is flushed and the index updated after each batch,
+    so if the extraction is interrupted, calling this function again with
+    the same arguments only computes the missing rows.
+
+    The length of the compact representation (``compact=True``) depends on
+    the image shape, so the matrix always contains the full representation,
+    and the compact vector of row ``i`` is
+    ``features[i, index['compact_index']['{height}x{width}']]``, with the
+    shape of the i-th image in ``index['shapes'][i]``.
+
+    Parameters
+    ----------
+    paths : str or list
+        A str or list of strs. If a list, must contain paths of image files.
+        If a str, can either be the path of a single image file or of a
+        single directory, in which case we use every file it contains (in
+        sorted order; files that can't be read as images are skipped with a
+        warning). This is NOT recursive.
+    output : str
+        Path of the ``.npy`` file to write the statistics to.
+    batch_size : int, optional
+        Maximum number of images whose statistics are computed at once.
+    n_workers : int or None, optional
+        Number of processes used to decode the images. If None, we use
+        ``os.cpu_count()``. If 0, the images are decoded in this process.
+    device : str or torch.device, optional
+        Device on which to compute the statistics.
+    resume : bool, optional
+        If True and ``output`` and its index already exist, only compute the
+        rows that are not done (raising a ValueError if they were created
+        with different paths or model arguments). If False, they're
+        overwritten.
+    max_pending : int or None, optional
+        Maximum number of decoded images waiting to be computed. If None, we
+        use ``4 * batch_size``.
+    max_models : int, optional
+        Maximum number of models (one per image shape) kept in memory.
+    model_kwargs :
+        Passed to ``PortillaSimoncelli`` (e.g., ``n_scales``,
+        ``n_orientations``, ``spatial_corr_width``, ``statistics``,
+        ``compact``).
+
+    Returns
+    -------
+    features : np.memmap
+        The statistics, of shape ``(n_images, n_stats)``.
+    index : dict
+        The sidecar index (see above).
+
+    """
+    if isinstance(paths, str):
+        if op.isfile(paths):
+            paths = [paths]
+        elif op.isdir(paths):
+            paths = sorted(glob(op.join(paths, '*')))
+        else:
+            raise Exception("paths must either a single file, a list of "
+                            "files, or a single directory, unsure what "
+                            "to do with %s!" % paths)
+    paths = [str(p) for p in paths]
+    compact = model_kwargs.get("compact", False)
+    # we store the full representation, whose length doesn't depend on the
+    # image shape, so we can get it from a model of any shape large enough
+    # for its pyramid
+    full_kwargs = {**model_kwargs, "compact": False}
+    size = 2 ** (model_kwargs.get("n_scales", 4) + 2)
+    n_stats = len(PortillaSimoncelli((size, size), **full_kwargs).representation_scales)
+    index_path = _index_path(output)
+
+    if resume and op.exists(output) and op.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if index["paths"] != paths or index["model_kwargs"] != json.loads(
+                json.dumps(model_kwargs)):
+            raise ValueError(f"{output} was created with different paths or model "
+                             "arguments, use resume=False to overwrite it!")
+        features = np.lib.format.open_memmap(output, mode="r+")
+    else:
+        index = {"paths": paths, "shapes": [None] * len(paths),
+                 "done": [False] * len(paths), "model_kwargs": model_kwargs,
+                 "n_stats": n_stats, "elapsed": None, "images_per_second": None}
+        if compact:
+            index["compact_index"] = {}
+        features = np.lib.format.open_memmap(output, mode="w+", dtype=np.float32,
+                                             shape=(len(paths), n_stats))
+        features[:] = np.nan
+        features.flush()
+        _write_index(index, index_path)
+
+    if max_pending is None:
+        max_pending = 4 * batch_size
+    # the most recently used models, by shape
+    models = OrderedDict()
+    # the shapes we can't build a model for, with the corresponding error
+    failed_shapes = {}
+    # images waiting to be processed, grouped by shape, in the order in which
+    # the shapes started waiting
+    pending = OrderedDict()
+
+    def skip(i, msg):
+        warnings.warn(msg)
+        index["done"][i] = True
+        pbar.update(1)
+
+    def get_model(shape):
+        if shape in models:
+            models.move_to_end(shape)
+            return models[shape]
+        try:
+            model = PortillaSimoncelli(shape, **full_kwargs).to(device)
+        except Exception as e:
+            failed_shapes[shape] = e
+            return None
+        models[shape] = model
+        if len(models) > max_models:
+            models.popitem(last=False)
+        if compact:
+            index["compact_index"][f"{shape[0]}x{shape[1]}"] = \
+                model.compact_index.tolist()
+        return model
+
+    def compute(shape):
+        inds, ims = zip(*pending.pop(shape))
+        model = get_model(shape)
+        if model is None:
+            for i in inds:
+                skip(i, f"Unable to compute the statistics of {paths[i]} (of shape "
+                     f"{shape}): {failed_shapes[shape]}, skipping...")
+            _write_index(index, index_path)
+            return
+        x = torch.as_tensor(np.stack(ims), device=device).unsqueeze(1)
+        with torch.no_grad():
+            stats = model(x)[:, 0]
+        features[list(inds)] = stats.cpu().numpy()
+        features.flush()
+        for i in inds:
+            index["shapes"][i] = list(shape)
+            index["done"][i] = True
+        _write_index(index, index_path)
+        pbar.update(len(inds))
+
+    todo = [i for i, done in enumerate(index["done"]) if not done]
+    todo_paths = [paths[i] for i in todo]
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    pool = Pool(n_workers) if n_workers > 0 else None
+    start = time.time()
+    try:
+        ims = pool.imap(_decode, todo_paths) if pool is not None else map(_decode, todo_paths)
+        with tqdm(total=len(todo), unit="im") as pbar:
+            for i, im in zip(todo, ims):
+                if im is None:
+                    skip(i, "Unable to load in file %s, it's probably not "
+                         "an image, skipping..." % paths[i])
+                    continue
+                pending.setdefault(im.shape, []).append((i, im))
+                if len(pending[im.shape]) == batch_size or im.shape in failed_shapes:
+                    compute(im.shape)
+                elif sum(len(v) for v in pending.values()) > max_pending:
+                    compute(next(iter(pending)))
+            for shape in list(pending.keys()):
+                compute(shape)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    elapsed = time.time() - start
+    index["elapsed"] = elapsed
+    index["images_per_second"] = len(todo) / elapsed if elapsed > 0 else None
+    _write_index(index, index_path)
+    return features, index
@@ -5,6 +5,7 @@ from torch import nn
 import torch.nn.functional as F
 import pyrtools as pt
 from typing import Union, Tuple
+from functools import lru_cache
 import math
 
 
@@ -13,7 +14,36 @@ import math
 # handle multiple channels
 # handle batch dimension
 # handle signal of dimension 1,2,3
-# faster implementation with separable 1d conv
+
+
+@lru_cache(maxsize=None)
+def _named_filter_taps(name):
+    r"""The taps of the 1d named filter ``name``, as python floats"""
+    return tuple(float(f) for f in np.asarray(pt.named_filter(name)).flatten())
+
+
+def _get_filter(name, n_channels, dtype, device, ndim=2):
+    r"""The named filter ``name`` (its outer product with itself, if
+    ``ndim`` is 2), repeated for each channel, as a tensor on ``device``
+
+    Cached, so that it's only built (and copied to the device) once for each
+    filter, number of channels, dtype and device. Only the most recently used
+    ones are kept, so that we don't hold on to device memory forever.
+
+    """
+    # always pass all the arguments positionally, since lru_cache treats
+    # keyword and positional arguments as different keys
+    return _build_filter(name, n_channels, dtype, torch.device(device), ndim)
+
+
+@lru_cache(maxsize=8)
+def _build_filter(name, n_channels, dtype, device, ndim):
+    r"""Build the filter returned by ``_get_filter``, which caches it"""
+    f = np.asarray(_named_filter_taps(name))
+    if ndim == 2:
+        f = np.outer(f, f)
+    filt = torch.tensor(f, dtype=dtype, device=device)
+    return filt.repeat(n_channels, *[1] * (ndim + 1))
 
 
 def correlate_downsample(signal, filt, edges="reflect1",
@@ -22,7 +52,9 @@ def correlate_downsample(signal, filt, edges="reflect1",
 
     Args:
         signal ([type]): [description]
-        filt ([type]): [description]
+        filt ([type]): [description]. Can also be the name of a pyrtools
+            named filter, in which case it's taken from a cache (for 4d
+            signals, we use its outer product with itself).
         edges (str, optional): [description]. Defaults to "reflect1".
         step (int, optional): [description]. Defaults to 2.
         start (tuple, optional): [description]. Defaults to (0, 0).
@@ -34,6 +66,10 @@ def correlate_downsample(signal, filt, edges="reflect1",
 
     n_channels = signal.shape[1]
 
+    if isinstance(filt, str) and len(signal.shape) in [3, 4]:
+        filt = _get_filter(filt, n_channels, signal.dtype, signal.device,
+                           ndim=len(signal.shape) - 2)
+
     if len(signal.shape) == 3:
 
         if isinstance(filt, np.ndarray) or filt.shape[0] != n_channels:
@@ -93,12 +129,15 @@ def upsample_convolve(signal, filt, edges="reflect1",
 
     n_channels = signal.shape[1]
 
+    if isinstance(filt, str):
+        filt = _get_filter(filt, n_channels, signal.dtype, signal.device)
+
     if isinstance(filt, np.ndarray) or filt.shape[0] != n_channels:
         filt = torch.tensor(filt, dtype=torch.float32)
         filt = filt.repeat(n_channels,  1, 1, 1).to(signal.device)
 
     if edges == 'zero':
-        upsample_convolve = nn.functional.conv_transpose2d(signal, filt,
+        return nn.functional.conv_transpose2d(signal, filt,
                             bias=None, stride=step,
                             padding=(filt.shape[-2] // 2, filt.shape[-1] // 2),
                             output_padding=1, groups=n_channels, dilation=1)
@@ -116,28 +155,254 @@ def upsample_convolve(signal, filt, edges="reflect1",
                                               dilation=1)
 
 
-def blur_downsample(x, filtname='binom5', step=(2, 2)):
-    """""[summary]""
+def _pair(x):
+    return tuple(x) if isinstance(x, (tuple, list)) else (x, x)
 
-    Args:
-        x ([type]): [description]
-        filtname (str, optional): [description]. Defaults to 'binom5'.
-        step (tuple, optional): [description]. Defaults to (2, 2).
 
-    Returns:
-        [type]: [description]
+def _filter_taps(filt):
+    r"""The taps of the 1d filter ``filt``: python floats, unless ``filt`` is
+    a tensor, in which case they're 0d tensors on its device (so they're not
+    copied to the host)"""
+    if torch.is_tensor(filt):
+        return filt.flatten().unbind()
+    return [float(f) for f in np.asarray(filt).flatten()]
+
+
+def _slice_along(dim, sl):
+    r"""Index selecting ``sl`` along dimension ``dim`` (-1 or -2)"""
+    return (Ellipsis, sl) if dim == -1 else (Ellipsis, sl, slice(None))
+
+
+def _correlate1d_downsample(x, filt, dim, step):
+    r"""Correlate ``x`` with the 1d filter ``filt`` along ``dim``, without
+    padding, keeping one every ``step`` outputs
+
+    The correlation is a weighted sum of ``len(filt)`` strided slices of
+    ``x``, so only the outputs that are kept are computed.
+
+    """
+    k = len(filt)
+    n_out = (x.shape[dim] - k) // step + 1
+    return sum(f * x[_slice_along(dim, slice(i, i + step * (n_out - 1) + 1, step))]
+               for i, f in enumerate(filt))
+
+
+def _upsample_convolve1d(x, filt, dim, step, padding, output_padding):
+    r"""Transposed 1d convolution of ``x`` with ``filt`` along ``dim``
+
+    Same as ``conv_transpose1d`` with the given stride, padding and
+    output_padding: each input value, weighted by each filter tap, is
+    accumulated into a strided slice of the output.
+
+    """
+    k = len(filt)
+    n_in = x.shape[dim]
+    full_shape = list(x.shape)
+    full_shape[dim] = (n_in - 1) * step + k + output_padding
+    y = torch.zeros(full_shape, dtype=x.dtype, device=x.device)
+    for i, f in enumerate(filt):
+        y[_slice_along(dim, slice(i, i + step * (n_in - 1) + 1, step))] += f * x
+    n_out = (n_in - 1) * step - 2 * padding + k + output_padding
+    return y[_slice_along(dim, slice(padding, padding + n_out))]
+
+
+def separable_correlate_downsample(signal, filt, edges="reflect1", step=(2, 2)):
+    r"""Correlate ``signal`` with the separable filter ``np.outer(filt, filt)``
+    and downsample it
+
+    Equivalent to ``correlate_downsample(signal, np.outer(filt, filt), edges,
+    step)``, but the correlation is computed as a strided 1d correlation
+    along the rows followed by one along the columns, which needs about
+    ``k`` instead of ``k**2`` multiplications per output pixel (for a filter
+    of length ``k``), and only computes the outputs that are kept. The
+    filter taps are python floats, so no filter tensor is built or copied
+    to the device.
+
+    Parameters
+    ----------
+    signal : torch.Tensor
+        Tensor of shape (..., height, width). Each channel is filtered
+        separately.
+    filt : array_like or torch.Tensor
+        1d filter.
+    edges : {'reflect1', 'zero'}
+        How to handle the boundaries: reflect (without repeating the edge
+        pixels) or pad with zeros.
+    step : int or tuple, optional
+        Downsampling factor along the height and width.
+
+    Returns
+    -------
+    filtered : torch.Tensor
+        The filtered and downsampled signal.
+
+    """
+    step = _pair(step)
+    filt = _filter_taps(filt)
+    half = len(filt) // 2
+    if edges == 'reflect1':
+        signal = F.pad(signal, (half, half, half, half), mode='reflect')
+    elif edges == 'zero':
+        signal = F.pad(signal, (half, half, half, half))
+    else:
+        raise ValueError(f"edges must be one of 'reflect1' or 'zero' but got {edges}!")
+    signal = _correlate1d_downsample(signal, filt, -1, step[1])
+    return _correlate1d_downsample(signal, filt, -2, step[0])
+
+
+def separable_upsample_convolve(signal, filt, edges="reflect1", step=(2, 2)):
+    r"""Upsample ``signal`` and convolve it with the separable filter
+    ``np.outer(filt, filt)``
+
+    Equivalent to ``upsample_convolve(signal, np.outer(filt, filt), edges,
+    step)``, but computed as two strided 1d transposed convolutions, along
+    the columns and then along the rows.
+
+    Parameters
+    ----------
+    signal : torch.Tensor
+        Tensor of shape (..., height, width). Each channel is filtered
+        separately.
+    filt : array_like or torch.Tensor
+        1d filter, of odd length.
+    edges : {'reflect1', 'zero'}
+        How to handle the boundaries: reflect (without repeating the edge
+        pixels) or pad with zeros.
+    step : int or tuple, optional
+        Upsampling factor along the height and width.
+
+    Returns
+    -------
+    filtered : torch.Tensor
+        The upsampled and filtered signal.
+
+    """
+    step = _pair(step)
+    filt = _filter_taps(filt)
+    half = len(filt) // 2
+    if len(filt) % 2 == 0:
+        raise ValueError(f"filt must have an odd length but got {len(filt)}!")
+    if edges == 'reflect1':
+        # reflect the signal by as many samples as the upsampled filter
+        # reaches beyond the edges, and crop the corresponding outputs
+        n_reflect = [math.ceil(half / s) for s in step]
+        signal = F.pad(signal, (n_reflect[1], n_reflect[1], n_reflect[0], n_reflect[0]),
+                       mode='reflect')
+        padding = [half + n * s for n, s in zip(n_reflect, step)]
+    elif edges == 'zero':
+        padding = [half, half]
+    else:
+        raise ValueError(f"edges must be one of 'reflect1' or 'zero' but got {edges}!")
+    signal = _upsample_convolve1d(signal, filt, -2, step[0], padding[0], 1)
+    return _upsample_convolve1d(signal, filt, -1, step[1], padding[1], 1)
+
+
+def blur_downsample(x, filtname='binom5', step=(2, 2), edges='reflect1'):
+    r"""Blur and downsample a signal, with a (separable) named filter
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Signal of shape (batch, channel, height, width). Each channel is
+        filtered separately.
+    filtname : str, optional
+        Name of the 1d filter, see ``pyrtools.named_filter``. The signal is
+        blurred with its outer product with itself.
+    step : tuple, optional
+        Downsampling factor along the height and width.
+    edges : {'reflect1', 'zero'}
+        How to handle the boundaries.
+
+    Returns
+    -------
+    x_down : torch.Tensor
+        The blurred and downsampled signal.
+
+    """
+    return separable_correlate_downsample(x, _named_filter_taps(filtname), edges=edges,
+                                          step=step)
+
+
+def upsample_blur(x, filtname='binom5', step=(2, 2), edges='reflect1'):
+    r"""Upsample and blur a signal, with a (separable) named filter
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Signal of shape (batch, channel, height, width). Each channel is
+        filtered separately.
+    filtname : str, optional
+        Name of the 1d filter, see ``pyrtools.named_filter``. The signal is
+        blurred with its outer product with itself.
+    step : tuple, optional
+        Upsampling factor along the height and width.
+    edges : {'reflect1', 'zero'}
+        How to handle the boundaries.
+
+    Returns
+    -------
+    x_up : torch.Tensor
+        The upsampled and blurred signal.
+
+    """
+    return separable_upsample_convolve(x, _named_filter_taps(filtname), edges=edges,
+                                       step=step)
+
+
+class BlurDownsample(nn.Module):
+    r"""Module version of ``blur_downsample``
+
+    The taps of the filter are stored in a (non-persistent) buffer, so they
+    follow the module to the device and dtype of the signal and nothing is
+    built on the host when it's called.
+
+    Parameters
+    ----------
+    filtname : str, optional
+        Name of the 1d filter, see ``pyrtools.named_filter``.
+    step : tuple, optional
+        Downsampling factor along the height and width.
+    edges : {'reflect1', 'zero'}
+        How to handle the boundaries.
 
-    TODO
-    ----
-    make it separable for efficiency and clarity
     """
-    f = pt.named_filter(filtname)
-    return correlate_downsample(x, filt=np.outer(f, f), step=step)
+    def __init__(self, filtname='binom5', step=(2, 2), edges='reflect1'):
+        super().__init__()
+        self.step = _pair(step)
+        self.edges = edges
+        self.register_buffer('filt', torch.tensor(_named_filter_taps(filtname)),
+                             persistent=False)
+
+    def forward(self, x):
+        return separable_correlate_downsample(x, self.filt, edges=self.edges, step=self.step)
+
 
+class UpsampleBlur(nn.Module):
+    r"""Module version of ``upsample_blur``
 
-def upsample_blur(x, filtname ='binom5', step=(2, 2)):
-    f = pt.named_filter(filtname)
-    return upsample_convolve(x, filt=np.outer(f, f), step=step)
+    The taps of the filter are stored in a (non-persistent) buffer, so they
+    follow the module to the device and dtype of the signal and nothing is
+    built on the host when it's called.
+
+    Parameters
+    ----------
+    filtname : str, optional
+        Name of the 1d filter, see ``pyrtools.named_filter``.
+    step : tuple, optional
+        Upsampling factor along the height and width.
+    edges : {'reflect1', 'zero'}
+        How to handle the boundaries.
+
+    """
+    def __init__(self, filtname='binom5', step=(2, 2), edges='reflect1'):
+        super().__init__()
+        self.step = _pair(step)
+        self.edges = edges
+        self.register_buffer('filt', torch.tensor(_named_filter_taps(filtname)),
+                             persistent=False)
+
+    def forward(self, x):
+        return separable_upsample_convolve(x, self.filt, edges=self.edges, step=self.step)
 
 
 def _get_same_padding(
@@ -169,3 +434,121 @@ def same_padding(
                   [pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2],
                   mode=pad_mode)
     return x
+
+
+def _fast_fft_size(n: int) -> int:
+    """Smallest integer >= n whose only prime factors are 2, 3 and 5 (fast FFT sizes)"""
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+def fft_conv2d(x: Tensor, weight: Tensor, groups: int = 1) -> Tensor:
+    r"""Same as ``F.conv2d(x, weight, groups=groups)``, computed with FFTs
+
+    That is, the (unpadded, stride 1, no bias) cross-correlation of ``x`` with
+    ``weight``. Its cost doesn't depend on the size of the kernel, so it's
+    much cheaper than direct convolution for large kernels.
+
+    The cross-correlation is computed as a circular cross-correlation in the
+    frequency domain, with the input zero-padded to a fast FFT size, which is
+    equal to the linear one on the valid region of the output.
+
+    Parameters
+    ----------
+    x :
+        Input of shape (batch, in_channels, height, width).
+    weight :
+        Kernels of shape (out_channels, in_channels / groups, kh, kw).
+    groups :
+        Number of blocked connections from input channels to output channels,
+        as in ``F.conv2d``.
+
+    Returns
+    -------
+    y :
+        Output of shape (batch, out_channels, height - kh + 1, width - kw + 1).
+    """
+    batch, in_channels, h, w = x.shape
+    out_channels, _, kh, kw = weight.shape
+    s = (_fast_fft_size(h), _fast_fft_size(w))
+    x_dft = torch.fft.rfft2(x, s=s)
+    weight_dft = torch.fft.rfft2(weight.to(x.dtype), s=s)
+    x_dft = x_dft.reshape(batch, groups, in_channels // groups, *x_dft.shape[-2:])
+    weight_dft = weight_dft.reshape(groups, out_channels // groups, *weight_dft.shape[-3:])
+    # correlation is multiplication by the conjugate of the (real) kernel's spectrum
+    y_dft = torch.einsum('bgcij,gocij->bgoij', x_dft, weight_dft.conj())
+    y = torch.fft.irfft2(y_dft.reshape(batch, out_channels, *y_dft.shape[-2:]), s=s)
+    return y[..., :h - kh + 1, :w - kw + 1]
+
+
+def _use_fourier_backend(
+        x_shape: Tuple[int, ...],
+        weight_shape: Tuple[int, ...],
+        groups: int = 1
+) -> bool:
+    """Whether ``fft_conv2d`` is expected to be faster than ``F.conv2d``
+
+    Compares the number of multiply-adds of direct convolution with the cost
+    of the FFTs (one per input image and channel, kernel and output image and
+    channel). The constant is a rough estimate of their relative cost on CPU.
+    """
+    batch, in_channels, h, w = x_shape
+    out_channels, in_per_group, kh, kw = weight_shape
+    direct = batch * out_channels * in_per_group * (h - kh + 1) * (w - kw + 1) * kh * kw
+    n_fft = _fast_fft_size(h) * _fast_fft_size(w)
+    n_ffts = batch * in_channels + out_channels * in_per_group + batch * out_channels
+    return direct > 1.6 * n_ffts * n_fft * math.log2(n_fft)
+
+
+def same_conv2d(
+        x: Tensor,
+        weight: Tensor,
+        pad_mode: str = "circular",
+        groups: int = 1,
+        backend: str = "auto",
+) -> Tensor:
+    """2D cross-correlation whose output has the same height and width as ``x``
+
+    Same as ``F.conv2d(same_padding(x, weight.shape[-2:], pad_mode=pad_mode),
+    weight, groups=groups)``, for every padding mode supported by
+    ``same_padding`` (e.g., 'reflect', 'circular', 'constant', 'replicate').
+
+    Parameters
+    ----------
+    x :
+        Input of shape (batch, in_channels, height, width).
+    weight :
+        Kernels of shape (out_channels, in_channels / groups, kh, kw).
+    pad_mode :
+        Mode with which to pad ``x``, see ``same_padding``.
+    groups :
+        Number of blocked connections from input channels to output channels,
+        as in ``F.conv2d``.
+    backend : {'spatial', 'fourier', 'auto'}
+        Whether to compute the cross-correlation directly, with ``F.conv2d``,
+        or with FFTs, with ``fft_conv2d`` (whose cost doesn't depend on the
+        size of the kernel). If 'auto', we pick the one expected to be faster
+        given the size of the image and kernels (the Fourier backend for large
+        kernels, e.g. 15x15 or larger on a 64x64 image). The outputs are
+        identical up to floating point error.
+
+    Returns
+    -------
+    y :
+        Output of shape (batch, out_channels, height, width).
+    """
+    if backend not in ['spatial', 'fourier', 'auto']:
+        raise ValueError("backend must be one of 'spatial', 'fourier' or 'auto' but got "
+                         f"{backend}!")
+    x = same_padding(x, weight.shape[-2:], pad_mode=pad_mode)
+    if backend == 'auto':
+        backend = 'fourier' if _use_fourier_backend(x.shape, weight.shape, groups) else 'spatial'
+    if backend == 'fourier':
+        return fft_conv2d(x, weight, groups=groups)
+    return F.conv2d(x, weight, groups=groups)
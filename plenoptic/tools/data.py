@@ -50,6 +50,33 @@ def to_numpy(x, squeeze=False):
     return x
 
 
+def _read_image(path, as_gray=True):
+    r"""Read a single image file into an array with values between 0 and 1
+
+    See ``load_images`` for details. Raises a ValueError if ``path`` can't
+    be read as an image.
+
+    Returns
+    -------
+    im : np.ndarray
+        2d array if ``as_gray`` (or if the image is grayscale), else 3d
+        array with the channels on the first dimension.
+    """
+    im = imageio.imread(path)
+    # make it a float32 array with values between 0 and 1
+    im = im / np.iinfo(im.dtype).max
+    if im.ndim > 2:
+        if as_gray:
+            # From scikit-image 0.19 on, it will treat 2d signals as 1d
+            # images with 3 channels, so only call rgb2gray when it's more
+            # than 2d
+            im = color.rgb2gray(im)
+        else:
+            # RGB dimension ends up on the last one, so we rearrange
+            im = np.moveaxis(im, -1, 0)
+    return im
+
+
 def load_images(paths, as_gray=True):
     r"""Correctly load in images
 
@@ -94,22 +121,11 @@ def load_images(paths, as_gray=True):
     images = []
     for p in paths:
         try:
-            im = imageio.imread(p)
+            im = _read_image(p, as_gray)
         except ValueError:
             warnings.warn("Unable to load in file %s, it's probably not "
                           "an image, skipping..." % p)
             continue
-        # make it a float32 array with values between 0 and 1
-        im = im / np.iinfo(im.dtype).max
-        if im.ndim > 2:
-            if as_gray:
-                # From scikit-image 0.19 on, it will treat 2d signals as 1d
-                # images with 3 channels, so only call rgb2gray when it's more
-                # than 2d
-                im = color.rgb2gray(im)
-            else:
-                # RGB dimension ends up on the last one, so we rearrange
-                im = np.moveaxis(im, -1, 0)
         images.append(im)
     try:
         images = torch.tensor(images, dtype=torch.float32)
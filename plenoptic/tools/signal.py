@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import numpy as np
 import torch
 import torch.fft as fft
@@ -6,86 +8,6 @@ from torchvision.transforms.functional import center_crop
 from typing import Union, Tuple
 
 
-def steer(basis, angle, harmonics=None, steermtx=None, return_weights=False, even_phase=True):
-    """Steer BASIS to the specfied ANGLE.
-
-    Parameters
-    ----------
-    basis : array_like
-        array whose columns are vectorized rotated copies of a steerable function, or the responses
-        of a set of steerable filters.
-    angle : array_like or int
-        scalar or column vector the size of the basis. specifies the angle(s) (in radians) to
-        steer to
-    harmonics : list or None
-        a list of harmonic numbers indicating the angular harmonic content of the basis. if None
-        (default), N even or odd low frequencies, as for derivative filters
-    steermtx : array_like or None
-        matrix which maps the filters onto Fourier series components (ordered [cos0 cos1 sin1 cos2
-        sin2 ... sinN]). See steer_to_harmonics_mtx function for more details. If None (default),
-        assumes cosine phase harmonic components, and filter positions at 2pi*n/N.
-    return_weights : bool
-        whether to return the weights or not.
-    even_phase : bool
-        specifies whether the harmonics are cosine or sine phase aligned about those positions.
-
-    Returns
-    -------
-    res : np.ndarray
-        the resteered basis
-    steervect : np.ndarray
-        the weights used to resteer the basis. only returned if ``return_weights`` is True
-    """
-
-    num = basis.shape[-1]
-    device = basis.device
-
-    if isinstance(angle, (int, float)):
-        angle = np.array([angle])
-    else:
-        if angle.shape[0] != basis.shape[0] or angle.shape[1] != 1:
-            raise Exception("""ANGLE must be a scalar, or a column vector the size of the basis elements""")
-
-    # If HARMONICS is not specified, assume derivatives.
-    if harmonics is None:
-        harmonics = np.arange(1 - (num % 2), num, 2)
-
-    if len(harmonics.shape) == 1 or harmonics.shape[0] == 1:
-        # reshape to column matrix
-        harmonics = harmonics.reshape(harmonics.shape[0], 1)
-    elif harmonics.shape[0] != 1 and harmonics.shape[1] != 1:
-        raise Exception('input parameter HARMONICS must be 1D!')
-
-    if 2 * harmonics.shape[0] - (harmonics == 0).sum() != num:
-        raise Exception('harmonics list is incompatible with basis size!')
-
-    # If STEERMTX not passed, assume evenly distributed cosine-phase filters:
-    if steermtx is None:
-        steermtx = steer_to_harmonics_mtx(harmonics, np.pi * np.arange(num) / num, even_phase=even_phase)
-
-    steervect = np.zeros((angle.shape[0], num))
-    arg = angle * harmonics[np.nonzero(harmonics)[0]].T
-    if all(harmonics):
-        steervect[:, range(0, num, 2)] = np.cos(arg)
-        steervect[:, range(1, num, 2)] = np.sin(arg)
-    else:
-        steervect[:, 0] = np.ones((arg.shape[0], 1))
-        steervect[:, range(1, num, 2)] = np.cos(arg)
-        steervect[:, range(2, num, 2)] = np.sin(arg)
-
-    steervect = np.dot(steervect, steermtx)
-
-    steervect = torch.tensor(steervect, dtype=basis.dtype).to(device)
-    if steervect.shape[0] > 1:
-        tmp = basis @ steervect
-        res = tmp.sum().t()
-    else:
-        res = basis @ steervect.t()
-    if return_weights:
-        return res, steervect.reshape(num)
-    else:
-        return res
-
 def minimum(x, dim=None, keepdim=False):
     r"""compute minimum in torch over any axis or combination of axes in tensor
 
@@ -199,16 +121,21 @@ def interpolate1d(x_new, Y, X):
     Returns the one-dimensional piecewise linear interpolant to a
     function with given discrete data points (X, Y), evaluated at x_new.
 
-    Note: this function is just a wrapper around ``np.interp()``.
+    If ``x_new`` is an array, this is just a wrapper around ``np.interp()``.
+    If it's a tensor, the interpolation is done in torch, on ``x_new``'s
+    device and with its dtype, with the same behavior as ``np.interp()``
+    (i.e., values outside of the range of ``X`` are clamped to the first or
+    last value of ``Y``).
 
     Parameters
     ----------
-    x_new: torch.Tensor
+    x_new: torch.Tensor or array_like
         The x-coordinates at which to evaluate the interpolated values.
     Y: array_like
         The y-coordinates of the data points.
     X: array_like
-        The x-coordinates of the data points, same length as X.
+        The x-coordinates of the data points, same length as X. Must be
+        increasing.
 
     Returns
     -------
@@ -219,9 +146,21 @@ def interpolate1d(x_new, Y, X):
     rename and reorder arguments, refactor corresponding use in SteerablePyr
     """
 
-    out = np.interp(x=x_new.flatten(), xp=X, fp=Y)
+    if not torch.is_tensor(x_new):
+        out = np.interp(x=x_new.flatten(), xp=X, fp=Y)
+        return np.reshape(out, x_new.shape)
 
-    return np.reshape(out, x_new.shape)
+    X = torch.as_tensor(X, dtype=x_new.dtype, device=x_new.device)
+    Y = torch.as_tensor(Y, dtype=x_new.dtype, device=x_new.device)
+    x = x_new.flatten().contiguous()
+    # index of the right end of the interval each x falls in
+    idx = torch.searchsorted(X, x, right=True).clamp(1, len(X) - 1)
+    x0, x1 = X[idx - 1], X[idx]
+    y0, y1 = Y[idx - 1], Y[idx]
+    out = y0 + (y1 - y0) / (x1 - x0) * (x - x0)
+    out = torch.where(x < X[0], Y[0], out)
+    out = torch.where(x >= X[-1], Y[-1], out)
+    return out.reshape(x_new.shape)
 
 
 def rectangular_to_polar(x):
@@ -295,6 +234,100 @@ def polar_to_rectangular(amplitude, phase):
 #     else:
 #         return power
 
+@lru_cache(maxsize=32)
+def _expand_indices(shape, factor, real, dtype, device):
+    r"""Precompute the gather used by ``expand``
+
+    For each frequency of the upsampled (unshifted) spectrum, the (flat)
+    index of the frequency of the original spectrum it's copied from and
+    its weight (0 outside of the original band, halved on the Nyquist
+    rows and columns, which are split between the positive and negative
+    frequencies). If ``real``, only the non-negative frequencies of the last
+    dimension are returned, as used by ``irfft2``, stacked with the indices
+    and weights of the opposite frequencies (the upsampled spectrum isn't
+    exactly Hermitian, because of the flipped Nyquist rows and columns, so
+    we need both to get the spectrum of its real part).
+
+    """
+    h, w = shape
+    my, mx = factor * h, factor * w
+    # the (flat, unshifted) index of each frequency of the shifted spectrum
+    small = np.fft.fftshift(np.arange(h * w).reshape(h, w))
+    src = np.zeros((my, mx), dtype=np.int64)
+    weight = np.zeros((my, mx))
+
+    y1 = int(my / 2 + 1 - my / (2 * factor))
+    y2 = int(my / 2 + my / (2 * factor))
+    x1 = int(mx / 2 + 1 - mx / (2 * factor))
+    x2 = int(mx / 2 + mx / (2 * factor))
+
+    def assign(rows, cols, idx, wt):
+        src[rows, cols] = idx
+        weight[rows, cols] = wt
+
+    assign(slice(y1, y2), slice(x1, x2), small[1:h, 1:w], 1)
+    assign(y1 - 1, slice(x1, x2), small[0, 1:w], 1 / 2)
+    assign(y2, slice(x1, x2), small[0, 1:w][::-1], 1 / 2)
+    assign(slice(y1, y2), x1 - 1, small[1:h, 0], 1 / 2)
+    assign(slice(y1, y2), x2, small[1:h, 0][::-1], 1 / 2)
+    for y, x in [(y1 - 1, x1 - 1), (y1 - 1, x2), (y2, x1 - 1), (y2, x2)]:
+        assign(y, x, small[0, 0], 1 / 4)
+
+    src = np.fft.fftshift(src)
+    weight = factor ** 2 * np.fft.fftshift(weight)
+    if real:
+        # the opposite frequency of [i, j] is [-i, -j]
+        opposite = (-np.arange(my)[:, None] % my, -np.arange(mx // 2 + 1)[None] % mx)
+        src = np.stack([src[:, :mx // 2 + 1], src[opposite]])
+        weight = np.stack([weight[:, :mx // 2 + 1], weight[opposite]])
+    return (torch.as_tensor(np.ascontiguousarray(src), device=device),
+            torch.as_tensor(np.ascontiguousarray(weight), dtype=dtype, device=device))
+
+
+def expand(x, factor):
+    r"""Upsample a signal by an integer factor, by zero-padding its spectrum
+
+    The spectrum of ``x`` becomes the central part of the spectrum of the
+    output, with the energy at the Nyquist frequencies split between the
+    positive and negative frequencies. The upsampled spectrum is built with a
+    single precomputed gather (cached for each shape, factor, dtype and
+    device), and all leading dimensions (e.g., batch, channel and
+    orientation) are upsampled at once.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        Signal to upsample, real or complex, of shape (..., height, width).
+    factor : int
+        Upsampling factor.
+
+    Returns
+    -------
+    x_large : torch.Tensor
+        Upsampled signal, of shape (..., factor*height, factor*width) and
+        the same dtype as ``x``.
+
+    """
+    factor = int(factor)
+    h, w = x.shape[-2:]
+    spectrum = torch.fft.fft2(x)
+    # for real signals with even dimensions, we only need half of the
+    # spectrum of the real part of the upsampled signal
+    real = not x.is_complex() and h % 2 == 0 and w % 2 == 0
+    src, weight = _expand_indices((int(h), int(w)), factor, real, spectrum.real.dtype,
+                                  x.device)
+    spectrum_large = spectrum.flatten(start_dim=-2).index_select(-1, src.flatten())
+    spectrum_large = spectrum_large.unflatten(-1, src.shape) * weight
+    if real:
+        # the spectrum of the real part of the upsampled signal
+        spectrum_large = (spectrum_large[..., 0, :, :] + spectrum_large[..., 1, :, :].conj()) / 2
+        return torch.fft.irfft2(spectrum_large, s=(factor * h, factor * w)).to(x.dtype)
+    x_large = torch.fft.ifft2(spectrum_large)
+    if not x.is_complex():
+        x_large = x_large.real
+    return x_large.to(x.dtype)
+
+
 def autocorr(x, n_shifts=7):
     """Compute the autocorrelation of `x` up to `n_shifts` shifts,
     the calculation is performed in the frequency domain.
@@ -370,15 +403,14 @@ def steer(basis, angle, harmonics=None, steermtx=None, return_weights=False,
 
     Returns
     -------
-    res : np.ndarray
+    res : torch.Tensor
         the resteered basis
-    steervect : np.ndarray
-        the weights used to resteer the basis. only returned if
-        ``return_weights`` is True
+    steervect : torch.Tensor
+        the weights used to resteer the basis (see ``steering_weights``). only
+        returned if ``return_weights`` is True
     """
 
     num = basis.shape[-1]
-    device = basis.device
 
     if isinstance(angle, (int, float)):
         angle = np.array([angle])
@@ -387,15 +419,67 @@ def steer(basis, angle, harmonics=None, steermtx=None, return_weights=False,
             raise Exception("ANGLE must be a scalar, or a column vector the"
                             "size of the basis elements")
 
+    steervect = steering_weights(angle, num, harmonics=harmonics, steermtx=steermtx,
+                                 even_phase=even_phase, dtype=basis.dtype,
+                                 device=basis.device)
+    if steervect.shape[0] > 1:
+        tmp = basis @ steervect
+        res = tmp.sum().t()
+    else:
+        res = basis @ steervect.t()
+    if return_weights:
+        return res, steervect.reshape(num)
+    else:
+        return res
+
+
+def steering_weights(angles, num, harmonics=None, steermtx=None, even_phase=True,
+                     dtype=torch.float32, device=None):
+    """Compute the weights to steer a basis of NUM filters to each of ANGLES.
+
+    The steering vectors of all angles are built at once, with torch, on
+    ``device``, so that a basis can be steered to all of them with a single
+    matrix product (or einsum) over the filter dimension. ``steer`` uses them
+    to steer a basis to a single angle.
+
+    Parameters
+    ----------
+    angles : array_like
+        1d list, array or tensor of the angles (in radians) to steer to.
+    num : int
+        the number of filters in the basis.
+    harmonics : list or None
+        a list of harmonic numbers indicating the angular harmonic content of
+        the basis. if None (default), N even or odd low frequencies, as for
+        derivative filters
+    steermtx : array_like or None
+        matrix which maps the filters onto Fourier series components, see
+        ``steer``. If None (default), assumes cosine phase harmonic
+        components, and filter positions at 2pi*n/N.
+    even_phase : bool
+        specifies whether the harmonics are cosine or sine phase aligned about
+        those positions.
+    dtype : torch.dtype
+        dtype of the returned weights. They're computed in double precision.
+    device : torch.device or None
+        device of the returned weights.
+
+    Returns
+    -------
+    steervects : torch.Tensor
+        tensor of shape (len(angles), num), whose rows are the weights used to
+        steer the basis to the corresponding angle.
+    """
+    angles = torch.as_tensor(angles, dtype=torch.float64, device=device).reshape(-1, 1)
+
     # If HARMONICS is not specified, assume derivatives.
     if harmonics is None:
         harmonics = np.arange(1 - (num % 2), num, 2)
-
-    if len(harmonics.shape) == 1 or harmonics.shape[0] == 1:
-        # reshape to column matrix
-        harmonics = harmonics.reshape(harmonics.shape[0], 1)
-    elif harmonics.shape[0] != 1 and harmonics.shape[1] != 1:
+    harmonics = np.asarray(harmonics)
+    if harmonics.ndim > 1 and harmonics.shape[0] != 1 and harmonics.shape[1] != 1:
         raise Exception('input parameter HARMONICS must be 1D!')
+    # column matrix, as in steer
+    harmonics = harmonics.reshape(-1, 1)
 
     if 2 * harmonics.shape[0] - (harmonics == 0).sum() != num:
         raise Exception('harmonics list is incompatible with basis size!')
@@ -404,29 +488,19 @@ def steer(basis, angle, harmonics=None, steermtx=None, return_weights=False,
     if steermtx is None:
         steermtx = steer_to_harmonics_mtx(
             harmonics, np.pi * np.arange(num) / num, even_phase=even_phase)
-
-    steervect = np.zeros((angle.shape[0], num))
-    arg = angle * harmonics[np.nonzero(harmonics)[0]].T
-    if all(harmonics):
-        steervect[:, range(0, num, 2)] = np.cos(arg)
-        steervect[:, range(1, num, 2)] = np.sin(arg)
-    else:
-        steervect[:, 0] = np.ones((arg.shape[0], 1))
-        steervect[:, range(1, num, 2)] = np.cos(arg)
-        steervect[:, range(2, num, 2)] = np.sin(arg)
-
-    steervect = np.dot(steervect, steermtx)
-
-    steervect = torch.tensor(steervect, dtype=basis.dtype).to(device)
-    if steervect.shape[0] > 1:
-        tmp = basis @ steervect
-        res = tmp.sum().t()
-    else:
-        res = basis @ steervect.t()
-    if return_weights:
-        return res, steervect.reshape(num)
-    else:
-        return res
+    steermtx = torch.as_tensor(np.asarray(steermtx), dtype=torch.float64,
+                               device=angles.device)
+
+    nonzero = torch.as_tensor(harmonics[harmonics != 0], dtype=torch.float64,
+                              device=angles.device)
+    arg = angles * nonzero
+    # interleave the cosine and sine of each harmonic: [cos1 sin1 cos2 sin2 ...]
+    steervects = torch.stack([torch.cos(arg), torch.sin(arg)], dim=-1).flatten(-2)
+    if not harmonics.all():
+        steervects = torch.cat([torch.ones_like(angles), steervects], dim=-1)
+
+    steervects = steervects @ steermtx
+    return steervects.to(dtype)
 
 
 def make_disk(img_size: Union[int, Tuple[int, int], torch.Size],
@@ -12,6 +12,10 @@ import numpy as np
 import scipy.io as sio
 import torch
 import os.path as op
+import json
+import imageio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from test_metric import osf_download
 from plenoptic.simulate.canonical_computations import (gaussian1d, circular_gaussian2d)
 from conftest import DEVICE, DATA_DIR
@@ -136,6 +140,17 @@ class TestFrontEnd:
         fig = model.display_filters()
         plt.close(fig)
 
+    @pytest.mark.parametrize("mdl", ["LinearNonlinear", "LuminanceGainControl",
+                                     "LuminanceContrastGainControl", "OnOff"])
+    def test_frontend_backend(self, mdl, einstein_img_small):
+        torch.manual_seed(0)
+        spatial = getattr(po.simul, mdl)(31, backend="spatial").to(DEVICE)
+        fourier = getattr(po.simul, mdl)(31, backend="fourier").to(DEVICE)
+        fourier.load_state_dict(spatial.state_dict())
+        np.testing.assert_allclose(po.to_numpy(fourier(einstein_img_small)),
+                                   po.to_numpy(spatial(einstein_img_small)),
+                                   rtol=1e-4, atol=1e-5)
+
 
 class TestNaive(object):
 
@@ -178,6 +193,25 @@ class TestNaive(object):
         else:
             model = po.simul.CenterSurround((31, 31), center_std=center_std, out_channels=out_channels)
 
+    @pytest.mark.parametrize("mdl", ["Linear", "Gaussian", "CenterSurround"])
+    @pytest.mark.parametrize("pad_mode", ["reflect", "circular", "constant", "replicate"])
+    def test_backend(self, mdl, pad_mode, einstein_img_small):
+        kernel_size = 7 if mdl == "Linear" else 31
+        kwargs = {"pad_mode": pad_mode}
+        if mdl == "Gaussian":
+            kwargs["out_channels"] = 2
+        elif mdl == "Linear":
+            # the default band-pass filter is normalized by a sum close to
+            # zero, so its outputs are too large to compare at this tolerance
+            kwargs["default_filters"] = False
+        spatial = getattr(po.simul, mdl)(kernel_size, backend="spatial", **kwargs).to(DEVICE)
+        fourier = getattr(po.simul, mdl)(kernel_size, backend="fourier", **kwargs).to(DEVICE)
+        fourier.load_state_dict(spatial.state_dict())
+        y = fourier(einstein_img_small)
+        assert y.shape[-2:] == einstein_img_small.shape[-2:]
+        np.testing.assert_allclose(po.to_numpy(y), po.to_numpy(spatial(einstein_img_small)),
+                                   rtol=1e-4, atol=1e-5)
+
     def test_linear(self, basic_stim):
         model = plenoptic.simul.Linear().to(DEVICE)
         assert model(basic_stim).requires_grad
@@ -380,6 +414,249 @@ class TestPortillaSimoncelli(object):
             if str(oo) != ss:
                 raise ValueError("Scales do not match.")
 
+    def test_ps_threads(self):
+        ims = [po.load_images(op.join(DATA_DIR, f"256/{im}.pgm")).to(DEVICE)
+               for im in ["curie", "einstein", "metal", "nuts"]]
+        model = po.simul.PortillaSimoncelli(ims[0].shape[-2:]).to(DEVICE)
+        outputs = [model(im) for im in ims]
+        # forward doesn't store anything on the model
+        for attr in ["pyr_coeffs", "representation", "magnitude_pyr_coeffs",
+                     "real_pyr_coeffs"]:
+            assert not hasattr(model, attr)
+        assert model.intermediates is None
+        with ThreadPoolExecutor(4) as executor:
+            threaded_outputs = list(executor.map(model, ims * 2))
+        for output, threaded in zip(outputs * 2, threaded_outputs):
+            np.testing.assert_allclose(po.to_numpy(threaded), po.to_numpy(output),
+                                       rtol=1e-6, atol=1e-6)
+
+    def test_ps_capture_intermediates(self):
+        im = po.load_images(op.join(DATA_DIR, "256/einstein.pgm")).to(DEVICE)
+        model = po.simul.PortillaSimoncelli(im.shape[-2:]).to(DEVICE)
+        with pytest.raises(ValueError):
+            model.plot_representation()
+        model.capture_intermediates = True
+        output = model(im.requires_grad_())
+        assert list(model.intermediates.keys()) == ["pyr_coeffs", "magnitude_pyr_coeffs",
+                                                    "real_pyr_coeffs", "representation"]
+        assert not model.intermediates["pyr_coeffs"]["residual_highpass"].requires_grad
+        np.testing.assert_allclose(
+            po.to_numpy(model.convert_to_vector(model.intermediates["representation"])),
+            po.to_numpy(output))
+        model.plot_representation()
+        plt.close('all')
+
+    @pytest.mark.parametrize("use_true_correlations", [True, False])
+    def test_ps_batch(self, use_true_correlations):
+        ims = po.load_images([op.join(DATA_DIR, f"256/{im}.pgm")
+                              for im in ["curie", "einstein", "metal", "nuts"]]).to(DEVICE)
+        # (batch, channel, height, width) = (2, 2, 256, 256)
+        ims = ims.reshape(2, 2, *ims.shape[-2:])
+        model = po.simul.PortillaSimoncelli(ims.shape[-2:],
+                                            use_true_correlations=use_true_correlations).to(DEVICE)
+        output = model(ims)
+        assert output.shape == (2, 2, len(model.representation_scales))
+        for b in range(2):
+            for c in range(2):
+                np.testing.assert_allclose(po.to_numpy(output[b, c]),
+                                           po.to_numpy(model(ims[b, c]).squeeze()),
+                                           rtol=1e-5, atol=1e-5)
+        rep = model.convert_to_dict(output)
+        np.testing.assert_allclose(po.to_numpy(model.convert_to_vector(rep)),
+                                   po.to_numpy(output))
+
+    @pytest.mark.parametrize("scales", [["pixel_statistics"], ["residual_lowpass"], [3], [1],
+                                        ["residual_highpass"], ["residual_lowpass", 3, 2],
+                                        [0, "residual_highpass"]])
+    @pytest.mark.parametrize("use_true_correlations", [True, False])
+    def test_ps_scales_forward(self, scales, use_true_correlations):
+        im = po.load_images(op.join(DATA_DIR, "256/einstein.pgm")).to(DEVICE)
+        model = po.simul.PortillaSimoncelli(im.shape[-2:],
+                                            use_true_correlations=use_true_correlations).to(DEVICE)
+        ind = [i for i, s in enumerate(model.representation_scales) if s in scales]
+        np.testing.assert_allclose(po.to_numpy(model(im, scales=scales)),
+                                   po.to_numpy(model(im)[..., ind]),
+                                   rtol=1e-5, atol=1e-5)
+
+    @pytest.mark.parametrize("statistics", [["pixel_statistics"],
+                                            ["magnitude_means", "var_highpass_residual"],
+                                            ["skew_reconstructed", "auto_correlation_magnitude"],
+                                            ["cross_scale_correlation_real",
+                                             "cross_orientation_correlation_real"],
+                                            ["cross_scale_correlation_magnitude",
+                                             "std_reconstructed", "pixel_statistics"]])
+    @pytest.mark.parametrize("scales", [None, ["residual_lowpass", 3], [1]])
+    def test_ps_statistics(self, statistics, scales):
+        im = po.load_images(op.join(DATA_DIR, "256/einstein.pgm")).to(DEVICE)
+        model = po.simul.PortillaSimoncelli(im.shape[-2:]).to(DEVICE)
+        lite_model = po.simul.PortillaSimoncelli(im.shape[-2:],
+                                                 statistics=statistics).to(DEVICE)
+        full = model.convert_to_dict(model(im))
+        lite = lite_model(im, scales=scales)
+        assert lite_model.statistics == [k for k in full.keys() if k in statistics]
+        if scales is None:
+            lite_dict = lite_model.convert_to_dict(lite)
+            assert list(lite_dict.keys()) == lite_model.statistics
+            np.testing.assert_allclose(
+                po.to_numpy(lite),
+                po.to_numpy(model.convert_to_vector(
+                    OrderedDict((k, v) for k, v in full.items() if k in statistics))),
+                rtol=1e-5, atol=1e-5)
+        else:
+            ind = [i for i, s in enumerate(lite_model.representation_scales) if s in scales]
+            np.testing.assert_allclose(po.to_numpy(lite),
+                                       po.to_numpy(lite_model(im)[..., ind]),
+                                       rtol=1e-5, atol=1e-5)
+
+    @pytest.mark.parametrize("n_scales", [2, 4])
+    @pytest.mark.parametrize("n_orientations", [2, 4])
+    @pytest.mark.parametrize("spatial_corr_width", [6, 9])
+    @pytest.mark.parametrize("use_true_correlations", [True, False])
+    def test_ps_compact(self, n_scales, n_orientations, spatial_corr_width,
+                        use_true_correlations):
+        im = po.load_images(op.join(DATA_DIR, "256/einstein.pgm"))[..., :64, :64].to(DEVICE)
+        kwargs = dict(n_scales=n_scales, n_orientations=n_orientations,
+                      spatial_corr_width=spatial_corr_width,
+                      use_true_correlations=use_true_correlations)
+        model = po.simul.PortillaSimoncelli(im.shape[-2:], **kwargs).to(DEVICE)
+        compact_model = po.simul.PortillaSimoncelli(im.shape[-2:], compact=True,
+                                                    **kwargs).to(DEVICE)
+        full = model(im)
+        compact = compact_model(im)
+        assert compact.shape[-1] == len(compact_model.representation_scales)
+        assert compact.shape[-1] < full.shape[-1]
+        np.testing.assert_allclose(po.to_numpy(compact),
+                                   po.to_numpy(full[..., compact_model.compact_index]))
+        # the dropped entries are zeros or duplicates
+        np.testing.assert_allclose(po.to_numpy(compact_model.expand_compact(compact)),
+                                   po.to_numpy(full), rtol=1e-5, atol=1e-6)
+        compact_rep = compact_model.convert_to_dict(compact)
+        for k, v in model.convert_to_dict(full).items():
+            if isinstance(v, dict):
+                continue
+            np.testing.assert_allclose(po.to_numpy(compact_rep[k]), po.to_numpy(v),
+                                       rtol=1e-5, atol=1e-6)
+        scales = [1, "residual_lowpass"]
+        ind = [i for i, s in enumerate(compact_model.representation_scales) if s in scales]
+        np.testing.assert_allclose(po.to_numpy(compact_model(im, scales=scales)),
+                                   po.to_numpy(compact[..., ind]), rtol=1e-5, atol=1e-5)
+
+    @pytest.mark.parametrize("use_true_correlations", [True, False])
+    def test_ps_analytic_gradients(self, use_true_correlations):
+        im = po.load_images(op.join(DATA_DIR, "256/einstein.pgm"))[..., :64, :64].to(DEVICE)
+        im = im.to(torch.float64)
+        outputs, grads = [], []
+        for analytic in [False, True]:
+            model = po.simul.PortillaSimoncelli(im.shape[-2:], n_scales=3,
+                                                use_true_correlations=use_true_correlations,
+                                                analytic_gradients=analytic).to(DEVICE)
+            model = model.to(torch.float64)
+            x = im.clone().requires_grad_()
+            out = model(x)
+            out.pow(2).sum().backward()
+            outputs.append(po.to_numpy(out))
+            grads.append(po.to_numpy(x.grad))
+        np.testing.assert_allclose(outputs[1], outputs[0], rtol=1e-8, atol=1e-10)
+        np.testing.assert_allclose(grads[1], grads[0], rtol=1e-6, atol=1e-8)
+
+    def test_ps_analytic_gradients_gradcheck(self):
+        from plenoptic.simulate.models.portilla_simoncelli import (
+            _Autocorrelation, _GramCrossCorrelation, _CentralMoment)
+        kwargs = dict(dtype=torch.float64, device=DEVICE, requires_grad=True)
+        x = torch.randn(2, 3, 8, 6, **kwargs)
+        assert torch.autograd.gradcheck(lambda x: _Autocorrelation.apply(x, 2), (x,))
+        mats = (torch.randn(2, 20, 3, **kwargs), torch.randn(2, 20, 2, **kwargs))
+        for normalize in [True, False]:
+            assert torch.autograd.gradcheck(
+                lambda *m: _GramCrossCorrelation.apply(20, normalize, *m), mats)
+        mu = torch.randn(2, 3, **kwargs)
+        for order in [3, 4]:
+            assert torch.autograd.gradcheck(lambda x, mu: _CentralMoment.apply(x, mu, order),
+                                            (x, mu))
+
+    def test_ps_statistics_error(self):
+        with pytest.raises(ValueError):
+            po.simul.PortillaSimoncelli((256, 256), statistics=["pixel_stats"])
+        with pytest.raises(ValueError):
+            po.simul.PortillaSimoncelli((256, 256), use_true_correlations=False,
+                                        statistics=["std_reconstructed"])
+
+    @pytest.mark.parametrize("use_true_correlations", [True, False])
+    def test_ps_gram_crosscorrelation(self, use_true_correlations):
+        model = po.simul.PortillaSimoncelli((64, 64),
+                                            use_true_correlations=use_true_correlations)
+        mats = [torch.randn(2, 3, 100, 4, device=DEVICE),
+                torch.randn(2, 3, 100, 5, device=DEVICE)]
+        corr = model._gram_crosscorrelation(mats, 100)
+        # only the correlations with the columns of the first matrix are computed
+        assert corr.shape == (2, 3, 4, 9)
+        for j in [0, 1]:
+            block = corr[..., 4*j:4*j+mats[j].shape[-1]]
+            np.testing.assert_allclose(
+                po.to_numpy(block),
+                po.to_numpy(model.compute_crosscorrelation(mats[0].transpose(-1, -2),
+                                                           mats[j], 100)),
+                rtol=1e-5, atol=1e-5)
+
+    @pytest.mark.parametrize("compact", [False, True])
+    @pytest.mark.parametrize("n_workers", [0, 2])
+    def test_ps_extract_texture_statistics(self, tmp_path, n_workers, compact):
+        # images of two different shapes, plus a file that isn't an image
+        ims = {f"{im}.png": po.to_numpy(po.load_images(op.join(DATA_DIR, f"256/{im}.pgm"))
+                                        [0, 0, :64, :crop])
+               for im, crop in [("curie", 64), ("einstein", 64), ("metal", 48), ("nuts", 64)]}
+        im_dir = tmp_path / "images"
+        im_dir.mkdir()
+        for name, im in ims.items():
+            imageio.imwrite(im_dir / name, po.tools.convert_float_to_int(im))
+        (im_dir / "notes.txt").write_text("not an image")
+        # too small for the pyramid
+        imageio.imwrite(im_dir / "tiny.png",
+                        po.tools.convert_float_to_int(ims["curie.png"][:8, :8]))
+        output = str(tmp_path / "stats.npy")
+        kwargs = {"n_scales": 2, "spatial_corr_width": 5, "compact": compact}
+        # with more pending images than max_pending, the oldest shape is computed before its
+        # batch is full, and models are rebuilt when they're evicted
+        with pytest.warns(UserWarning):
+            features, index = po.simul.extract_texture_statistics(
+                str(im_dir), output, batch_size=3, n_workers=n_workers, max_pending=2,
+                max_models=1, **kwargs)
+        paths = sorted(str(p) for p in im_dir.iterdir())
+        assert index["paths"] == paths
+        assert features.shape == (len(paths), index["n_stats"])
+        assert all(index["done"])
+        if compact:
+            # the compact representation depends on the image shape
+            assert sorted(index["compact_index"].keys()) == ["64x48", "64x64"]
+        for i, path in enumerate(paths):
+            if path.endswith((".txt", "tiny.png")):
+                assert index["shapes"][i] is None
+                assert np.isnan(features[i]).all()
+                continue
+            im = po.load_images(path).to(DEVICE)
+            assert index["shapes"][i] == list(im.shape[-2:])
+            expected = po.simul.PortillaSimoncelli(im.shape[-2:], **kwargs).to(DEVICE)(im)
+            stats = features[i]
+            if compact:
+                stats = stats[index["compact_index"]["{}x{}".format(*im.shape[-2:])]]
+            np.testing.assert_allclose(stats, po.to_numpy(expected[0, 0]),
+                                       rtol=1e-5, atol=1e-5)
+        # simulate an interruption: forget about some rows and resume
+        expected = np.array(features)
+        with open(output.replace(".npy", "_index.json")) as f:
+            index = json.load(f)
+        index["done"][:2] = [False, False]
+        with open(output.replace(".npy", "_index.json"), "w") as f:
+            json.dump(index, f)
+        features[:2] = 0
+        features.flush()
+        features, index = po.simul.extract_texture_statistics(
+            str(im_dir), output, batch_size=2, n_workers=n_workers, **kwargs)
+        np.testing.assert_allclose(features, expected, rtol=1e-6, atol=1e-6)
+        with pytest.raises(ValueError):
+            po.simul.extract_texture_statistics(str(im_dir), output, n_workers=n_workers,
+                                                n_scales=3)
+
 
 class TestFilters:
     @pytest.mark.parametrize("std", [5., torch.tensor(1.), -1., 0.])
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import copy
+import warnings
 import os.path as op
 import imageio
 import torch
@@ -6,8 +8,10 @@ import plenoptic as po
 import matplotlib.pyplot as plt
 import pytest
 import pyrtools as pt
+from pyrtools.pyramids.steer import steer as pt_steer
 import numpy as np
 from itertools import product
+from collections import OrderedDict
 from plenoptic.tools.data import to_numpy
 from conftest import DEVICE, DATA_DIR, DTYPE
 
@@ -283,3 +287,458 @@ class TestSteerablePyramid(object):
             spyr.recon_pyr()
         with pytest.raises(Exception):
             spyr.recon_pyr(scales)
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-{tf}' for c, d, tf in product([True, False],
+                                                                                     [True, False],
+                                                                                     [True, False])],
+                             indirect=True)
+    def test_stack_orientations(self, img, spyr):
+        pyr_coeffs = spyr.forward(img)
+        stacked_coeffs = spyr.forward(img, stack_orientations=True)
+        for k, v in stacked_coeffs.items():
+            if isinstance(k, int):
+                assert v.shape[2] == spyr.num_orientations
+                for b, band in enumerate(v.unbind(2)):
+                    assert torch.equal(band, pyr_coeffs[(k, b)])
+            else:
+                assert torch.equal(v, pyr_coeffs[k])
+
+    @pytest.mark.parametrize('spyr', [f'{h}-{o}-False-{d}-{tf}' for h, o, d, tf in
+                                      product(['auto', 1, 3], [1, 3], [True, False], [True, False])],
+                             indirect=True)
+    def test_half_spectrum(self, img, spyr):
+        if any([s % 2 for s in img.shape[-2:]]):
+            with pytest.raises(ValueError):
+                po.simul.Steerable_Pyramid_Freq(img.shape[-2:], spyr.num_scales, spyr.order,
+                                                downsample=spyr.downsample,
+                                                tight_frame=spyr.tight_frame, half_spectrum=True)
+            return
+        half_spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], spyr.num_scales, spyr.order,
+                                                    downsample=spyr.downsample,
+                                                    tight_frame=spyr.tight_frame,
+                                                    half_spectrum=True).to(DEVICE)
+        pyr_coeffs = spyr.forward(img)
+        half_pyr_coeffs = half_spyr.forward(img)
+        check_pyr_coeffs(pyr_coeffs, half_pyr_coeffs, rtol=1e-4, atol=1e-4)
+        recon = to_numpy(half_spyr.recon_pyr(half_pyr_coeffs))
+        np.testing.assert_allclose(recon, to_numpy(img), rtol=1e-4, atol=1e-4)
+
+    def test_half_spectrum_complex(self):
+        with pytest.raises(ValueError):
+            po.simul.Steerable_Pyramid_Freq((256, 256), is_complex=True, half_spectrum=True)
+
+    def test_plan_cache(self):
+        po.simul.Steerable_Pyramid_Freq.clear_plan_cache()
+        spyr_1 = po.simul.Steerable_Pyramid_Freq((64, 64), order=2).to(DEVICE)
+        spyr_2 = po.simul.Steerable_Pyramid_Freq((64, 64), order=2).to(DEVICE)
+        assert spyr_1.lo0mask is spyr_2.lo0mask
+        for i in range(spyr_1.num_scales):
+            assert spyr_1._get_masks('bands', i) is spyr_2._get_masks('bands', i)
+        # different parameters or dtypes must not share masks
+        spyr_3 = po.simul.Steerable_Pyramid_Freq((64, 64), order=3).to(DEVICE)
+        assert spyr_3._get_masks('bands', 0)['anglemasks'].shape[0] == 4
+        spyr_2.to(torch.float64)
+        assert spyr_2.lo0mask.dtype == torch.float64
+        assert spyr_1.lo0mask.dtype == torch.float32
+
+    def test_plan_cache_eviction(self):
+        try:
+            po.simul.Steerable_Pyramid_Freq.configure_plan_cache(maxsize=1)
+            po.simul.Steerable_Pyramid_Freq.clear_plan_cache()
+            spyr_1 = po.simul.Steerable_Pyramid_Freq((64, 64), order=1)
+            # this evicts the masks of the first pyramid, which keeps its own
+            po.simul.Steerable_Pyramid_Freq((64, 64), order=2)
+            spyr_3 = po.simul.Steerable_Pyramid_Freq((64, 64), order=1)
+            assert spyr_1.lo0mask is not spyr_3.lo0mask
+            assert torch.equal(spyr_1.lo0mask, spyr_3.lo0mask)
+        finally:
+            po.simul.Steerable_Pyramid_Freq.configure_plan_cache()
+
+    def test_plan_cache_dir(self, img, tmp_path):
+        try:
+            po.simul.Steerable_Pyramid_Freq.configure_plan_cache(cache_dir=tmp_path)
+            po.simul.Steerable_Pyramid_Freq.clear_plan_cache()
+            spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:]).to(DEVICE)
+            spyr.forward(img)
+            # one file for the residual masks and two per scale
+            assert len(list(tmp_path.iterdir())) == 1 + 2 * spyr.num_scales
+            po.simul.Steerable_Pyramid_Freq.clear_plan_cache()
+            spyr_loaded = po.simul.Steerable_Pyramid_Freq(img.shape[-2:]).to(DEVICE)
+            check_pyr_coeffs(spyr.forward(img), spyr_loaded.forward(img), rtol=1e-12, atol=1e-12)
+        finally:
+            po.simul.Steerable_Pyramid_Freq.configure_plan_cache()
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-False' for c, d in product([True, False],
+                                                                                 [True, False])],
+                             indirect=True)
+    def test_lazy_masks(self, img, spyr):
+        # use a twidth no other test uses, so no masks have been built yet
+        lazy_spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], order=spyr.order,
+                                                    is_complex=spyr.is_complex,
+                                                    downsample=spyr.downsample,
+                                                    twidth=2).to(DEVICE)
+        lazy_spyr.forward(img, scales=[1, 'residual_lowpass'])
+        built = [k for k in lazy_spyr._plan.keys() if k[0] == 'bands']
+        assert built == [('bands', 1)]
+        # the torch interpolation matches the numpy one
+        lazy_spyr.to(torch.float64)
+        log_rad, angle = lazy_spyr._level_grid(1)
+        masks = lazy_spyr._get_masks('bands', 1)
+        Xrcos = lazy_spyr.Xrcos - 2
+        himask = po.tools.interpolate1d(to_numpy(log_rad), lazy_spyr.Yrcos, Xrcos)
+        np.testing.assert_allclose(to_numpy(masks['himask'][0]), himask, rtol=1e-10, atol=1e-10)
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-False' for c, d in product([True, False],
+                                                                                 [True, False])],
+                             indirect=True)
+    def test_packed_coeffs(self, img, spyr):
+        pyr_coeffs = spyr.forward(img)
+        pyr_buffer, pyr_index = spyr.forward(img, packed=True)
+        assert pyr_buffer.shape[:2] == img.shape[:2]
+        assert [idx[0] for idx in pyr_index] == list(pyr_coeffs.keys())
+        unpacked_coeffs = spyr.unpack_pyr_coeffs(pyr_buffer, pyr_index)
+        check_pyr_coeffs(pyr_coeffs, unpacked_coeffs, rtol=1e-12, atol=1e-12)
+        # the bands are views into the buffer
+        for k, v in unpacked_coeffs.items():
+            assert v.shape == pyr_coeffs[k].shape
+            assert v.dtype == pyr_coeffs[k].dtype
+            v_real = torch.view_as_real(v) if v.is_complex() else v
+            assert v_real.storage().data_ptr() == pyr_buffer.storage().data_ptr()
+        recon = spyr.recon_packed_pyr(pyr_buffer, pyr_index)
+        np.testing.assert_allclose(to_numpy(recon), to_numpy(spyr.recon_pyr(pyr_coeffs)),
+                                   rtol=1e-6, atol=1e-6)
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-{tf}' for c, d, tf in product([True, False],
+                                                                                     [True, False],
+                                                                                     [True, False])],
+                             indirect=True)
+    @pytest.mark.parametrize('half_spectrum', [True, False])
+    def test_fourier_domain(self, img, spyr, half_spectrum):
+        if half_spectrum:
+            if spyr.is_complex or any([s % 2 for s in img.shape[-2:]]):
+                pytest.skip("half_spectrum requires real pyramids and even shapes")
+            spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], order=spyr.order,
+                                                   downsample=spyr.downsample,
+                                                   tight_frame=spyr.tight_frame,
+                                                   half_spectrum=True).to(DEVICE)
+        fft = torch.fft.rfft2 if half_spectrum else torch.fft.fft2
+        pyr_dfts = spyr.forward(img, domain='fourier')
+        pyr_coeffs, both_dfts = spyr.forward(img, domain='both')
+        assert list(pyr_dfts.keys()) == list(pyr_coeffs.keys())
+        for k, v in pyr_coeffs.items():
+            dft = fft(v, norm=spyr.fft_norm)
+            np.testing.assert_allclose(to_numpy(pyr_dfts[k]), to_numpy(dft), rtol=1e-4,
+                                       atol=1e-4 * to_numpy(dft.abs()).max())
+            assert torch.equal(pyr_dfts[k], both_dfts[k])
+        with pytest.raises(ValueError):
+            spyr.forward(img, domain='frequency')
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-False' for c, d in product([True, False],
+                                                                                  [True, False])],
+                             indirect=True)
+    def test_stateless_forward(self, img, spyr):
+        pyr_size = OrderedDict(spyr.pyr_size)
+        assert list(pyr_size.keys()) == list(spyr.forward(img).keys())
+        # forward with a subset of scales doesn't change the pyramid
+        spyr.forward(img, scales=[0])
+        assert spyr.pyr_size == pyr_size
+        for k, v in spyr.forward(img).items():
+            assert tuple(v.shape[-2:]) == pyr_size[k]
+
+    @pytest.mark.parametrize('spyr', [f'auto-{o}-False-{d}-False' for o, d in product([1, 2, 3],
+                                                                                      [True, False])],
+                             indirect=True)
+    @pytest.mark.parametrize('even_phase', [True, False])
+    def test_steer_coeffs(self, img, spyr, even_phase):
+        pyr_coeffs = spyr.forward(img)
+        angles = np.linspace(0, np.pi, 33)
+        resteered, weights = spyr.steer_coeffs(pyr_coeffs, angles, even_phase=even_phase)
+        resteered_stacked, _ = spyr.steer_coeffs(spyr.forward(img, stack_orientations=True),
+                                                 torch.tensor(angles), even_phase=even_phase)
+        for i in range(spyr.num_scales):
+            basis = torch.stack([pyr_coeffs[(i, j)] for j in range(spyr.num_orientations)], -1)
+            for j, a in enumerate(angles):
+                res, steervect = po.tools.steer(basis, a, return_weights=True,
+                                                even_phase=even_phase)
+                # compare with the numpy implementation in pyrtools
+                _, pt_steervect = pt_steer(np.eye(spyr.num_orientations), a,
+                                           return_weights=True, even_phase=even_phase)
+                np.testing.assert_allclose(to_numpy(steervect), pt_steervect.flatten(),
+                                           rtol=1e-5, atol=1e-6)
+                k = (i, spyr.num_orientations + j)
+                np.testing.assert_allclose(to_numpy(weights[(i, j)]), to_numpy(steervect),
+                                           rtol=1e-5, atol=1e-6)
+                np.testing.assert_allclose(to_numpy(resteered[k]), to_numpy(res.squeeze(-1)),
+                                           rtol=1e-4, atol=1e-5)
+                assert torch.equal(resteered[k], resteered_stacked[k])
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-False' for c, d in product([True, False],
+                                                                                  [True, False])],
+                             indirect=True)
+    @pytest.mark.parametrize('scales',[[], ['residual_highpass'], [0], [1, 'residual_lowpass']])
+    @pytest.mark.parametrize('stack_orientations', [True, False])
+    def test_iter_forward(self, img, spyr, scales, stack_orientations):
+        pyr_coeffs = spyr.forward(img, scales, stack_orientations=stack_orientations)
+        items = list(spyr.iter_forward(img, scales, stack_orientations=stack_orientations))
+        assert [k for k, _ in items] == list(pyr_coeffs.keys())
+        for k, v in items:
+            assert torch.equal(v, pyr_coeffs[k])
+        pyr_coeffs, pyr_dfts = spyr.forward(img, scales, domain='both')
+        for k, (v, v_dft) in spyr.iter_forward(img, scales, domain='both'):
+            assert torch.equal(v, pyr_coeffs[k])
+            assert torch.equal(v_dft, pyr_dfts[k])
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-{tf}' for c, d, tf in product([True, False],
+                                                                                     [True, False],
+                                                                                     [True, False])],
+                             indirect=True)
+    @pytest.mark.parametrize('dtype', [torch.float32, torch.float64])
+    def test_recon_dtype(self, img, spyr, dtype):
+        pyr_coeffs = spyr.forward(img.to(dtype))
+        recon = spyr.recon_pyr(pyr_coeffs)
+        assert recon.dtype == dtype
+        np.testing.assert_allclose(to_numpy(recon), to_numpy(img), rtol=1e-4, atol=1e-4)
+        # partial reconstruction with a subset of the orientations
+        recon = spyr.recon_pyr(pyr_coeffs, levels=[0], bands=[0, 2])
+        assert recon.dtype == dtype
+        pyr_coeffs = OrderedDict((k, v if k in [(0, 0), (0, 2)] else torch.zeros_like(v))
+                                 for k, v in pyr_coeffs.items())
+        np.testing.assert_allclose(to_numpy(recon), to_numpy(spyr.recon_pyr(pyr_coeffs)),
+                                   rtol=1e-5, atol=1e-5)
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-{tf}' for c, d, tf in product([True, False],
+                                                                                     [True, False],
+                                                                                     [True, False])],
+                             indirect=True)
+    @pytest.mark.parametrize('dtype', [torch.float16, torch.bfloat16])
+    def test_reduced_precision(self, img, spyr, dtype):
+        pyr = copy.copy(spyr).to(dtype)
+        pyr_coeffs = pyr.forward(img.to(dtype))
+        for k, v in pyr_coeffs.items():
+            if v.is_complex():
+                assert v.dtype != torch.complex128
+                if dtype == torch.float16 and hasattr(torch, 'chalf'):
+                    assert v.dtype == torch.chalf
+            else:
+                assert v.dtype == dtype
+        recon = pyr.recon_pyr(pyr_coeffs)
+        assert recon.dtype == dtype
+        report = spyr.precision_report(img, dtype)
+        assert list(report['relative_error'].keys()) == list(pyr_coeffs.keys())
+        tol = 1e-2 if dtype == torch.bfloat16 else 2e-3
+        # rounding the image to dtype already changes the bands with little energy (e.g., the
+        # residual highpass) by more than tol, so we compare to the pyramid of the rounded image
+        ref_coeffs = spyr.forward(img)
+        rounded_coeffs = spyr.forward(img.to(dtype).to(torch.float32))
+        for k, err in report['relative_error'].items():
+            rounding_err = (torch.linalg.norm((rounded_coeffs[k] - ref_coeffs[k]).flatten()) /
+                            torch.linalg.norm(ref_coeffs[k].flatten()))
+            assert err < rounding_err + tol
+        assert report['reconstruction_error'][0] < tol
+        assert report['nbytes'][0] < report['nbytes'][1]
+        # the pyramid we took the report from is unchanged
+        assert spyr._dtype == torch.float32
+
+    @pytest.mark.parametrize('spyr', [f'auto-3-{c}-{d}-{tf}' for c, d, tf in product([True, False],
+                                                                                     [True, False],
+                                                                                     [True, False])],
+                             indirect=True)
+    @pytest.mark.parametrize('half_spectrum', [True, False])
+    @pytest.mark.parametrize('scales', [[], [0, 'residual_lowpass'], ['residual_highpass', 1]])
+    def test_adjoint_backward(self, img, spyr, half_spectrum, scales):
+        if half_spectrum and (spyr.is_complex or any([s % 2 for s in img.shape[-2:]])):
+            pytest.skip("half_spectrum requires real pyramids and even shapes")
+        kwargs = dict(order=spyr.order, is_complex=spyr.is_complex, downsample=spyr.downsample,
+                      tight_frame=spyr.tight_frame, half_spectrum=half_spectrum)
+        spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], **kwargs).to(DEVICE)
+        adjoint_spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], adjoint_backward=True,
+                                                       **kwargs).to(DEVICE)
+        grads = []
+        for pyr in [spyr, adjoint_spyr]:
+            x = img.clone().requires_grad_()
+            pyr_coeffs = pyr.forward(x, scales=scales)
+            loss = sum([(torch.view_as_real(v) if v.is_complex() else v).pow(2).sum()
+                        for v in pyr_coeffs.values()])
+            loss.backward()
+            grads.append(x.grad)
+        np.testing.assert_allclose(to_numpy(grads[1]), to_numpy(grads[0]), rtol=1e-4,
+                                   atol=1e-4 * to_numpy(grads[0].abs()).max())
+
+    @pytest.mark.parametrize('is_complex', [True, False])
+    @pytest.mark.parametrize('downsample', [True, False])
+    @pytest.mark.parametrize('tight_frame', [True, False])
+    @pytest.mark.parametrize('half_spectrum', [True, False])
+    @pytest.mark.parametrize('scales', [[], [0, 'residual_lowpass'], ['residual_highpass', 1]])
+    def test_spatial_backend(self, is_complex, downsample, tight_frame, half_spectrum, scales):
+        if half_spectrum and is_complex:
+            pytest.skip("half_spectrum requires real pyramids")
+        img = po.load_images(op.join(DATA_DIR, '256/einstein.pgm')).to(DEVICE)
+        # a batch of small images
+        img = torch.cat([img[..., i:i+32, j:j+32] for i in [0, 64, 128] for j in [0, 96]])
+        kwargs = dict(height=2, is_complex=is_complex, downsample=downsample,
+                      tight_frame=tight_frame, half_spectrum=half_spectrum)
+        spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], **kwargs).to(DEVICE)
+        spatial_spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], backend='spatial',
+                                                       **kwargs).to(DEVICE)
+        pyr_coeffs = spyr.forward(img, scales)
+        spatial_coeffs = spatial_spyr.forward(img, scales)
+        assert list(spatial_coeffs.keys()) == list(pyr_coeffs.keys())
+        for k, v in pyr_coeffs.items():
+            assert spatial_coeffs[k].dtype == v.dtype
+            np.testing.assert_allclose(to_numpy(spatial_coeffs[k]), to_numpy(v), rtol=1e-4,
+                                       atol=1e-4 * to_numpy(v.abs()).max())
+        # truncated filters only approximate the pyramid
+        spatial_spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], backend='spatial',
+                                                       spatial_kernel_size=15,
+                                                       **kwargs).to(DEVICE)
+        for k, v in spatial_spyr.forward(img, scales).items():
+            err = torch.linalg.norm((v - pyr_coeffs[k]).flatten())
+            assert err < .25 * torch.linalg.norm(pyr_coeffs[k].flatten())
+        with pytest.raises(ValueError):
+            spatial_spyr.forward(img, domain='fourier')
+
+    def test_auto_backend(self):
+        spyr = po.simul.Steerable_Pyramid_Freq((32, 32), height=2, backend='auto',
+                                               spatial_kernel_size=7)
+        assert spyr._use_spatial_backend(torch.rand(16, 1, 32, 32), 'spatial')
+        assert not spyr._use_spatial_backend(torch.rand(1, 1, 32, 32), 'spatial')
+        assert not spyr._use_spatial_backend(torch.rand(16, 1, 32, 32), 'fourier')
+        spyr = po.simul.Steerable_Pyramid_Freq((128, 128), height=2, backend='auto',
+                                               spatial_kernel_size=7)
+        assert not spyr._use_spatial_backend(torch.rand(16, 1, 128, 128), 'spatial')
+        with pytest.raises(ValueError):
+            po.simul.Steerable_Pyramid_Freq((32, 32), backend='conv')
+
+
+class TestTiledSteerablePyramid(object):
+
+    @pytest.fixture(scope='class')
+    def img(self):
+        return po.load_images(op.join(DATA_DIR, '256/einstein.pgm')).to(DEVICE)
+
+    @pytest.mark.parametrize('downsample', [True, False])
+    @pytest.mark.parametrize('is_complex', [True, False])
+    def test_single_tile(self, img, downsample, is_complex):
+        # with a single tile and no overlap, we should get the full pyramid
+        spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], height=3, is_complex=is_complex,
+                                               downsample=downsample).to(DEVICE)
+        tiled_spyr = po.simul.Tiled_Steerable_Pyramid_Freq(img.shape[-2:], 0, height=3,
+                                                           is_complex=is_complex,
+                                                           downsample=downsample).to(DEVICE)
+        tiles = list(tiled_spyr.iter_tiles(img))
+        assert len(tiles) == 1
+        check_pyr_coeffs(spyr.forward(img), tiles[0][1], rtol=1e-6, atol=1e-6)
+
+    @pytest.mark.parametrize('downsample', [True, False])
+    def test_tiles(self, img, downsample, tmp_path):
+        spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], height=2,
+                                               downsample=downsample).to(DEVICE)
+        tiled_spyr = po.simul.Tiled_Steerable_Pyramid_Freq((64, 64), 64, height=2,
+                                                           downsample=downsample).to(DEVICE)
+        pyr_coeffs = spyr.forward(img)
+        tiled_coeffs = tiled_spyr.forward_to_memmap(to_numpy(img), tmp_path)
+        for k, v in pyr_coeffs.items():
+            v = to_numpy(v)
+            assert tiled_coeffs[k].shape == v.shape
+            assert np.linalg.norm(tiled_coeffs[k] - v) < .1 * np.linalg.norm(v)
+        # the memmapped coefficients are the tiles put together
+        for tile_slices, tile_coeffs in tiled_spyr.iter_tiles(img):
+            for k, v in tile_coeffs.items():
+                np.testing.assert_array_equal(tiled_coeffs[k][..., tile_slices[k][0],
+                                                              tile_slices[k][1]],
+                                              to_numpy(v))
+
+    @pytest.mark.parametrize('downsample', [True, False])
+    @pytest.mark.parametrize('is_complex', [True, False])
+    def test_circular_tiles(self, img, downsample, is_complex):
+        # the image isn't a multiple of the tile shape, so the last tiles are cropped, and the
+        # padded tiles have the shape of the image, so with circular boundaries they're circular
+        # shifts of the image and their centers should match the full pyramid
+        img = img[..., :200, :216]
+        spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], height=2, is_complex=is_complex,
+                                               downsample=downsample).to(DEVICE)
+        tiled_spyr = po.simul.Tiled_Steerable_Pyramid_Freq((96, 112), 52, height=2,
+                                                           is_complex=is_complex,
+                                                           downsample=downsample).to(DEVICE)
+        pyr_coeffs = spyr.forward(img)
+        for tile_slices, tile_coeffs in tiled_spyr.iter_tiles(img):
+            for k, v in tile_coeffs.items():
+                expected = to_numpy(pyr_coeffs[k][..., tile_slices[k][0], tile_slices[k][1]])
+                np.testing.assert_allclose(to_numpy(v), expected, rtol=1e-4,
+                                           atol=1e-4 * to_numpy(pyr_coeffs[k].abs()).max())
+
+    @pytest.mark.parametrize('downsample', [True, False])
+    def test_overlap(self, img, downsample, tmp_path):
+        spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], height=2,
+                                               downsample=downsample).to(DEVICE)
+        pyr_coeffs = spyr.forward(img)
+        errors = []
+        for overlap in [8, 16, 32, 64]:
+            tiled_spyr = po.simul.Tiled_Steerable_Pyramid_Freq((64, 64), overlap, height=2,
+                                                               downsample=downsample).to(DEVICE)
+            tiled_coeffs = tiled_spyr.forward_to_memmap(img, tmp_path / str(overlap))
+            errors.append([np.linalg.norm(tiled_coeffs[k] - to_numpy(v)) /
+                           np.linalg.norm(to_numpy(v)) for k, v in pyr_coeffs.items()])
+        # the error of every band decreases as the overlap grows
+        assert (np.diff(errors, axis=0) < 0).all()
+
+    @pytest.mark.parametrize('downsample', [True, False])
+    @pytest.mark.parametrize('boundary', ['circular', 'reflect'])
+    def test_non_multiple_shape(self, img, downsample, boundary):
+        # neither a multiple of the tile shape nor of 2**height
+        img = img[..., :250, :230]
+        spyr = po.simul.Steerable_Pyramid_Freq(img.shape[-2:], height=2,
+                                               downsample=downsample).to(DEVICE)
+        tiled_spyr = po.simul.Tiled_Steerable_Pyramid_Freq((64, 64), 64, height=2,
+                                                           boundary=boundary,
+                                                           downsample=downsample).to(DEVICE)
+        pyr_coeffs = spyr.forward(img)
+        band_shapes = tiled_spyr.band_shapes(img.shape[-2:])
+        # the tiles cover every coefficient exactly once
+        counts = {k: np.zeros(shape) for k, shape in band_shapes.items()}
+        tiled_coeffs = {k: np.zeros(shape) for k, shape in band_shapes.items()}
+        for tile_slices, tile_coeffs in tiled_spyr.iter_tiles(img):
+            for k, v in tile_coeffs.items():
+                assert v.shape[-2:] == counts[k][tile_slices[k]].shape
+                counts[k][tile_slices[k]] += 1
+                tiled_coeffs[k][tile_slices[k]] = to_numpy(v[0, 0])
+        for k, v in pyr_coeffs.items():
+            assert band_shapes[k] == v.shape[-2:]
+            assert (counts[k] == 1).all()
+            # the bands downsampled by a factor that doesn't divide the image shape are sampled
+            # at different positions by the full pyramid, and reflecting the image changes its
+            # edges, so we can only compare the others
+            factor = tiled_spyr._factor(k)
+            if boundary == 'circular' and not any(s % factor for s in img.shape[-2:]):
+                v = to_numpy(v[0, 0])
+                assert np.linalg.norm(tiled_coeffs[k] - v) < .02 * np.linalg.norm(v)
+
+    @pytest.mark.parametrize('dtype', [torch.float16, torch.bfloat16])
+    @pytest.mark.parametrize('is_complex', [True, False])
+    def test_reduced_precision(self, img, dtype, is_complex, tmp_path):
+        tiled_spyr = po.simul.Tiled_Steerable_Pyramid_Freq((64, 64), 32, height=2,
+                                                           is_complex=is_complex).to(DEVICE)
+        pyr_coeffs = tiled_spyr.forward_to_memmap(img, tmp_path / 'float32')
+        tiled_coeffs = tiled_spyr.to(dtype).forward_to_memmap(img, tmp_path / 'reduced')
+        for k, v in pyr_coeffs.items():
+            # numpy has neither bfloat16 nor complex32
+            if tiled_coeffs[k].dtype.kind == 'c' or dtype == torch.bfloat16:
+                assert tiled_coeffs[k].dtype == v.dtype
+            else:
+                assert tiled_coeffs[k].dtype == np.float16
+            assert np.linalg.norm(tiled_coeffs[k] - v) < .02 * np.linalg.norm(v)
+
+    @pytest.mark.parametrize('boundary', ['circular', 'reflect'])
+    @pytest.mark.parametrize('n', [1, 2, 5])
+    def test_padded_indices(self, boundary, n):
+        tiled_spyr = po.simul.Tiled_Steerable_Pyramid_Freq((16, 16), 8, height=2,
+                                                           boundary=boundary)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            idx = tiled_spyr._padded_indices(-8, n + 8, n)
+        mode = 'wrap' if boundary == 'circular' else 'reflect'
+        np.testing.assert_array_equal(idx, np.pad(np.arange(n), 8, mode=mode))
+
+    def test_tile_shape_check(self):
+        with pytest.raises(ValueError):
+            po.simul.Tiled_Steerable_Pyramid_Freq((60, 64), 64, height=3)
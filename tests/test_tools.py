@@ -3,6 +3,9 @@ from math import pi
 import plenoptic as po
 import pytest
 import torch
+import torch.nn.functional as F
+import numpy as np
+import pyrtools as pt
 from numpy.random import randint
 
 from conftest import DEVICE
@@ -70,6 +73,162 @@ class TestSignal(object):
                 - a[..., n//2, n//2+w])
                 < 1e-5).all()
 
+    @pytest.mark.parametrize("shape", [(2, 3, 16, 16), (4, 8, 12), (1, 1, 15, 9)])
+    @pytest.mark.parametrize("factor", [2, 3])
+    @pytest.mark.parametrize("is_complex", [True, False])
+    def test_expand(self, shape, factor, is_complex):
+        x = torch.randn(shape, device=DEVICE)
+        if is_complex:
+            x = torch.complex(x, torch.randn(shape, device=DEVICE))
+        # reference: build the upsampled spectrum one image at a time, with
+        # slice assignments
+        h, w = shape[-2:]
+        my, mx = factor * h, factor * w
+        y1 = int(my / 2 + 1 - my / (2 * factor))
+        y2 = int(my / 2 + my / (2 * factor))
+        x1 = int(mx / 2 + 1 - mx / (2 * factor))
+        x2 = int(mx / 2 + mx / (2 * factor))
+        expected = []
+        for im in x.reshape(-1, h, w):
+            fourier = factor ** 2 * torch.fft.fftshift(torch.fft.fft2(im))
+            large = torch.zeros(my, mx, dtype=fourier.dtype, device=DEVICE)
+            large[y1:y2, x1:x2] = fourier[1:h, 1:w]
+            large[y1 - 1, x1:x2] = fourier[0, 1:w] / 2
+            large[y2, x1:x2] = fourier[0, 1:w].flip(0) / 2
+            large[y1:y2, x1 - 1] = fourier[1:h, 0] / 2
+            large[y1:y2, x2] = fourier[1:h, 0].flip(0) / 2
+            for y, x_ in [(y1 - 1, x1 - 1), (y1 - 1, x2), (y2, x1 - 1), (y2, x2)]:
+                large[y, x_] = fourier[0, 0] / 4
+            large = torch.fft.ifft2(torch.fft.fftshift(large))
+            expected.append(large if is_complex else large.real)
+        expected = torch.stack(expected).reshape(*shape[:-2], my, mx)
+        out = po.tools.expand(x, factor)
+        assert out.shape == expected.shape
+        assert out.dtype == x.dtype
+        np.testing.assert_allclose(po.to_numpy(out), po.to_numpy(expected),
+                                   rtol=1e-5, atol=1e-5)
+
+    def test_interpolate1d_torch(self):
+        X = np.linspace(-2, 2, 50)
+        Y = np.cos(X)
+        x_new = np.random.uniform(-3, 3, (32, 16))
+        # make sure we hit the data points exactly as well
+        x_new[0, :10] = X[:10]
+        out = po.tools.interpolate1d(torch.tensor(x_new, device=DEVICE), Y, X)
+        np.testing.assert_allclose(po.to_numpy(out), po.tools.interpolate1d(x_new, Y, X),
+                                   rtol=1e-12, atol=1e-12)
+
+
+class TestConv(object):
+
+    @pytest.mark.parametrize("shape", [(2, 3, 32, 32), (1, 1, 16, 24)])
+    @pytest.mark.parametrize("edges", ["reflect1", "zero"])
+    @pytest.mark.parametrize("filtname", ["binom5", "binom3"])
+    def test_separable_blur(self, shape, edges, filtname):
+        x = torch.randn(shape, device=DEVICE)
+        f = pt.named_filter(filtname)
+        down = po.tools.blur_downsample(x, filtname, edges=edges)
+        np.testing.assert_allclose(
+            po.to_numpy(down),
+            po.to_numpy(po.tools.correlate_downsample(x, np.outer(f, f), edges=edges)),
+            rtol=1e-5, atol=1e-5)
+        if edges == "reflect1" and filtname != "binom5":
+            # upsample_convolve only handles filters of length 5 with these edges, see
+            # test_separable_upsample_reflect for the others
+            return
+        up = po.tools.upsample_blur(x, filtname, edges=edges)
+        np.testing.assert_allclose(
+            po.to_numpy(up),
+            po.to_numpy(po.tools.upsample_convolve(x, np.outer(f, f), edges=edges)),
+            rtol=1e-5, atol=1e-5)
+
+    @pytest.mark.parametrize("filtname", ["binom3", "binom5", "binom7", "qmf9"])
+    def test_separable_upsample_reflect(self, filtname):
+        x = torch.randn(2, 3, 16, 12, device=DEVICE)
+        up = po.tools.upsample_blur(x, filtname, edges="reflect1")
+        assert up.shape == (2, 3, 32, 24)
+        # the edges only change the outputs the filter reaches from beyond the image
+        half = len(pt.named_filter(filtname)) // 2
+        np.testing.assert_allclose(
+            po.to_numpy(up[..., half:-half, half:-half]),
+            po.to_numpy(po.tools.upsample_blur(x, filtname, edges="zero")[..., half:-half,
+                                                                          half:-half]),
+            rtol=1e-5, atol=1e-5)
+        with pytest.raises(ValueError):
+            po.tools.separable_upsample_convolve(x, [.5, .5])
+
+    def test_separable_blur_shape(self):
+        x = torch.randn(2, 3, 32, 32, device=DEVICE)
+        down = po.tools.blur_downsample(x)
+        assert down.shape == (2, 3, 16, 16)
+        assert po.tools.upsample_blur(down).shape == x.shape
+
+    @pytest.mark.parametrize("edges", ["reflect1", "zero"])
+    def test_named_filter_cache(self, edges):
+        x = torch.randn(2, 3, 32, 32, device=DEVICE)
+        f = pt.named_filter("binom5")
+        po.tools.conv._build_filter.cache_clear()
+        filt = po.tools.conv._get_filter("binom5", 3, x.dtype, x.device)
+        assert filt is po.tools.conv._get_filter("binom5", 3, x.dtype, x.device)
+        assert filt.shape == (3, 1, 5, 5)
+        down = po.tools.correlate_downsample(x, "binom5", edges=edges)
+        # correlate_downsample and upsample_convolve reuse the cached filter
+        po.tools.upsample_convolve(down, "binom5", edges=edges)
+        cache_info = po.tools.conv._build_filter.cache_info()
+        assert cache_info.misses == 1 and cache_info.hits == 3
+        # the cache is bounded
+        for n_channels in range(1, 2 * cache_info.maxsize):
+            po.tools.conv._get_filter("binom5", n_channels, x.dtype, x.device)
+        assert po.tools.conv._build_filter.cache_info().currsize == cache_info.maxsize
+        np.testing.assert_allclose(
+            po.to_numpy(down),
+            po.to_numpy(po.tools.correlate_downsample(x, np.outer(f, f), edges=edges)),
+            rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(
+            po.to_numpy(po.tools.upsample_convolve(down, "binom5", edges=edges)),
+            po.to_numpy(po.tools.upsample_convolve(down, np.outer(f, f), edges=edges)),
+            rtol=1e-6, atol=1e-6)
+
+    @pytest.mark.parametrize("edges", ["reflect1", "zero"])
+    @pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+    def test_blur_modules(self, edges, dtype):
+        x = torch.randn(2, 3, 32, 32, device=DEVICE, dtype=dtype)
+        down = po.tools.BlurDownsample(edges=edges).to(DEVICE, dtype)
+        up = po.tools.UpsampleBlur(edges=edges).to(DEVICE, dtype)
+        assert down.filt.dtype == dtype
+        assert len(down.state_dict()) == 0
+        y = down(x)
+        assert y.dtype == dtype
+        np.testing.assert_allclose(po.to_numpy(y),
+                                   po.to_numpy(po.tools.blur_downsample(x, edges=edges)),
+                                   rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(po.to_numpy(up(y)),
+                                   po.to_numpy(po.tools.upsample_blur(y, edges=edges)),
+                                   rtol=1e-6, atol=1e-6)
+
+    @pytest.mark.parametrize("pad_mode", ["reflect", "circular", "constant", "replicate"])
+    @pytest.mark.parametrize("kernel_size", [(31, 31), (4, 7), (1, 1)])
+    @pytest.mark.parametrize("groups", [1, 2])
+    def test_same_conv2d(self, pad_mode, kernel_size, groups):
+        x = torch.randn(2, 2, 40, 37, device=DEVICE)
+        weight = torch.randn(4, 2 // groups, *kernel_size, device=DEVICE)
+        expected = F.conv2d(po.tools.same_padding(x, kernel_size, pad_mode=pad_mode), weight,
+                            groups=groups)
+        for backend in ["spatial", "fourier", "auto"]:
+            y = po.tools.same_conv2d(x, weight, pad_mode=pad_mode, groups=groups,
+                                     backend=backend)
+            assert y.shape == (2, 4, 40, 37)
+            np.testing.assert_allclose(po.to_numpy(y), po.to_numpy(expected),
+                                       rtol=1e-4, atol=1e-4)
+
+    def test_same_conv2d_auto(self):
+        # direct convolution for small kernels, FFTs for large ones
+        assert not po.tools.conv._use_fourier_backend((1, 1, 66, 66), (1, 1, 3, 3))
+        assert po.tools.conv._use_fourier_backend((1, 1, 286, 286), (1, 1, 31, 31))
+        with pytest.raises(ValueError):
+            po.tools.same_conv2d(torch.randn(1, 1, 8, 8), torch.randn(1, 1, 3, 3),
+                                 backend="fft")
+
 
 class TestStats(object):
 